@@ -0,0 +1,66 @@
+"""
+Сравнение analyze_json (город за городом) и векторизованного
+analyze_batch на большом наборе городов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.batch_benchmark -n 10000
+"""
+import argparse
+import copy
+import random
+import time
+
+from external.analyzer import analyze_json, load_data
+from external.batch_analyzer import CONDITIONS, analyze_batch, pack_forecasts
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+
+
+def make_cities(amount: int) -> list[tuple[str, dict]]:
+    """
+    Копии примера ответа со случайными температурами и осадками.
+    """
+    payload = load_data(EXAMPLE_RESPONSE_PATH)
+    randomizer = random.Random(amount)
+    cities = []
+    for number in range(amount):
+        city_data = copy.deepcopy(payload)
+        for day in city_data['forecasts']:
+            for hour in day['hours']:
+                hour['temp'] = randomizer.randint(-30, 40)
+                hour['condition'] = randomizer.choice(CONDITIONS)
+        cities.append((f'CITY_{number}', city_data))
+    return cities
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=10000, type=int)
+    args = parser.parse_args()
+    cities = make_cities(args.cities)
+
+    started = time.perf_counter()
+    expected = {city: analyze_json(data) for city, data in cities}
+    per_city_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = pack_forecasts(cities)
+    pack_time = time.perf_counter() - started
+    started = time.perf_counter()
+    result = analyze_batch(batch)
+    analyze_time = time.perf_counter() - started
+
+    if result != expected:
+        raise SystemExit('analyze_batch result differs from analyze_json')
+    batch_time = pack_time + analyze_time
+    print(
+        f'cities: {args.cities}\n'
+        f'analyze_json: {per_city_time:.3f}s\n'
+        f'analyze_batch: {batch_time:.3f}s '
+        f'(pack {pack_time:.3f}s, analyze {analyze_time:.3f}s)\n'
+        f'speedup: x{per_city_time / batch_time:.1f}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Сравнение режимов DataCalculationTask: анализ внутри процесса
+и запуск external/analyzer.py отдельным интерпретатором на каждый город.
+
+Запуск из корня репозитория:
+    python -m benchmarks.calculation_benchmark -n 200
+"""
+import argparse
+import os
+import time
+from multiprocessing import Queue, cpu_count
+
+from external.analyzer import load_data
+from tasks import STOP_SIGNAL, DataCalculationTask, iter_calculation_results
+from utils import create_new_folders
+
+EXAMPLE_RESPONSE_PATH = os.path.join('examples', 'response.json')
+
+
+def run_calculation(
+    cities: list[tuple[str, dict]],
+    use_subprocess: bool,
+    workers: int,
+) -> float:
+    """
+    Прогоняет города через DataCalculationTask и возвращает время в секундах.
+    """
+    create_new_folders(('cities_analyses', 'analyses_done'))
+    input_queue: Queue = Queue()
+    output_queue: Queue | None = None if use_subprocess else Queue()
+    for city in cities:
+        input_queue.put(city)
+    for _ in range(workers):
+        input_queue.put(STOP_SIGNAL)
+
+    started = time.perf_counter()
+    processes = [
+        DataCalculationTask(
+            input_queue,
+            output_queue=output_queue,
+            use_subprocess=use_subprocess,
+        ) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    if output_queue is not None:
+        for _ in iter_calculation_results(output_queue, processes):
+            pass
+    for process in processes:
+        process.join()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=200, type=int)
+    parser.add_argument('-w', '--workers', default=cpu_count(), type=int)
+    args = parser.parse_args()
+
+    payload = load_data(EXAMPLE_RESPONSE_PATH)
+    cities = [(f'CITY_{number}', payload) for number in range(args.cities)]
+
+    in_process = run_calculation(cities, False, args.workers)
+    in_subprocess = run_calculation(cities, True, args.workers)
+    print(
+        f'cities: {args.cities}, workers: {args.workers}\n'
+        f'in-process: {in_process:.3f}s '
+        f'({args.cities / in_process:.1f} cities/s)\n'
+        f'subprocess: {in_subprocess:.3f}s '
+        f'({args.cities / in_subprocess:.1f} cities/s)\n'
+        f'speedup: x{in_subprocess / in_process:.1f}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Разбор ответа API (examples/response.json) каждым установленным
+JSON-бэкендом: время разбора в словари и в Forecast и память, которую
+занимает один разобранный город.
+
+Запуск из корня репозитория:
+    python -m benchmarks.decoding_benchmark -n 2000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from external.analyzer import Forecast, analyze_json
+from external.decoding import JSON_BACKENDS, load_backend
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+REPEATS = 5
+
+
+def measure_time(decode: Callable[[], Any], amount: int) -> float:
+    """
+    Время разбора одного города, мкс: лучший из REPEATS прогонов.
+    """
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(amount):
+            decode()
+        timings.append(time.perf_counter() - started)
+    return min(timings) / amount * 1e6
+
+
+def measure_memory(
+    decode: Callable[[], Any],
+    amount: int,
+) -> tuple[float, float]:
+    """
+    Память (байты и блоки) на один город, которую удерживают
+    разобранные данные.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        decoded = [decode() for _ in range(amount)]
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    statistics = snapshot.statistics('filename')
+    size = sum(statistic.size for statistic in statistics)
+    blocks = sum(statistic.count for statistic in statistics)
+    del decoded
+    return size / amount, blocks / amount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=2000, type=int)
+    args = parser.parse_args()
+    with open(EXAMPLE_RESPONSE_PATH, 'rb') as file:
+        body = file.read()
+
+    print(f'cities: {args.cities}, response: {len(body)} bytes')
+    expected = None
+    for name in JSON_BACKENDS:
+        try:
+            backend = load_backend(name)
+        except ImportError:
+            print(f'{name}: not installed')
+            continue
+
+        def decode_dict() -> Any:
+            return backend.loads(body)
+
+        def decode_forecast() -> Forecast:
+            return Forecast.from_json(backend.loads(body))
+
+        result = analyze_json(decode_forecast())
+        if expected is None:
+            expected = analyze_json(decode_dict())
+        if result != expected:
+            raise SystemExit(f'{name}: Forecast analysis differs')
+        decoders = {'dict': decode_dict, 'Forecast': decode_forecast}
+        for kind, decode in decoders.items():
+            per_city_time = measure_time(decode, args.cities)
+            size, blocks = measure_memory(decode, args.cities)
+            print(
+                f'{name} -> {kind}: {per_city_time:.1f}us per city, '
+                f'{size / 1024:.1f} KiB and {blocks:.0f} blocks per city'
+            )
+
+
+if __name__ == '__main__':
+    main()
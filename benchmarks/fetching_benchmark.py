@@ -0,0 +1,53 @@
+"""
+Сравнение получения данных в DataFetchingTask: пул потоков с urlopen
+и asyncio с пулом keep-alive соединений, на локальном сервере-заглушке.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fetching_benchmark -n 2000 -c 100
+"""
+import argparse
+import time
+
+from benchmarks.forecast_server import start_forecast_server
+from external.client import YandexWeatherAPI
+from tasks import DEFAULT_FETCH_CONCURRENCY, DataFetchingTask
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=2000, type=int)
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        default=DEFAULT_FETCH_CONCURRENCY,
+        type=int,
+    )
+    args = parser.parse_args()
+
+    server, base_url = start_forecast_server()
+    cities = {
+        f'CITY_{number}': f'{base_url}/city_{number}.json'
+        for number in range(args.cities)
+    }
+    task = DataFetchingTask(cities=cities, weather_api=YandexWeatherAPI)
+
+    started = time.perf_counter()
+    threaded = task.get_weather_data()
+    threaded_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    asynchronous = task.get_weather_data_async(args.concurrency)
+    async_time = time.perf_counter() - started
+    server.shutdown()
+
+    print(
+        f'cities: {args.cities}, concurrency: {args.concurrency}\n'
+        f'threads: {threaded_time:.3f}s, '
+        f'failed: {sum(data is None for _, data in threaded)}\n'
+        f'asyncio: {async_time:.3f}s, '
+        f'failed: {sum(data is None for _, data in asynchronous)}'
+    )
+
+
+if __name__ == '__main__':
+    main()
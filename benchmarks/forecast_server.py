@@ -0,0 +1,219 @@
+"""
+Локальный HTTP-сервер, подменяющий API прогнозов: на любой GET-запрос
+отдает содержимое examples/response.json (HTTP/1.1, keep-alive),
+а с --synthetic N — синтетический ответ города по адресу /city_<номер>.json
+(см. benchmarks/synthetic.py). Ответ снабжается ETag, условные запросы
+получают 304 Not Modified; задержка ответа задается --latency и --jitter.
+
+Запуск из корня репозитория:
+    python -m benchmarks.forecast_server --port 8000
+    python -m benchmarks.forecast_server --synthetic 1000 --latency 0.05
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import make_payload
+
+EXAMPLE_RESPONSE_PATH = os.path.join('examples', 'response.json')
+SYNTHETIC_PATH_RE = re.compile(r'/city_(\d+)\.json')
+SYNTHETIC_CACHE_SIZE = 1024
+
+
+def make_etag(payload: bytes) -> str:
+    return f'"{hashlib.md5(payload).hexdigest()}"'
+
+
+@lru_cache(maxsize=SYNTHETIC_CACHE_SIZE)
+def synthetic_response(
+    number: int,
+    seed: int,
+    minimal: bool,
+) -> tuple[bytes, str]:
+    payload = make_payload(number, seed, minimal)
+    return payload, make_etag(payload)
+
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов, отдающий заранее загруженный ответ.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    payload: bytes = b''
+    etag: str = ''
+    latency: float = 0.0
+    jitter: float = 0.0
+
+    def get_response(self) -> tuple[bytes, str] | None:
+        """
+        Тело и ETag ответа на текущий запрос (None — 404).
+        """
+        return self.payload, self.etag
+
+    def delay(self) -> None:
+        """
+        Имитация сетевой задержки: latency ± jitter секунд.
+        """
+        if self.latency or self.jitter:
+            jitter = random.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, self.latency + jitter))
+
+    def do_GET(self) -> None:
+        self.delay()
+        response = self.get_response()
+        if response is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        payload, etag = response
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class SyntheticForecastRequestHandler(ForecastRequestHandler):
+    """
+    Обработчик, отдающий синтетический город по номеру из адреса.
+    """
+    amount: int = 0
+    seed: int = 0
+    minimal: bool = False
+
+    def get_response(self) -> tuple[bytes, str] | None:
+        match = SYNTHETIC_PATH_RE.fullmatch(self.path)
+        if match is None or int(match.group(1)) >= self.amount:
+            return None
+        return synthetic_response(int(match.group(1)), self.seed, self.minimal)
+
+
+class ForecastServer(ThreadingHTTPServer):
+    """
+    Многопоточный сервер с увеличенной очередью входящих соединений,
+    чтобы сотни одновременных подключений не упирались в backlog.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(
+    handler: type[ForecastRequestHandler],
+    host: str,
+    port: int,
+) -> tuple[ForecastServer, str]:
+    server = ForecastServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server_host, server_port = server.server_address[:2]
+    return server, f'http://{server_host}:{server_port}'
+
+
+def start_forecast_server(
+    payload_path: str = EXAMPLE_RESPONSE_PATH,
+    host: str = '127.0.0.1',
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+) -> tuple[ForecastServer, str]:
+    """
+    Запускает сервер в фоновом потоке.
+    Возвращает сервер и базовый адрес вида http://host:port.
+    """
+    with open(payload_path, 'rb') as file:
+        payload = file.read()
+    handler = type(
+        'ExampleForecastRequestHandler',
+        (ForecastRequestHandler,),
+        {
+            'payload': payload,
+            'etag': make_etag(payload),
+            'latency': latency,
+            'jitter': jitter,
+        },
+    )
+    return serve(handler, host, port)
+
+
+def start_synthetic_server(
+    amount: int,
+    seed: int = 0,
+    minimal: bool = False,
+    host: str = '127.0.0.1',
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+) -> tuple[ForecastServer, str]:
+    """
+    Запускает в фоновом потоке сервер amount синтетических городов,
+    доступных по адресам {base_url}/city_<номер>.json.
+    """
+    handler = type(
+        'SyntheticCitiesRequestHandler',
+        (SyntheticForecastRequestHandler,),
+        {
+            'amount': amount,
+            'seed': seed,
+            'minimal': minimal,
+            'latency': latency,
+            'jitter': jitter,
+        },
+    )
+    return serve(handler, host, port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1', type=str)
+    parser.add_argument('--port', default=8000, type=int)
+    parser.add_argument('--payload', default=EXAMPLE_RESPONSE_PATH, type=str)
+    parser.add_argument('--synthetic', default=0, type=int)
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--minimal', action='store_true')
+    parser.add_argument('--latency', default=0.0, type=float)
+    parser.add_argument('--jitter', default=0.0, type=float)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        server, base_url = start_synthetic_server(
+            args.synthetic,
+            args.seed,
+            args.minimal,
+            args.host,
+            args.port,
+            args.latency,
+            args.jitter,
+        )
+        print(f'Serving {args.synthetic} synthetic cities at {base_url}')
+    else:
+        server, base_url = start_forecast_server(
+            args.payload,
+            args.host,
+            args.port,
+            args.latency,
+            args.jitter,
+        )
+        print(f'Serving {args.payload} at {base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
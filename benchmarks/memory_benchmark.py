@@ -0,0 +1,96 @@
+"""
+Пиковое потребление памяти (RSS) полного запуска forecast_weather
+на синтетических городах, отдаваемых локальным сервером
+(benchmarks/forecast_server.py): без бюджета памяти и с --memory-budget.
+Каждый запуск выполняется в отдельном процессе, отчет пишется
+во временную директорию.
+
+Запуск из корня репозитория:
+    python -m benchmarks.memory_benchmark -n 20000 --memory-budget 64
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from multiprocessing.queues import Queue
+
+from benchmarks.forecast_server import start_synthetic_server
+from benchmarks.synthetic import MAX_CITIES, city_name
+from external.metrics import peak_rss
+from spill import megabytes
+
+
+def run_forecast(
+    cities: dict[str, str],
+    memory_budget: int | None,
+    work_dir: str,
+    results: Queue,
+) -> None:
+    from forecasting import forecast_weather
+
+    logging.getLogger().setLevel(logging.WARNING)
+    os.chdir(work_dir)
+    started = time.perf_counter()
+    forecast_weather(
+        cities=cities,
+        report_formats=('csv',),
+        memory_budget=memory_budget,
+    )
+    results.put((time.perf_counter() - started, peak_rss()))
+
+
+def measure(
+    cities: dict[str, str],
+    memory_budget: int | None,
+) -> tuple[float, tuple[int, int] | None]:
+    # NOTE: spawn, so that every run starts from a fresh interpreter
+    context = multiprocessing.get_context('spawn')
+    results: Queue = context.Queue()
+    with tempfile.TemporaryDirectory() as work_dir:
+        process = context.Process(
+            target=run_forecast,
+            args=(cities, memory_budget, work_dir, results),
+        )
+        process.start()
+        result = results.get()
+        process.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=20000, type=int)
+    parser.add_argument(
+        '--memory-budget',
+        default=64,
+        type=int,
+        metavar='MB',
+    )
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+    if not 10 <= args.cities <= MAX_CITIES:
+        parser.error(f'--cities must be in 10..{MAX_CITIES}')
+
+    server, base_url = start_synthetic_server(args.cities, seed=args.seed)
+    cities = {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(args.cities)
+    }
+    print(f'cities: {args.cities}')
+    try:
+        for memory_budget in (None, args.memory_budget * 1024 * 1024):
+            seconds, usage = measure(cities, memory_budget)
+            label: str = (
+                'no budget' if memory_budget is None
+                else f'budget {megabytes(memory_budget)}'
+            )
+            rss: str = 'n/a' if usage is None else megabytes(usage[0])
+            print(f'{label}: {seconds:.1f}s, peak RSS {rss}')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
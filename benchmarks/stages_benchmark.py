@@ -0,0 +1,221 @@
+"""
+Поэтапное время работы на синтетических городах, отдаваемых локальным
+сервером (benchmarks/forecast_server.py) с заданной задержкой:
+DataFetchingTask, CalculationPool (DataCalculationTask), DataAnalyzingTask,
+DataAggregationTask и запись ReportExcelTable.
+Результат выводится в JSON, чтобы запуски можно было сравнивать.
+Для десятков тысяч городов стоит указывать --minimal: все ответы
+этапа загрузки одновременно находятся в памяти.
+
+Запуск из корня репозитория:
+    python -m benchmarks.stages_benchmark -n 1000 --latency 0.02 \\
+        --jitter 0.01 -o stages.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from benchmarks.forecast_server import start_synthetic_server
+from benchmarks.synthetic import MAX_CITIES, city_name
+from calculation_pool import CalculationPool
+from external.client import YandexWeatherAPI
+from tasks import (
+    DEFAULT_FETCH_CONCURRENCY, DataAggregationTask, DataAnalyzingTask,
+    DataFetchingTask)
+from utils import ReportExcelTable, excel_report_table_settings
+
+STAGES = ('fetching', 'calculation', 'analyzing', 'aggregation', 'report')
+
+
+@contextmanager
+def stage(timings: dict[str, dict[str, Any]], name: str) -> Iterator[dict]:
+    """
+    Замеряет время этапа; количество обработанных элементов
+    записывается в timing['items'] внутри блока.
+    """
+    timing: dict[str, Any] = {'items': 0}
+    started: float = time.perf_counter()
+    yield timing
+    timing['seconds'] = round(time.perf_counter() - started, 6)
+    timing['items_per_second'] = (
+        round(timing['items'] / timing['seconds'], 1)
+        if timing['seconds']
+        else None
+    )
+    timings[name] = timing
+
+
+def run_stages(
+    cities: dict[str, str],
+    args: argparse.Namespace,
+    report_path: str,
+    calculation_pool: CalculationPool,
+) -> dict[str, dict[str, Any]]:
+    """
+    Один прогон всех этапов; пул процессов общий для всех прогонов.
+    """
+    timings: dict[str, dict[str, Any]] = {}
+    with stage(timings, 'fetching') as timing:
+        fetching_task = DataFetchingTask(cities, YandexWeatherAPI)
+        fetched_data = (
+            fetching_task.get_weather_data_async(args.concurrency)
+            if args.async_fetch
+            else fetching_task.get_weather_data()
+        )
+        timing['items'] = sum(bool(data) for _, data in fetched_data)
+        timing['failed'] = len(fetched_data) - timing['items']
+
+    with stage(timings, 'calculation') as timing:
+        analyses = calculation_pool.calculate(fetched_data)
+        timing['items'] = len(analyses)
+        timing['plan'] = str(calculation_pool.last_plan)
+        timing['workers'] = {
+            worker: round(stats.cities_per_second, 1)
+            for worker, stats in calculation_pool.worker_stats.items()
+        }
+    del fetched_data
+
+    rates: dict[str, tuple[float, float, float]] = {}
+    with stage(timings, 'analyzing') as timing:
+        DataAnalyzingTask(analyses.values(), rates).rate_data()
+        timing['items'] = len(rates)
+
+    with stage(timings, 'aggregation') as timing:
+        aggregation_task = DataAggregationTask(
+            analyses.values(),
+            rates,
+            report_files=[],
+        )
+        aggregation_task.aggregate_data()
+        timing['items'] = len(aggregation_task.results_for_report)
+
+    with stage(timings, 'report') as timing:
+        DataAggregationTask.write_report(
+            [ReportExcelTable(report_path, excel_report_table_settings)],
+            aggregation_task.results_for_report,
+        )
+        timing['items'] = len(aggregation_task.results_for_report)
+        timing['bytes'] = os.path.getsize(report_path)
+    return timings
+
+
+def summarize(runs: list[dict[str, dict[str, Any]]]) -> dict[str, Any]:
+    summary: dict[str, Any] = {}
+    for name in STAGES:
+        seconds = [run[name]['seconds'] for run in runs]
+        summary[name] = {
+            'median_seconds': round(statistics.median(seconds), 6),
+            'min_seconds': min(seconds),
+            'max_seconds': max(seconds),
+        }
+    summary['total_median_seconds'] = round(
+        sum(summary[name]['median_seconds'] for name in STAGES),
+        6,
+    )
+    return summary
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=1000, type=int)
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument(
+        '--minimal',
+        action='store_true',
+        help='serve only the fields the analyzer reads',
+    )
+    parser.add_argument('--latency', default=0.0, type=float)
+    parser.add_argument('--jitter', default=0.0, type=float)
+    parser.add_argument('--async-fetch', action='store_true')
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        default=DEFAULT_FETCH_CONCURRENCY,
+        type=int,
+    )
+    parser.add_argument(
+        '-w',
+        '--workers',
+        default=None,
+        type=int,
+        help='maximum number of calculation processes',
+    )
+    parser.add_argument('--batch-size', default=None, type=int)
+    parser.add_argument('--shared-memory', action='store_true')
+    parser.add_argument('-r', '--repeat', default=1, type=int)
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        type=str,
+        help='JSON file for the results (stdout by default)',
+    )
+    args = parser.parse_args()
+    if not 10 <= args.cities <= MAX_CITIES:
+        parser.error(f'--cities must be in 10..{MAX_CITIES}')
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    server, base_url = start_synthetic_server(
+        args.cities,
+        seed=args.seed,
+        minimal=args.minimal,
+        latency=args.latency,
+        jitter=args.jitter,
+    )
+    cities = {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(args.cities)
+    }
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    runs: list[dict[str, dict[str, Any]]] = []
+    calculation_pool = CalculationPool(
+        args.workers,
+        args.batch_size,
+        shared_memory=args.shared_memory,
+    )
+    try:
+        with tempfile.TemporaryDirectory() as work_dir, calculation_pool:
+            for _ in range(args.repeat):
+                runs.append(
+                    run_stages(
+                        cities,
+                        args,
+                        os.path.join(work_dir, 'results.xlsx'),
+                        calculation_pool,
+                    )
+                )
+    finally:
+        server.shutdown()
+
+    result = {
+        'benchmark': 'stages',
+        'started_at': started_at,
+        'parameters': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'runs': runs,
+        'summary': summarize(runs),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output is None:
+        print(output)
+        return
+    with open(args.output, 'w') as file:
+        file.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Время холодного старта forecasting.py: от запуска интерпретатора
+до первого запроса прогноза (импорты, разбор аргументов, проверка
+доступности серверов) и до завершения работы. Города подменяются
+синтетическими (benchmarks/forecast_server.py), каждый запуск
+выполняется в новой временной директории, без кэша ответов.
+Аргументы после -- передаются forecasting.py.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup_benchmark -r 5 -- --report-format csv
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from benchmarks.forecast_server import SyntheticForecastRequestHandler, serve
+from benchmarks.synthetic import city_name
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# NOTE: runs forecasting.py as __main__ with the cities replaced
+CHILD_CODE = '''
+import json, os, runpy, sys
+root = sys.argv[1]
+sys.path.insert(0, root)
+import utils
+utils.CITIES.clear()
+utils.CITIES.update(json.loads(sys.argv[2]))
+script = os.path.join(root, 'forecasting.py')
+sys.argv = [script, *sys.argv[3:]]
+runpy.run_path(script, run_name='__main__')
+'''
+
+
+class FirstRequestHandler(SyntheticForecastRequestHandler):
+    """
+    Обработчик, запоминающий время первого запроса после reset().
+    """
+    first_request_at: float | None = None
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.first_request_at = None
+
+    def do_GET(self) -> None:
+        with self.lock:
+            if FirstRequestHandler.first_request_at is None:
+                FirstRequestHandler.first_request_at = time.time()
+        super().do_GET()
+
+
+def run_once(
+    cities: dict[str, str],
+    forecasting_args: list[str],
+) -> dict[str, Any]:
+    FirstRequestHandler.reset()
+    with tempfile.TemporaryDirectory() as work_dir:
+        started: float = time.time()
+        completed = subprocess.run(
+            [
+                sys.executable,
+                '-c',
+                CHILD_CODE,
+                REPOSITORY_ROOT,
+                json.dumps(cities),
+                '--no-cache',
+                *forecasting_args,
+            ],
+            cwd=work_dir,
+            capture_output=True,
+        )
+        finished: float = time.time()
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.decode(errors='replace'))
+    first_request_at = FirstRequestHandler.first_request_at
+    return {
+        'cold_start_seconds': (
+            round(first_request_at - started, 6)
+            if first_request_at is not None
+            else None
+        ),
+        'total_seconds': round(finished - started, 6),
+    }
+
+
+def summarize(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    summary: dict[str, Any] = {}
+    for name in ('cold_start_seconds', 'total_seconds'):
+        values = [run[name] for run in runs if run[name] is not None]
+        if values:
+            summary[f'median_{name}'] = round(statistics.median(values), 6)
+            summary[f'min_{name}'] = min(values)
+    return summary
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--cities', default=18, type=int)
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('-r', '--repeat', default=5, type=int)
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        type=str,
+        help='JSON file for the results (stdout by default)',
+    )
+    parser.add_argument(
+        'forecasting_args',
+        nargs=argparse.REMAINDER,
+        help='arguments of forecasting.py (after --)',
+    )
+    args = parser.parse_args()
+    if args.forecasting_args[:1] == ['--']:
+        args.forecasting_args = args.forecasting_args[1:]
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    handler = type(
+        'BenchmarkRequestHandler',
+        (FirstRequestHandler,),
+        {'amount': args.cities, 'seed': args.seed},
+    )
+    server, base_url = serve(handler, '127.0.0.1', 0)
+    cities = {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(args.cities)
+    }
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    try:
+        runs = [
+            run_once(cities, args.forecasting_args)
+            for _ in range(args.repeat)
+        ]
+    finally:
+        server.shutdown()
+
+    result = {
+        'benchmark': 'startup',
+        'started_at': started_at,
+        'parameters': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'runs': runs,
+        'summary': summarize(runs),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output is None:
+        print(output)
+        return
+    with open(args.output, 'w') as file:
+        file.write(output)
+
+
+if __name__ == '__main__':
+    main()
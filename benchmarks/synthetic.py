@@ -0,0 +1,150 @@
+"""
+Генератор синтетических городов для бенчмарков: ответы повторяют
+структуру examples/response.json (все разделы, 5 дней, неполные
+последние дни), а температура и осадки правдоподобно меняются
+по часам. Ответ города однозначно определяется (seed, номер города),
+поэтому сервер может создавать его по запросу, не храня все города.
+
+Пример:
+    python -m benchmarks.synthetic -n 3 --seed 1 > /tmp/city.json
+"""
+import argparse
+import json
+import math
+import random
+from functools import lru_cache
+from typing import Any, Iterator
+
+from external.analyzer import load_data
+from external.batch_analyzer import CONDITIONS
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+MAX_CITIES = 100_000
+
+DRY_CONDITIONS = ('clear', 'partly-cloudy', 'cloudy', 'overcast')
+# NOTE: the weather keeps its condition for a while instead of
+# changing every hour
+CONDITION_PERSISTENCE = 0.8
+# NOTE: the only fields kept with minimal=True (the ones the analyzer reads)
+ANALYSED_HOUR_FIELDS = ('hour', 'temp', 'condition')
+ANALYSED_DAY_FIELDS = ('date', 'hours')
+
+
+def city_name(number: int) -> str:
+    return f'CITY_{number}'
+
+
+@lru_cache(maxsize=1)
+def load_template() -> dict[str, Any]:
+    return load_data(EXAMPLE_RESPONSE_PATH)
+
+
+def make_hours(
+    template_hours: list[dict[str, Any]],
+    randomizer: random.Random,
+    climate_temperature: float,
+    condition: str,
+    minimal: bool,
+) -> tuple[list[dict[str, Any]], str]:
+    """
+    Часы одного дня: суточный ход температуры с максимумом около 15 часов
+    и сменяющие друг друга условия.
+    """
+    amplitude: float = randomizer.uniform(3, 8)
+    day_shift: float = randomizer.gauss(0, 2)
+    hours: list[dict[str, Any]] = []
+    for template_hour in template_hours:
+        hour = int(template_hour['hour'])
+        temperature = round(
+            climate_temperature + day_shift
+            + amplitude * math.sin(math.pi * (hour - 9) / 12)
+            + randomizer.gauss(0, 0.7)
+        )
+        if randomizer.random() > CONDITION_PERSISTENCE:
+            condition = randomizer.choice(CONDITIONS)
+        if minimal:
+            hour_data = {
+                field: template_hour[field] for field in ANALYSED_HOUR_FIELDS
+            }
+        else:
+            hour_data = dict(template_hour)
+            hour_data['feels_like'] = temperature - randomizer.randint(0, 4)
+            hour_data['prec_mm'] = (
+                0 if condition in DRY_CONDITIONS
+                else round(randomizer.uniform(0.1, 5), 1)
+            )
+        hour_data['temp'] = temperature
+        hour_data['condition'] = condition
+        hours.append(hour_data)
+    return hours, condition
+
+
+def make_forecast(
+    number: int,
+    seed: int = 0,
+    minimal: bool = False,
+) -> dict[str, Any]:
+    """
+    Ответ API для синтетического города с номером number.
+    """
+    template: dict[str, Any] = load_template()
+    randomizer = random.Random(f'{seed}:{number}')
+    climate_temperature: float = randomizer.uniform(-25, 32)
+    condition: str = randomizer.choice(CONDITIONS)
+    forecasts: list[dict[str, Any]] = []
+    for template_day in template['forecasts']:
+        hours, condition = make_hours(
+            template_day['hours'],
+            randomizer,
+            climate_temperature,
+            condition,
+            minimal,
+        )
+        day = (
+            {field: template_day[field] for field in ANALYSED_DAY_FIELDS}
+            if minimal
+            else dict(template_day)
+        )
+        day['hours'] = hours
+        forecasts.append(day)
+    if minimal:
+        return {'forecasts': forecasts}
+    forecast: dict[str, Any] = dict(template)
+    forecast['info'] = dict(
+        template['info'],
+        lat=randomizer.uniform(-60, 70),
+        lon=randomizer.uniform(-180, 180),
+    )
+    forecast['forecasts'] = forecasts
+    return forecast
+
+
+def make_payload(number: int, seed: int = 0, minimal: bool = False) -> bytes:
+    return json.dumps(make_forecast(number, seed, minimal)).encode('utf-8')
+
+
+def generate_cities(
+    amount: int,
+    seed: int = 0,
+    minimal: bool = False,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Пары (город, ответ API) для amount городов, по одной за раз.
+    """
+    if not 0 < amount <= MAX_CITIES:
+        raise ValueError(f'Amount of cities must be in 1..{MAX_CITIES}.')
+    for number in range(amount):
+        yield city_name(number), make_forecast(number, seed, minimal)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', default=0, type=int)
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--minimal', action='store_true')
+    args = parser.parse_args()
+    print(make_payload(args.number, args.seed, args.minimal).decode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import logging
+import math
+import pickle
+import time
+from dataclasses import dataclass
+from multiprocessing import Queue, cpu_count
+from queue import Empty
+from typing import Any, Callable
+
+from external.analyzer import AnalysisWindow
+from external.metrics import DEFAULT_SAMPLING_INTERVAL, METRICS
+from models import CityAnalysis
+from tasks import (
+    STOP_SIGNAL, CalculationBatchResult, DataCalculationTask, calculate_city,
+    iter_calculation_results, log_failed_cities)
+
+BATCHES_PER_WORKER = 4
+MAX_BATCH_SIZE = 512
+# NOTE: starting estimate for one process start, replaced by measurements
+DEFAULT_SPAWN_COST = 0.02
+# NOTE: weight of the newest measurement in the running cost estimates
+COST_SMOOTHING = 0.5
+IN_PROCESS_WORKER = 'MainProcess'
+
+
+def smooth(previous: float | None, measured: float) -> float:
+    if previous is None:
+        return measured
+    return previous + COST_SMOOTHING * (measured - previous)
+
+
+@dataclass
+class WorkerStats:
+    """
+    Производительность одного процесса (или основного процесса).
+    """
+    batches: int = 0
+    cities: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def cities_per_second(self) -> float:
+        return self.cities / self.busy_seconds if self.busy_seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'batches: {self.batches}, cities: {self.cities}, '
+            f'{self.cities_per_second:.1f} cities/s'
+        )
+
+
+@dataclass
+class CalculationPlan:
+    """
+    Число процессов и размер пачки для одного запуска.
+    """
+    workers: int
+    batch_size: int
+    estimated_seconds: float
+
+    def __str__(self) -> str:
+        if self.workers == 0:
+            return f'in-process, estimated {self.estimated_seconds:.3f}s'
+        return (
+            f'{self.workers} workers, batches of {self.batch_size} cities, '
+            f'estimated {self.estimated_seconds:.3f}s'
+        )
+
+
+class CalculationPool:
+    """
+    Пул процессов DataCalculationTask для этапа вычислений.
+    Перед каждым запуском по одному городу измеряются стоимость анализа
+    и передачи данных процессу, а по прошлым запускам — стоимость старта
+    процесса; число процессов выбирается так, чтобы минимизировать
+    оценку времени (0 — анализ в основном процессе, например, для
+    нескольких десятков городов). Города передаются пачками, одно
+    сообщение очереди на пачку. Запущенные процессы сохраняются между
+    вызовами calculate до close(), поэтому при использовании
+    как библиотеки повторные запуски не тратят время на fork.
+    С shared_memory города упаковываются в массивы (pack_forecasts)
+    в общей памяти, и через очередь передаются только описания пачек;
+    дополнительные окна анализа в этом режиме не поддерживаются.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        batch_size: int | None = None,
+        windows: list[AnalysisWindow] | None = None,
+        metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+        shared_memory: bool = False,
+    ) -> None:
+        """
+        batch_size — фиксированный размер пачки (по умолчанию подбирается
+        так, чтобы на процесс приходилось BATCHES_PER_WORKER пачек).
+        """
+        if shared_memory and windows:
+            raise ValueError(
+                'Additional analysis windows are not supported '
+                'with shared memory transport.'
+            )
+        self.max_workers: int = max_workers or cpu_count()
+        self.batch_size = batch_size
+        self.windows = windows
+        self.metrics_interval = metrics_interval
+        self.shared_memory = shared_memory
+        self.input_queue: Queue = Queue()
+        self.output_queue: Queue = Queue()
+        self.workers: list[DataCalculationTask] = []
+        self.city_cost: float | None = None
+        self.transfer_cost: float | None = None
+        self.spawn_cost: float = DEFAULT_SPAWN_COST
+        self.spawned: int = 0
+        self.last_plan: CalculationPlan | None = None
+        self.worker_stats: dict[str, WorkerStats] = {}
+        self.on_batch: Callable[[list[CityAnalysis]], None] | None = None
+
+    def __enter__(self) -> 'CalculationPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def estimate(self, cities_amount: int, workers: int) -> float:
+        """
+        Оценка времени вычислений: старт новых процессов и передача данных
+        выполняются основным процессом последовательно, анализ — параллельно
+        (но не более чем на cpu_count() ядрах).
+        """
+        if workers == 0:
+            return cities_amount * self.city_cost
+        new_workers: int = max(0, workers - len(self.workers))
+        return new_workers * self.spawn_cost + cities_amount * (
+            self.transfer_cost + self.city_cost / min(workers, cpu_count())
+        )
+
+    def plan(self, cities_amount: int) -> CalculationPlan:
+        workers: int = min(
+            range(min(self.max_workers, cities_amount) + 1),
+            key=lambda amount: (self.estimate(cities_amount, amount), amount),
+        )
+        batch_size: int = self.batch_size or min(
+            MAX_BATCH_SIZE,
+            max(
+                1,
+                math.ceil(
+                    cities_amount / (max(workers, 1) * BATCHES_PER_WORKER)
+                ),
+            ),
+        )
+        return CalculationPlan(
+            workers,
+            batch_size,
+            self.estimate(cities_amount, workers),
+        )
+
+    def calculate(
+        self,
+        fetched_data: tuple[tuple[str, dict[str, Any] | None], ...],
+        on_batch: Callable[[list[CityAnalysis]], None] | None = None,
+    ) -> dict[str, CityAnalysis]:
+        """
+        Вычисление погодных параметров для загруженных городов;
+        on_batch получает результаты каждой пачки по мере готовности.
+        """
+        self.on_batch = on_batch
+        cities: list[tuple[str, dict[str, Any]]] = [
+            city for city in fetched_data if city[1]
+        ]
+        if not cities:
+            return {}
+        analyses: dict[str, CityAnalysis] = {}
+        self.account(self.measure(*cities[0]), analyses)
+        plan: CalculationPlan = self.plan(len(cities) - 1)
+        self.last_plan = plan
+        logging.info(f'Calculation plan: {plan}.')
+        if plan.workers == 0:
+            self.account(self.calculate_in_process(cities[1:]), analyses)
+        else:
+            self.start_workers(plan.workers)
+            probes = {
+                'calculation_input': self.input_queue.qsize,
+                'calculation_output': self.output_queue.qsize,
+            }
+            with METRICS.sampling(probes, self.metrics_interval):
+                if self.shared_memory:
+                    self.calculate_shared(
+                        cities[1:],
+                        plan.batch_size,
+                        analyses,
+                    )
+                else:
+                    self.dispatch(cities[1:], plan.batch_size)
+                    self.collect(len(cities) - 1, analyses)
+        for worker, stats in self.worker_stats.items():
+            METRICS.set_gauge(
+                'worker_cities_per_second',
+                round(stats.cities_per_second, 1),
+                worker=worker,
+            )
+        return analyses
+
+    def measure(
+        self,
+        city_name: str,
+        city_data: dict[str, Any],
+    ) -> CalculationBatchResult:
+        """
+        Анализирует город в основном процессе, обновляя оценки стоимости
+        анализа и передачи (сериализации или упаковки в общую память)
+        данных одного города.
+        """
+        started: float = time.perf_counter()
+        if self.shared_memory:
+            from external.batch_analyzer import pack_forecasts
+
+            pack_forecasts([(city_name, city_data)])
+        else:
+            pickle.dumps(city_data, pickle.HIGHEST_PROTOCOL)
+        self.transfer_cost = smooth(
+            self.transfer_cost,
+            time.perf_counter() - started,
+        )
+        return self.calculate_in_process([(city_name, city_data)])
+
+    def calculate_in_process(
+        self,
+        cities: list[tuple[str, dict[str, Any]]],
+    ) -> CalculationBatchResult:
+        analyses: list[CityAnalysis] = []
+        failed: list[str] = []
+        started: float = time.perf_counter()
+        for city_name, city_data in cities:
+            with METRICS.span('analyze', 'city', city=city_name):
+                try:
+                    analyses.append(
+                        calculate_city(city_name, city_data, self.windows)
+                    )
+                except Exception:
+                    failed.append(city_name)
+        return CalculationBatchResult(
+            worker=IN_PROCESS_WORKER,
+            analyses=analyses,
+            failed=failed,
+            seconds=time.perf_counter() - started,
+        )
+
+    def start_workers(self, amount: int) -> None:
+        """
+        Добавляет процессы до amount; уже запущенные переиспользуются.
+        """
+        new_workers: list[DataCalculationTask] = [
+            DataCalculationTask(
+                self.input_queue,
+                output_queue=self.output_queue,
+                windows=self.windows,
+                collect_metrics=METRICS.enabled,
+            ) for _ in range(amount - len(self.workers))
+        ]
+        if not new_workers:
+            return
+        started: float = time.perf_counter()
+        for worker in new_workers:
+            worker.start()
+        self.spawn_cost = smooth(
+            self.spawn_cost if self.spawned else None,
+            (time.perf_counter() - started) / len(new_workers),
+        )
+        self.spawned += len(new_workers)
+        self.workers.extend(new_workers)
+
+    def dispatch(
+        self,
+        cities: list[tuple[str, dict[str, Any]]],
+        batch_size: int,
+    ) -> None:
+        for position in range(0, len(cities), batch_size):
+            self.input_queue.put(cities[position:position + batch_size])
+
+    def calculate_shared(
+        self,
+        cities: list[tuple[str, dict[str, Any]]],
+        batch_size: int,
+        analyses: dict[str, CityAnalysis],
+    ) -> None:
+        """
+        Передача пачек через общую память; сегмент удаляется после
+        получения результатов, в том числе при аварийном завершении
+        процесса.
+        """
+        from external.batch_analyzer import pack_forecasts
+        from external.shared_batch import SharedForecastBatch
+
+        with SharedForecastBatch(pack_forecasts(cities)) as shared_batch:
+            for batch_slice in shared_batch.slices(batch_size):
+                self.input_queue.put(batch_slice)
+            self.collect(len(shared_batch.cities), analyses)
+
+    def collect(
+        self,
+        cities_amount: int,
+        analyses: dict[str, CityAnalysis],
+    ) -> None:
+        """
+        Получает результаты всех пачек; если какой-либо процесс аварийно
+        завершился, его пачка потеряна и пул больше не может работать.
+        """
+        accounted: int = 0
+        while accounted < cities_amount:
+            try:
+                result: CalculationBatchResult = self.output_queue.get(
+                    timeout=1
+                )
+            except Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError(
+                        'A calculation process exited abnormally.'
+                    )
+                continue
+            self.account(result, analyses)
+            accounted += len(result.analyses) + len(result.failed)
+
+    def account(
+        self,
+        result: CalculationBatchResult,
+        analyses: dict[str, CityAnalysis],
+    ) -> None:
+        """
+        Учитывает результат пачки в итогах и оценке стоимости анализа.
+        """
+        for analysis in result.analyses:
+            analyses[analysis.city] = analysis
+        if self.on_batch is not None:
+            self.on_batch(result.analyses)
+        log_failed_cities(result.failed)
+        if result.metrics is not None:
+            METRICS.merge(result.metrics)
+        cities_amount: int = len(result.analyses) + len(result.failed)
+        stats = self.worker_stats.setdefault(result.worker, WorkerStats())
+        stats.batches += 1
+        stats.cities += cities_amount
+        stats.busy_seconds += result.seconds
+        if cities_amount:
+            self.city_cost = smooth(
+                self.city_cost,
+                result.seconds / cities_amount,
+            )
+
+    def summary(self) -> str:
+        return '; '.join(
+            f'{worker}: {stats}'
+            for worker, stats in sorted(self.worker_stats.items())
+        )
+
+    def close(self) -> None:
+        """
+        Останавливает процессы пула.
+        """
+        for _ in self.workers:
+            self.input_queue.put(STOP_SIGNAL)
+        for _ in iter_calculation_results(self.output_queue, self.workers):
+            pass
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
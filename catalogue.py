@@ -0,0 +1,207 @@
+import csv
+import json
+import logging
+import mmap
+import os
+import threading
+from array import array
+from collections.abc import Mapping
+from typing import Iterator, NamedTuple
+
+CATALOGUE_FIELDS = ('code', 'url', 'name')
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+class UnknownCityError(KeyError):
+    """
+    Города нет в каталоге.
+    """
+
+    def __str__(self) -> str:
+        return 'Please check that city {} exists'.format(*self.args)
+
+
+class CityRecord(NamedTuple):
+    code: str
+    url: str
+    name: str
+
+
+class CityCatalogue(Mapping):
+    """
+    Каталог городов (код -> URL прогноза) из файла CSV с заголовком
+    code,url,name или JSON Lines с теми же ключами; одна запись
+    на строку, name необязательно. Файл отображается в память (mmap),
+    индекс строится при первом обращении: смещения строк в array
+    и номера строк по коду и по названию. Записи разбираются при каждом
+    обращении, поэтому в памяти хранятся только индекс и коды.
+    Повторяющиеся коды пропускаются с предупреждением.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.json_lines: bool = path.endswith(JSON_LINES_EXTENSIONS)
+        with open(path, 'rb') as file:
+            # NOTE: an empty file cannot be mapped
+            self.data: mmap.mmap | bytes = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(file.fileno()).st_size
+                else b''
+            )
+        self.columns: tuple[str, ...] = CATALOGUE_FIELDS
+        self.offsets: array | None = None
+        self.codes: dict[str, int] = {}
+        self.names_index: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> 'CityCatalogue':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def lines(self, offsets: array) -> Iterator[str]:
+        """
+        Строки файла; смещение начала каждой строки (и конец файла)
+        добавляется в offsets.
+        """
+        position: int = 0
+        if isinstance(self.data, mmap.mmap):
+            self.data.seek(0)
+            for line in iter(self.data.readline, b''):
+                offsets.append(position)
+                position += len(line)
+                yield line.decode('utf-8')
+        offsets.append(position)
+
+    def build_index(self) -> None:
+        """
+        Смещения строк и номера строк по коду и названию; из строк
+        берутся только эти поля.
+        """
+        offsets = array('q')
+        lines: Iterator[str] = self.lines(offsets)
+        keys: Iterator[tuple[str, str | None]]
+        if self.json_lines:
+            keys = (
+                (row['code'], row.get('name'))
+                for row in (json.loads(line) for line in lines if line.strip())
+            )
+        else:
+            keys = self.csv_keys(lines)
+        for code, name in keys:
+            # NOTE: the row comes from the last line read so far
+            self.add_to_index(code, name, len(offsets) - 1)
+        self.offsets = offsets
+
+    def csv_keys(self, lines: Iterator[str]) -> Iterator[tuple[str, str]]:
+        rows: Iterator[list[str]] = csv.reader(lines)
+        self.columns = tuple(next(rows, CATALOGUE_FIELDS))
+        if 'code' not in self.columns or 'url' not in self.columns:
+            raise ValueError(
+                f'{self.path}: the header must contain code and url.'
+            )
+        code_column: int = self.columns.index('code')
+        name_column: int | None = (
+            self.columns.index('name') if 'name' in self.columns else None
+        )
+        for row in rows:
+            if row:
+                yield row[code_column], (
+                    row[name_column]
+                    if name_column is not None and name_column < len(row)
+                    else None
+                )
+
+    def add_to_index(self, code: str, name: str | None, line: int) -> None:
+        if code in self.codes:
+            logging.warning(
+                f'{self.path}: duplicate city code {code} skipped.'
+            )
+            return
+        self.codes[code] = line
+        if name:
+            self.names_index.setdefault(name, line)
+
+    def parse_row(self, row: list[str] | dict[str, str]) -> CityRecord | None:
+        if not row:
+            return None
+        if isinstance(row, list):
+            row = dict(zip(self.columns, row))
+        return CityRecord(
+            row['code'],
+            row['url'],
+            row.get('name') or row['code'],
+        )
+
+    def ensure_index(self) -> None:
+        if self.offsets is not None:
+            return
+        with self.lock:
+            if self.offsets is None:
+                self.build_index()
+
+    def record(self, line: int) -> CityRecord:
+        """
+        Запись из строки line файла.
+        """
+        text: str = self.data[
+            self.offsets[line]:self.offsets[line + 1]
+        ].decode('utf-8')
+        row = json.loads(text) if self.json_lines else next(csv.reader([text]))
+        return self.parse_row(row)
+
+    def get_record(self, code: str) -> CityRecord:
+        self.ensure_index()
+        try:
+            return self.record(self.codes[code])
+        except KeyError:
+            raise UnknownCityError(code) from None
+
+    def get_record_by_name(self, name: str) -> CityRecord:
+        self.ensure_index()
+        try:
+            return self.record(self.names_index[name])
+        except KeyError:
+            raise UnknownCityError(name) from None
+
+    def __getitem__(self, code: str) -> str:
+        return self.get_record(code).url
+
+    def __contains__(self, code: object) -> bool:
+        self.ensure_index()
+        return code in self.codes
+
+    def __iter__(self) -> Iterator[str]:
+        self.ensure_index()
+        return iter(self.codes)
+
+    def __len__(self) -> int:
+        self.ensure_index()
+        return len(self.codes)
+
+    @property
+    def names(self) -> 'CatalogueNames':
+        return CatalogueNames(self)
+
+
+class CatalogueNames(Mapping):
+    """
+    Названия городов каталога по кодам (как CITIES_NAMES_TRANSLATION).
+    """
+
+    def __init__(self, catalogue: CityCatalogue) -> None:
+        self.catalogue = catalogue
+
+    def __getitem__(self, code: str) -> str:
+        return self.catalogue.get_record(code).name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.catalogue)
+
+    def __len__(self) -> int:
+        return len(self.catalogue)
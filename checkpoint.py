@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import struct
+import threading
+import zlib
+from queue import Queue
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from external.analyzer import AnalysisWindow, Forecast
+from models import CityAnalysis
+
+DEFAULT_CHECKPOINT_DIR = '.checkpoint'
+MANIFEST_FILE_NAME = 'manifest.json'
+FETCHED_FILE_NAME = 'fetched.log'
+ANALYSED_FILE_NAME = 'analysed.log'
+RATING_FILE_NAME = 'rating.log'
+STAGE_FILE_NAMES = (FETCHED_FILE_NAME, ANALYSED_FILE_NAME, RATING_FILE_NAME)
+# NOTE: city code length, payload length, CRC32 of the code and payload
+RECORD_HEADER = struct.Struct('<HII')
+
+Rates = dict[str, tuple[float, float, float]]
+
+
+def compact_forecast(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Ответ API только с анализируемыми полями.
+    """
+    return Forecast.from_json(data).to_json()
+
+
+def analysis_settings(
+    windows: list[AnalysisWindow] | None,
+    rank_window: str | None,
+    scoring: str,
+) -> dict[str, Any]:
+    """
+    Настройки, от которых зависят результаты анализа и рейтинга.
+    """
+    return {
+        'windows': [
+            [
+                window.name,
+                window.hour_start,
+                window.hour_end,
+                sorted(window.conditions),
+            ]
+            for window in windows or []
+        ],
+        'rank_window': rank_window,
+        'scoring': scoring,
+    }
+
+
+class CheckpointLog:
+    """
+    Журнал одного этапа: записи (код города, данные) только добавляются
+    в конец файла. Запись — заголовок RECORD_HEADER и код города
+    с данными в pickle; запись, оборванная при аварийном завершении,
+    определяется по длине и CRC32 и отбрасывается (файл усекается
+    до последней целой записи). append только ставит данные в очередь:
+    преобразование compact, pickle и запись выполняет фоновый поток,
+    поэтому загрузка городов не ждет журнал. Данные, которые не удалось
+    преобразовать или сохранить, в журнал не попадают (город будет
+    обработан заново), а запуск продолжается. Записанное сразу
+    передается ОС, flush дожидается очереди и сбрасывает записи на диск
+    (fsync). В памяти хранится только индекс: код города -> смещение
+    и размер данных; данные читаются по требованию.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compact: Callable[[Any], Any] | None = None,
+    ) -> None:
+        self.path = path
+        self.compact = compact
+        self.index: dict[str, tuple[int, int]] = {}
+        self.lock = threading.Lock()
+        self.size: int = self.scan()
+        if os.path.exists(path):
+            os.truncate(path, self.size)
+        self.file = open(path, 'ab', buffering=0)
+        self.reader = open(path, 'rb')
+        # NOTE: cities in the log or queued, checked by the callers
+        self.cities: set[str] = set(self.index)
+        self.queue: Queue[tuple[str, Any] | None] = Queue()
+        self.writer = threading.Thread(
+            target=self.write_records,
+            name=f'checkpoint-{os.path.basename(path)}',
+            daemon=True,
+        )
+        self.writer.start()
+
+    def scan(self) -> int:
+        """
+        Строит индекс по файлу журнала.
+        :return: размер целых записей
+        """
+        if not os.path.exists(self.path):
+            return 0
+        offset: int = 0
+        with open(self.path, 'rb') as file:
+            while header := file.read(RECORD_HEADER.size):
+                if len(header) < RECORD_HEADER.size:
+                    break
+                code_size, payload_size, checksum = RECORD_HEADER.unpack(
+                    header
+                )
+                body: bytes = file.read(code_size + payload_size)
+                if (
+                    len(body) < code_size + payload_size
+                    or zlib.crc32(body) != checksum
+                ):
+                    break
+                self.index[body[:code_size].decode('utf-8')] = (
+                    offset + RECORD_HEADER.size + code_size,
+                    payload_size,
+                )
+                offset += RECORD_HEADER.size + len(body)
+        return offset
+
+    def append(self, city: str, value: Any) -> None:
+        self.cities.add(city)
+        self.queue.put((city, value))
+
+    def write_records(self) -> None:
+        while (record := self.queue.get()) is not None:
+            city, value = record
+            try:
+                self.write(city, value)
+            except Exception as ex:
+                self.cities.discard(city)
+                logging.warning(f'{city} has not been checkpointed: {ex!r}.')
+            finally:
+                self.queue.task_done()
+        self.queue.task_done()
+
+    def write(self, city: str, value: Any) -> None:
+        if self.compact is not None:
+            value = self.compact(value)
+        code: bytes = city.encode('utf-8')
+        payload: bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        body: bytes = code + payload
+        with self.lock:
+            self.file.write(
+                RECORD_HEADER.pack(len(code), len(payload), zlib.crc32(body))
+                + body
+            )
+            self.index[city] = (
+                self.size + RECORD_HEADER.size + len(code),
+                len(payload),
+            )
+            self.size += RECORD_HEADER.size + len(body)
+
+    def get(self, city: str) -> Any:
+        self.queue.join()
+        with self.lock:
+            offset, size = self.index[city]
+            self.reader.seek(offset)
+            return pickle.loads(self.reader.read(size))
+
+    def items(self, cities: Iterable[str]) -> Iterator[tuple[str, Any]]:
+        """
+        Сохраненные данные городов cities (тех, что есть в журнале).
+        """
+        self.queue.join()
+        for city in cities:
+            if city in self.index:
+                yield city, self.get(city)
+
+    def flush(self) -> None:
+        self.queue.join()
+        with self.lock:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.writer.join()
+        self.file.close()
+        self.reader.close()
+
+    def __contains__(self, city: object) -> bool:
+        return city in self.cities
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+
+class RunCheckpoint:
+    """
+    Контрольные точки запуска forecast_weather в directory: журналы
+    загруженных городов (только анализируемые поля прогноза),
+    результатов анализа и таблицы коэффициентов и manifest.json
+    с настройками анализа. При resume работа продолжается с сохраненных
+    результатов, если настройки совпадают, иначе (и без resume) журналы
+    начинаются заново. После успешного запуска директория удаляется
+    (complete).
+    """
+
+    def __init__(
+        self,
+        settings: dict[str, Any],
+        directory: str = DEFAULT_CHECKPOINT_DIR,
+        resume: bool = False,
+    ) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        manifest_path: str = os.path.join(directory, MANIFEST_FILE_NAME)
+        resumed: bool = (
+            resume and self.read_manifest(manifest_path) == settings
+        )
+        if not resumed:
+            if resume:
+                logging.warning(
+                    'No checkpoint with the same analysis settings, '
+                    'starting from scratch.'
+                )
+            self.reset(manifest_path, settings)
+        self.fetched = CheckpointLog(
+            os.path.join(directory, FETCHED_FILE_NAME),
+            compact=compact_forecast,
+        )
+        self.analysed = CheckpointLog(
+            os.path.join(directory, ANALYSED_FILE_NAME)
+        )
+        self.rating = CheckpointLog(os.path.join(directory, RATING_FILE_NAME))
+        if resumed:
+            logging.info(
+                f'Resuming from {directory}: {len(self.fetched)} fetched, '
+                f'{len(self.analysed)} analysed and {len(self.rating)} '
+                'rated cities.'
+            )
+
+    @staticmethod
+    def read_manifest(path: str) -> dict[str, Any] | None:
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def reset(self, manifest_path: str, settings: dict[str, Any]) -> None:
+        for file_name in STAGE_FILE_NAMES:
+            path: str = os.path.join(self.directory, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+        temporary_path: str = f'{manifest_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(settings, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, manifest_path)
+
+    def split(
+        self,
+        cities: Mapping[str, str],
+    ) -> tuple[
+        dict[str, CityAnalysis],
+        list[tuple[str, dict[str, Any]]],
+        dict[str, str],
+    ]:
+        """
+        :return: сохраненные результаты анализа, сохраненные данные
+            загруженных, но не проанализированных городов и оставшиеся
+            для загрузки города (код -> URL)
+        """
+        analyses: dict[str, CityAnalysis] = dict(
+            self.analysed.items(cities)
+        )
+        fetched: list[tuple[str, dict[str, Any]]] = list(
+            self.fetched.items(
+                city for city in cities if city not in analyses
+            )
+        )
+        fetched_cities: set[str] = {city for city, _ in fetched}
+        remaining: dict[str, str] = {
+            city: url
+            for city, url in cities.items()
+            if city not in analyses and city not in fetched_cities
+        }
+        return analyses, fetched, remaining
+
+    def save_analyses(self, analyses: Iterable[CityAnalysis]) -> None:
+        """
+        Добавляет результаты анализа, которых еще нет в журнале.
+        """
+        for analysis in analyses:
+            if analysis.city not in self.analysed:
+                self.analysed.append(analysis.city, analysis)
+        self.analysed.flush()
+
+    def load_rates(self, cities: Iterable[str]) -> Rates:
+        return dict(self.rating.items(cities))
+
+    def save_rates(self, rates: Rates) -> None:
+        for city, rate in rates.items():
+            if city not in self.rating:
+                self.rating.append(city, rate)
+        self.rating.flush()
+
+    def close(self) -> None:
+        for log in (self.fetched, self.analysed, self.rating):
+            log.close()
+
+    def complete(self) -> None:
+        """
+        Запуск завершен: контрольные точки больше не нужны.
+        """
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,615 @@
+import argparse
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager, Server
+from typing import Any, Iterator, Mapping
+
+from calculation_pool import CalculationPool
+from catalogue import CityCatalogue
+from external.analyzer import AnalysisWindow
+from external.metrics import DEFAULT_SAMPLING_INTERVAL
+from forecasting import (
+    DEFAULT_REPORT_FORMATS, check_analysis_windows, fetch_and_calculate,
+    log_peak_rss, publish_results)
+from models import CityAnalysis
+from ranking import (
+    COMPETITION_RANKING, DEFAULT_SCORING, RANKING_METHODS, SCORING_FUNCTIONS)
+from tasks import DEFAULT_FETCH_CONCURRENCY, DataAnalyzingTask
+from utils import CITIES, CITIES_NAMES_TRANSLATION, REPORT_FILE_CLASSES
+
+DEFAULT_ADDRESS = '127.0.0.1:50700'
+DEFAULT_SHARD_SIZE = 500
+DEFAULT_LEASE_TIMEOUT = 30.0
+# NOTE: a worker renews its lease several times per lease timeout
+HEARTBEATS_PER_LEASE = 5
+# NOTE: the coordinator gives up after this many lease timeouts
+# without a single live worker
+IDLE_LEASE_PERIODS = 4
+SHUTDOWN_GRACE = 5.0
+AUTHKEY_ENV = 'FORECAST_CLUSTER_AUTHKEY'
+
+Rates = dict[str, tuple[float, float, float]]
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+def cluster_authkey() -> bytes | None:
+    authkey: str = os.environ.get(AUTHKEY_ENV, '')
+    return authkey.encode() if authkey else None
+
+
+def generate_authkey() -> bytes:
+    """
+    Случайный ключ для запуска без FORECAST_CLUSTER_AUTHKEY: сервер
+    координатора распаковывает (pickle) данные подключившихся
+    исполнителей, поэтому общеизвестный ключ недопустим.
+    """
+    authkey: str = secrets.token_hex(16)
+    logging.warning(
+        f'{AUTHKEY_ENV} is not set, generated the auth key {authkey}; '
+        f'set {AUTHKEY_ENV} to it for the remote workers.'
+    )
+    return authkey.encode()
+
+
+# NOTE: a plain tuple (shard id, code -> URL), so that unpickling does not
+# depend on the module the coordinator runs as
+ShardTask = tuple[int, dict[str, str]]
+
+
+@dataclass
+class CoordinatorStats:
+    shards: int = 0
+    assigned: int = 0
+    reassigned: int = 0
+    duplicates: int = 0
+    failed_cities: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f'shards: {self.shards}, assigned: {self.assigned}, '
+            f'reassigned: {self.reassigned}, '
+            f'duplicate results: {self.duplicates}, '
+            f'failed cities: {self.failed_cities}'
+        )
+
+
+class ShardCoordinator:
+    """
+    Координатор распределенного запуска: делит города на шарды
+    по shard_size, выдает их исполнителям (get_shard) и собирает
+    результаты анализа и коэффициенты (submit). Исполнитель арендует
+    шард и продлевает аренду вызовами heartbeat; шард исполнителя,
+    не подававшего признаков жизни lease_timeout секунд, выдается
+    снова. Повторный результат уже собранного шарда отбрасывается.
+    Если idle_timeout секунд (по умолчанию IDLE_LEASE_PERIODS сроков
+    аренды) ни один исполнитель не работает над шардом, ожидание
+    прекращается с ошибкой. Методы вызываются из потоков сервера
+    multiprocessing.managers.
+    """
+
+    def __init__(
+        self,
+        cities: Mapping[str, str],
+        config: dict[str, Any],
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+        idle_timeout: float | None = None,
+    ) -> None:
+        self.cities = cities
+        self.config = {**config, 'lease_timeout': lease_timeout}
+        self.lease_timeout = lease_timeout
+        self.idle_timeout: float = (
+            lease_timeout * IDLE_LEASE_PERIODS
+            if idle_timeout is None
+            else idle_timeout
+        )
+        # NOTE: the last lease, heartbeat or result of any worker
+        self.last_activity: float = time.monotonic()
+        codes: Iterator[str] = iter(cities)
+        self.shards: list[list[str]] = []
+        while shard := list(islice(codes, shard_size)):
+            self.shards.append(shard)
+        self.pending: deque[int] = deque(range(len(self.shards)))
+        # NOTE: shard -> (worker, lease expiry on the monotonic clock)
+        self.leases: dict[int, tuple[str, float]] = {}
+        self.done: set[int] = set()
+        self.workers: set[str] = set()
+        self.analyses: dict[str, CityAnalysis] = {}
+        self.rates: Rates = {}
+        self.stats = CoordinatorStats(shards=len(self.shards))
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return len(self.done) == len(self.shards)
+
+    def get_config(self) -> dict[str, Any]:
+        return self.config
+
+    def get_shard(self, worker: str) -> ShardTask | None:
+        """
+        Следующий шард для worker; ждет, пока шарды заняты другими
+        исполнителями. None — все шарды собраны, исполнитель может
+        завершиться.
+        """
+        with self.condition:
+            self.workers.add(worker)
+            while not self.finished:
+                self.reclaim_expired()
+                if self.pending:
+                    return self.lease(worker, self.pending.popleft())
+                self.condition.wait(self.lease_timeout / HEARTBEATS_PER_LEASE)
+            self.workers.discard(worker)
+            self.condition.notify_all()
+            return None
+
+    def lease(self, worker: str, shard_id: int) -> ShardTask:
+        self.last_activity = time.monotonic()
+        self.leases[shard_id] = (
+            worker,
+            self.last_activity + self.lease_timeout,
+        )
+        self.stats.assigned += 1
+        logging.info(f'Shard {shard_id} has been assigned to {worker}.')
+        return shard_id, {
+            city: self.cities[city] for city in self.shards[shard_id]
+        }
+
+    def heartbeat(self, worker: str) -> None:
+        now: float = time.monotonic()
+        with self.condition:
+            for shard_id, (holder, _) in self.leases.items():
+                if holder == worker:
+                    self.leases[shard_id] = (holder, now + self.lease_timeout)
+                    self.last_activity = now
+
+    def reclaim_expired(self) -> None:
+        """
+        Возвращает в очередь шарды с истекшей арендой.
+        """
+        now: float = time.monotonic()
+        for shard_id, (worker, expires) in list(self.leases.items()):
+            if expires > now:
+                continue
+            del self.leases[shard_id]
+            self.pending.appendleft(shard_id)
+            self.workers.discard(worker)
+            self.stats.reassigned += 1
+            logging.warning(
+                f'Worker {worker} is not responding, '
+                f'shard {shard_id} will be reassigned.'
+            )
+
+    def submit(
+        self,
+        worker: str,
+        shard_id: int,
+        analyses: list[CityAnalysis],
+        rates: Rates,
+    ) -> bool:
+        """
+        Результаты шарда; города без результата считаются
+        незагруженными.
+        :return: приняты ли результаты (а не получены ранее)
+        """
+        with self.condition:
+            if shard_id in self.done:
+                self.stats.duplicates += 1
+                return False
+            self.done.add(shard_id)
+            self.last_activity = time.monotonic()
+            self.leases.pop(shard_id, None)
+            if shard_id in self.pending:
+                self.pending.remove(shard_id)
+            for analysis in analyses:
+                self.analyses[analysis.city] = analysis
+            self.rates.update(rates)
+            self.stats.failed_cities += (
+                len(self.shards[shard_id]) - len(analyses)
+            )
+            logging.info(
+                f'Shard {shard_id} is done by {worker}: '
+                f'{len(self.done)} of {len(self.shards)}.'
+            )
+            self.condition.notify_all()
+            return True
+
+    @property
+    def unfinished(self) -> list[int]:
+        return [
+            shard_id
+            for shard_id in range(len(self.shards))
+            if shard_id not in self.done
+        ]
+
+    def wait(self) -> None:
+        """
+        Ожидание результатов всех шардов.
+        :raise TimeoutError: если idle_timeout секунд нет ни одного
+            работающего исполнителя
+        """
+        with self.condition:
+            while not self.finished:
+                self.reclaim_expired()
+                self.check_idle()
+                if self.pending:
+                    self.condition.notify_all()
+                self.condition.wait(self.lease_timeout / HEARTBEATS_PER_LEASE)
+
+    def check_idle(self) -> None:
+        if self.leases:
+            return
+        idle: float = time.monotonic() - self.last_activity
+        if idle < self.idle_timeout:
+            return
+        raise TimeoutError(
+            f'No live workers for {idle:.0f}s, unfinished shards: '
+            f'{", ".join(map(str, self.unfinished))}.'
+        )
+
+    def wait_for_workers(self, timeout: float = SHUTDOWN_GRACE) -> None:
+        """
+        Дает ожидающим исполнителям получить сигнал завершения.
+        """
+        deadline: float = time.monotonic() + timeout
+        with self.condition:
+            while self.workers and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+
+
+class ShardManager(BaseManager):
+    """
+    Доступ исполнителей к координатору (multiprocessing.managers).
+    """
+
+
+ShardManager.register('coordinator')
+
+
+def serve_coordinator(
+    coordinator: ShardCoordinator,
+    address: tuple[str, int],
+    authkey: bytes,
+) -> Server:
+    """
+    Запускает сервер координатора в фоновом потоке.
+    """
+    # NOTE: the callable is registered on a subclass, so that clients
+    # in this process keep the plain proxy registration
+    manager_class = type('CoordinatorManager', (ShardManager,), {})
+    manager_class.register('coordinator', callable=lambda: coordinator)
+    server: Server = manager_class(
+        address=address,
+        authkey=authkey,
+    ).get_server()
+
+    def serve() -> None:
+        # NOTE: serve_forever ends with sys.exit once stop_event is set
+        try:
+            server.serve_forever()
+        except SystemExit:
+            pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+class ShardWorker:
+    """
+    Исполнитель: получает шарды от координатора и обрабатывает их
+    этапами DataFetchingTask, DataCalculationTask (в CalculationPool)
+    и DataAnalyzingTask с окнами анализа и коэффициентом координатора.
+    Пока шард обрабатывается, аренда продлевается из отдельного потока.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        authkey: bytes,
+        async_fetch: bool = False,
+        fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+        max_workers: int | None = None,
+    ) -> None:
+        self.address = address
+        self.authkey = authkey
+        self.async_fetch = async_fetch
+        self.fetch_concurrency = fetch_concurrency
+        self.max_workers = max_workers
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+
+    def run(self) -> int:
+        """
+        :return: число обработанных шардов
+        """
+        manager = ShardManager(address=self.address, authkey=self.authkey)
+        manager.connect()
+        coordinator = manager.coordinator()
+        config: dict[str, Any] = coordinator.get_config()
+        processed: int = 0
+        with CalculationPool(
+            max_workers=self.max_workers,
+            windows=config['windows'],
+        ) as calculation_pool:
+            while (task := coordinator.get_shard(self.worker_id)) is not None:
+                shard_id, cities = task
+                with self.heartbeat(coordinator, config['lease_timeout']):
+                    analyses, rates = self.process(
+                        cities,
+                        config,
+                        calculation_pool,
+                    )
+                coordinator.submit(
+                    self.worker_id,
+                    shard_id,
+                    list(analyses.values()),
+                    rates,
+                )
+                processed += 1
+        logging.info(f'Worker {self.worker_id} processed {processed} shards.')
+        return processed
+
+    @contextmanager
+    def heartbeat(self, coordinator, lease_timeout: float) -> Iterator[None]:
+        stopped = threading.Event()
+
+        def renew_lease() -> None:
+            while not stopped.wait(lease_timeout / HEARTBEATS_PER_LEASE):
+                coordinator.heartbeat(self.worker_id)
+
+        thread = threading.Thread(target=renew_lease, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def process(
+        self,
+        cities: dict[str, str],
+        config: dict[str, Any],
+        calculation_pool: CalculationPool,
+    ) -> tuple[dict[str, CityAnalysis], Rates]:
+        analyses: dict[str, CityAnalysis] = fetch_and_calculate(
+            use_subprocess=False,
+            async_fetch=self.async_fetch,
+            fetch_concurrency=self.fetch_concurrency,
+            response_cache=None,
+            stream_parse=False,
+            batch_analysis=False,
+            windows=config['windows'],
+            metrics_interval=DEFAULT_SAMPLING_INTERVAL,
+            calculation_pool=calculation_pool,
+            cities=cities,
+        )
+        rates: Rates = {}
+        DataAnalyzingTask(
+            analyses=analyses.values(),
+            output_dict=rates,
+            window=config['rank_window'],
+            scoring=SCORING_FUNCTIONS[config['scoring']],
+        ).rate_data()
+        return analyses, rates
+
+
+def run_worker(address: tuple[str, int], authkey: bytes, **options) -> None:
+    try:
+        ShardWorker(address, authkey, **options).run()
+    except (ConnectionError, EOFError) as ex:
+        logging.error(f'Lost connection to the coordinator: {ex!r}.')
+
+
+def coordinate(
+    cities: Mapping[str, str],
+    address: tuple[str, int],
+    authkey: bytes | None = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+    idle_timeout: float | None = None,
+    local_workers: int = 0,
+    windows: list[AnalysisWindow] | None = None,
+    rank_window: str | None = None,
+    scoring: str = DEFAULT_SCORING,
+    rank_method: str = COMPETITION_RANKING,
+    report_formats: tuple[str, ...] = DEFAULT_REPORT_FORMATS,
+    export_dir: str | None = None,
+    worker_options: dict[str, Any] | None = None,
+) -> CoordinatorStats:
+    """
+    Распределенный запуск: города делятся на шарды для исполнителей,
+    подключающихся по address с ключом authkey (без него ключ
+    генерируется); local_workers исполнителей запускаются на этой же
+    машине (с worker_options). Результаты всех шардов сливаются
+    для общего рейтинга и отчета.
+    :raise TimeoutError: если исполнители перестали работать,
+        не обработав все шарды
+    """
+    check_analysis_windows(windows, rank_window, False, False)
+    authkey = authkey or generate_authkey()
+    coordinator = ShardCoordinator(
+        cities,
+        {
+            'windows': windows or [],
+            'rank_window': rank_window,
+            'scoring': scoring,
+        },
+        shard_size,
+        lease_timeout,
+        idle_timeout,
+    )
+    server: Server = serve_coordinator(coordinator, address, authkey)
+    logging.info(
+        f'Coordinator is listening on {address[0]}:{address[1]}, '
+        f'{coordinator.stats.shards} shards.'
+    )
+    processes: list[Process] = [
+        Process(
+            target=run_worker,
+            args=(address, authkey),
+            kwargs=worker_options or {},
+        )
+        for _ in range(local_workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        coordinator.wait()
+        coordinator.wait_for_workers()
+    finally:
+        for process in processes:
+            process.join(SHUTDOWN_GRACE)
+            if process.is_alive():
+                process.terminate()
+        server.stop_event.set()
+    logging.info(f'Cluster run: {coordinator.stats}.')
+
+    publish_results(
+        coordinator.analyses.values,
+        coordinator.rates,
+        report_formats,
+        rank_window,
+        rank_method,
+        getattr(cities, 'names', CITIES_NAMES_TRANSLATION),
+        export_dir,
+    )
+    log_peak_rss()
+    return coordinator.stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            'sharded forecast run: a coordinator and workers on one '
+            'or several machines; the auth key is taken from '
+            f'{AUTHKEY_ENV} (the coordinator generates one if it is unset)'
+        ),
+    )
+    roles = parser.add_subparsers(dest='role', required=True)
+
+    coordinator = roles.add_parser('coordinator')
+    coordinator.add_argument('--listen', default=DEFAULT_ADDRESS, type=str)
+    coordinator.add_argument(
+        '--shard-size',
+        default=DEFAULT_SHARD_SIZE,
+        type=int,
+        help='cities per shard',
+    )
+    coordinator.add_argument(
+        '--lease-timeout',
+        default=DEFAULT_LEASE_TIMEOUT,
+        type=float,
+        help='seconds without a heartbeat before a shard is reassigned',
+    )
+    coordinator.add_argument(
+        '--idle-timeout',
+        default=None,
+        type=float,
+        help=(
+            'give up after this many seconds without live workers, '
+            f'{IDLE_LEASE_PERIODS} lease timeouts by default'
+        ),
+    )
+    coordinator.add_argument(
+        '--local-workers',
+        default=0,
+        type=int,
+        help='also start this many workers on this machine',
+    )
+    coordinator.add_argument('--cities-file', default=None, type=str)
+    coordinator.add_argument(
+        '-w',
+        '--window',
+        action='append',
+        default=[],
+        type=AnalysisWindow.from_spec,
+    )
+    coordinator.add_argument('--rank-window', default=None, type=str)
+    coordinator.add_argument(
+        '--scoring',
+        default=DEFAULT_SCORING,
+        choices=tuple(SCORING_FUNCTIONS),
+    )
+    coordinator.add_argument(
+        '--rank-method',
+        default=COMPETITION_RANKING,
+        choices=RANKING_METHODS,
+    )
+    coordinator.add_argument(
+        '--report-format',
+        action='append',
+        choices=tuple(REPORT_FILE_CLASSES),
+    )
+    coordinator.add_argument('--export-dir', default=None, type=str)
+
+    worker = roles.add_parser('worker')
+    worker.add_argument('--connect', default=DEFAULT_ADDRESS, type=str)
+    # NOTE: options of the workers, including the --local-workers ones
+    for role in (coordinator, worker):
+        role.add_argument('--async-fetch', action='store_true')
+        role.add_argument(
+            '--concurrency',
+            default=DEFAULT_FETCH_CONCURRENCY,
+            type=int,
+        )
+        role.add_argument(
+            '--workers',
+            default=None,
+            type=int,
+            help='maximum number of calculation processes of a worker',
+        )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    worker_options: dict[str, Any] = {
+        'async_fetch': args.async_fetch,
+        'fetch_concurrency': args.concurrency,
+        'max_workers': args.workers,
+    }
+    authkey: bytes | None = cluster_authkey()
+    if args.role == 'worker':
+        if authkey is None:
+            raise SystemExit(
+                f'Set {AUTHKEY_ENV} to the auth key of the coordinator.'
+            )
+        run_worker(parse_address(args.connect), authkey, **worker_options)
+    else:
+        try:
+            coordinate(
+                (
+                    CityCatalogue(args.cities_file)
+                    if args.cities_file
+                    else CITIES
+                ),
+                parse_address(args.listen),
+                authkey,
+                shard_size=args.shard_size,
+                lease_timeout=args.lease_timeout,
+                idle_timeout=args.idle_timeout,
+                local_workers=args.local_workers,
+                windows=args.window,
+                rank_window=args.rank_window,
+                scoring=args.scoring,
+                rank_method=args.rank_method,
+                report_formats=tuple(
+                    args.report_format or DEFAULT_REPORT_FORMATS
+                ),
+                export_dir=args.export_dir,
+                worker_options=worker_options,
+            )
+        except TimeoutError as ex:
+            raise SystemExit(f'Cluster run failed: {ex}')
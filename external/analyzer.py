@@ -4,7 +4,13 @@ import logging
 from dataclasses import dataclass, field
 from functools import reduce
 from operator import getitem
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional
+
+try:
+    from external.decoding import loads
+except ImportError:
+    # NOTE: run as a script from external/ by the --subprocess mode
+    from decoding import loads
 
 PATH_FROM_INPUT = './../examples/response.json'
 PATH_TO_OUTPUT = './../examples/output.json'
@@ -27,6 +33,7 @@ INPUT_DAY_SUITABLE_CONDITIONS = {
 
 OUTPUT_RAW_DATA_KEY = 'raw_data'
 OUTPUT_DAYS_KEY = 'days'
+OUTPUT_WINDOWS_KEY = 'windows'
 DEFAULT_OUTPUT_RESULT: dict[str, list[Any]] = {
     OUTPUT_DAYS_KEY: [],
 }
@@ -40,9 +47,9 @@ def deep_getitem(obj, path: str):
 
 
 def load_data(input_path: str = PATH_FROM_INPUT):
-    with open(input_path) as file:
+    with open(input_path, 'rb') as file:
         data = file.read()
-        return json.loads(data)
+        return loads(data)
 
 
 def dump_data(data, output_path: str = PATH_TO_OUTPUT):
@@ -67,49 +74,109 @@ def parse_args():
         type=str,
         help='path to file with result',
     )
+    parser.add_argument(
+        '-w',
+        '--window',
+        action='append',
+        default=[],
+        type=AnalysisWindow.from_spec,
+        help=(
+            'additional analysis window as name:start-end[:cond,cond...], '
+            'may be repeated'
+        ),
+    )
     parser.add_argument('-v', '--verbose', action='store_true')
     return parser.parse_args()
 
 
-@dataclass
-class HourInfo:
-    raw_data: Dict[str, tuple[str, int]] = field(repr=False)
-    condition: Optional[str] = field(init=False, default=None)
-    temperature: Optional[int] = field(init=False, default=None)
-    hour: Optional[int] = field(init=False, default=None)
+def round_temperature(temperature_avg: Optional[float]) -> Optional[float]:
+    return (
+        round(temperature_avg, 3)
+        if temperature_avg
+        else temperature_avg
+    )
 
-    @staticmethod
-    def is_hour_suitable(data):
-        hour = int(data[INPUT_HOUR_PATH])
-        return (
-            hour >= INPUT_DAY_HOURS_START
-        ) and (hour <= INPUT_DAY_HOURS_END)
+
+@dataclass(frozen=True)
+class AnalysisWindow:
+    name: str
+    hour_start: int = INPUT_DAY_HOURS_START
+    hour_end: int = INPUT_DAY_HOURS_END
+    conditions: FrozenSet[str] = frozenset(INPUT_DAY_SUITABLE_CONDITIONS)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'AnalysisWindow':
+        """
+        Parses 'name:start-end' or 'name:start-end:cond,cond'.
+        """
+        try:
+            name, hours, *conditions = spec.split(':')
+            hour_start, hour_end = (int(hour) for hour in hours.split('-'))
+        except ValueError:
+            raise ValueError(f'Invalid analysis window: {spec}')
+        if conditions:
+            return cls(
+                name,
+                hour_start,
+                hour_end,
+                frozenset(conditions[0].split(',')),
+            )
+        return cls(name, hour_start, hour_end)
+
+    def to_spec(self) -> str:
+        return '{}:{}-{}:{}'.format(
+            self.name,
+            self.hour_start,
+            self.hour_end,
+            ','.join(sorted(self.conditions)),
+        )
+
+    def contains(self, hour: int) -> bool:
+        return self.hour_start <= hour <= self.hour_end
+
+
+@dataclass
+class WindowAggregate:
+    window: AnalysisWindow
+    hour_start: Optional[int] = None
+    hour_end: Optional[int] = None
+    hours_count: int = 0
+    temperature: int = 0
+    relevant_condition_hours: int = 0
+
+    def add(self, h_info: 'ForecastHour'):
+        if self.hour_start is None:
+            self.hour_start = h_info.hour
+        self.hour_end = h_info.hour
+        self.temperature += h_info.temperature
+        if h_info.condition in self.window.conditions:
+            self.relevant_condition_hours += 1
+        self.hours_count += 1
 
     @property
-    def is_cond_suitable(self):
-        return self.condition in INPUT_DAY_SUITABLE_CONDITIONS
+    def temperature_avg(self) -> Optional[float]:
+        if self.hours_count > 0:
+            return self.temperature / self.hours_count
+        return None
 
-    def __post_init__(self):
-        self.parse()
+    def to_json(self):
+        return {
+            'hours_start': self.hour_start,
+            'hours_end': self.hour_end,
+            'hours_count': self.hours_count,
+            'temp_avg': round_temperature(self.temperature_avg),
+            'relevant_cond_hours': self.relevant_condition_hours,
+        }
 
-    def parse(self):
-        if not self.raw_data:
-            return
 
-        self.hour = int(self.raw_data[INPUT_HOUR_PATH])
-        self.temperature = int(
-            deep_getitem(
-                self.raw_data,
-                INPUT_TEMPERATURE_PATH,
-            )
-        )
-        self.condition = deep_getitem(self.raw_data, INPUT_CONDITION_PATH)
+DEFAULT_WINDOW = AnalysisWindow('day')
 
 
 @dataclass
 class DayInfo:
     raw_data: Dict[str, tuple[str, int]] = field(repr=False)
-    hours: Optional[List[HourInfo]] = field(
+    windows: List[AnalysisWindow] = field(default_factory=list, repr=False)
+    hours: Optional[List['ForecastHour']] = field(
         init=False,
         repr=False,
         default=None,
@@ -122,80 +189,203 @@ class DayInfo:
     hours_count: Optional[int] = field(init=False, default=None)
     temperature_avg: Optional[float] = field(init=False, default=None)
     relevant_condition_hours: int = field(init=False, default=0)
+    window_results: Dict[str, WindowAggregate] = field(
+        init=False,
+        repr=False,
+        default_factory=dict,
+    )
 
     def to_json(self):
-        return {
+        result = {
             'date': self.date,
             'hours_start': self.hour_start,
             'hours_end': self.hour_end,
             'hours_count': self.hours_count,
-            'temp_avg': round(self.temperature_avg, 3)
-            if self.temperature_avg
-            else self.temperature_avg,
+            'temp_avg': round_temperature(self.temperature_avg),
             'relevant_cond_hours': self.relevant_condition_hours,
         }
+        if self.windows:
+            result[OUTPUT_WINDOWS_KEY] = {
+                name: aggregate.to_json()
+                for name, aggregate in self.window_results.items()
+            }
+        return result
 
     def __post_init__(self):
         self.parse()
 
+    @classmethod
+    def from_forecast_day(
+        cls,
+        day: 'ForecastDay',
+        windows: Optional[List[AnalysisWindow]] = None,
+    ) -> 'DayInfo':
+        d_info = cls(raw_data={}, windows=windows or [])
+        d_info.set_day(day)
+        return d_info
+
     def parse(self):
         if not self.raw_data:
             return
 
-        self.date = self.raw_data[INPUT_DATE_PATH]
+        self.set_day(ForecastDay.from_json(self.raw_data))
 
-        temp = 0
-        hours_count = 0
-        conds_count = 0
+    def set_day(self, day: 'ForecastDay'):
+        """
+        Aggregates the hours of a typed forecast day.
+        """
+        self.date = day.date
+        self.hours = day.hours
 
-        self.hours = self.raw_data[INPUT_HOURS_PATH]
+        # NOTE: the default window and all extra windows in one scan
+        aggregates = [
+            WindowAggregate(window)
+            for window in (DEFAULT_WINDOW, *self.windows)
+        ]
         # TODO: force sort by hour key in asc mode
-        for hour_data in self.hours:
-            if not HourInfo.is_hour_suitable(hour_data):
-                continue
+        for hour in day.hours:
+            for aggregate in aggregates:
+                if aggregate.window.contains(hour.hour):
+                    aggregate.add(hour)
+        self.set_aggregates(aggregates)
+
+    def set_aggregates(self, aggregates: List[WindowAggregate]):
+        """
+        Takes the results of the default window (first) and of the extra
+        windows.
+        """
+        day_aggregate, *window_aggregates = aggregates
+        self.hour_start = day_aggregate.hour_start
+        self.hour_end = day_aggregate.hour_end
+        self.relevant_condition_hours = (
+            day_aggregate.relevant_condition_hours
+        )
+        self.hours_count = day_aggregate.hours_count
+        self.temperature_avg = day_aggregate.temperature_avg
+        self.window_results = {
+            aggregate.window.name: aggregate
+            for aggregate in window_aggregates
+        }
 
-            h_info = HourInfo(raw_data=hour_data)
-            h_hour = h_info.hour
-            self.hour_start = self.hour_start or h_hour
-            self.hour_end = h_hour
 
-            temp += h_info.temperature
-            if h_info.is_cond_suitable:
-                conds_count += 1
-            hours_count += 1
+class ForecastHour:
+    """
+    The fields of a forecast hour used by the analysis.
+    """
+    __slots__ = ('hour', 'temperature', 'condition')
+
+    def __init__(
+        self,
+        hour: int,
+        temperature: Optional[int],
+        condition: Optional[str],
+    ):
+        self.hour = hour
+        self.temperature = temperature
+        self.condition = condition
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'ForecastHour':
+        temperature = data.get(INPUT_TEMPERATURE_PATH)
+        return cls(
+            int(data[INPUT_HOUR_PATH]),
+            None if temperature is None else int(temperature),
+            data.get(INPUT_CONDITION_PATH),
+        )
 
-        self.relevant_condition_hours = conds_count
-        self.hours_count = hours_count
-        if hours_count > 0:
-            self.temperature_avg = temp / hours_count
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            INPUT_HOUR_PATH: self.hour,
+            INPUT_TEMPERATURE_PATH: self.temperature,
+            INPUT_CONDITION_PATH: self.condition,
+        }
 
 
-def analyze_json(data):
-    if not data:
-        logging.warning('Input data is empty...')
-        return {}
+class ForecastDay:
+    __slots__ = ('date', 'hours')
 
-    # NOTE: analyzing days
-    time_start = None
-    time_end = None
+    def __init__(self, date: Optional[str], hours: List[ForecastHour]):
+        self.date = date
+        self.hours = hours
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'ForecastDay':
+        return cls(
+            data[INPUT_DATE_PATH],
+            [
+                ForecastHour.from_json(hour_data)
+                for hour_data in data[INPUT_HOURS_PATH]
+            ],
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            INPUT_DATE_PATH: self.date,
+            INPUT_HOURS_PATH: [hour.to_json() for hour in self.hours],
+        }
+
+
+class Forecast:
+    """
+    Typed forecast: days and hours with only the analysed fields,
+    the rest of the API response is dropped.
+    """
+    __slots__ = ('days',)
+
+    def __init__(self, days: List[ForecastDay]):
+        self.days = days
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'Forecast':
+        return cls(
+            [
+                ForecastDay.from_json(day_data)
+                for day_data in deep_getitem(data, INPUT_FORECAST_PATH)
+            ]
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Input of analyze_json with only the analysed fields.
+        """
+        return {INPUT_FORECAST_PATH: [day.to_json() for day in self.days]}
 
-    days_data = deep_getitem(data, INPUT_FORECAST_PATH)
-    days = []
-    # TODO: force sort by day in asc mode
-    for day_data in days_data:
-        d_info = DayInfo(raw_data=day_data)
-        d_date = d_info.date
 
-        time_start = time_start or d_date
-        time_end = d_date
+def decode_forecast(body: bytes) -> Forecast:
+    """
+    Response body to Forecast with the fastest available JSON backend.
+    """
+    return Forecast.from_json(loads(body))
 
-        days.append(d_info.to_json())
 
-    result = DEFAULT_OUTPUT_RESULT
+def analyze_forecast(
+    forecast: Forecast,
+    windows: Optional[List[AnalysisWindow]] = None,
+):
+    """
+    analyze_json over a typed forecast.
+    """
+    # TODO: force sort by day in asc mode
+    days = [
+        DayInfo.from_forecast_day(day, windows).to_json()
+        for day in forecast.days
+    ]
+
+    # NOTE: a fresh dict per call, so in-process callers never share state
+    result = dict(DEFAULT_OUTPUT_RESULT)
     result[OUTPUT_DAYS_KEY] = days
     return result
 
 
+def analyze_json(data, windows: Optional[List[AnalysisWindow]] = None):
+    if not data:
+        logging.warning('Input data is empty...')
+        return {}
+    if not isinstance(data, Forecast):
+        data = Forecast.from_json(data)
+    return analyze_forecast(data, windows)
+
+
 if __name__ == '__main__':
     args = parse_args()
     input_path = args.input
@@ -208,6 +398,6 @@ if __name__ == '__main__':
     logging.info(args)
 
     data = load_data(input_path)
-    data = analyze_json(data)
+    data = analyze_json(data, args.window)
 
     dump_data(data, output_path)
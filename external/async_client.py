@@ -0,0 +1,324 @@
+import asyncio
+import gzip
+import ssl
+from asyncio import StreamReader, StreamWriter
+from http import HTTPStatus
+from urllib.parse import SplitResult, urlsplit
+
+from external.cache import ResponseCache
+from external.client import YandexWeatherAPI
+from external.decoding import loads
+from external.metrics import METRICS
+from external.resilience import (
+    STATUS_HTTP_ERROR, FetchError, ResilientFetcher, is_retryable_status)
+
+DEFAULT_CONNECTIONS_PER_HOST = 20
+
+USER_AGENT = 'async-python-sprint-1'
+BODILESS_STATUSES = (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED)
+
+
+class HostConnectionPool:
+    """
+    Постоянные (keep-alive) соединения с одним хостом (схема, хост, порт).
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_ssl: bool,
+        limit: int,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl.create_default_context() if use_ssl else None
+        self.idle: list[tuple[StreamReader, StreamWriter]] = []
+        self.slots = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> tuple[StreamReader, StreamWriter, bool]:
+        """
+        Берет свободное соединение или открывает новое.
+        :return: reader, writer и признак повторного использования
+            соединения
+        """
+        await self.slots.acquire()
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        try:
+            reader, writer = await asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self.ssl_context,
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        return reader, writer, False
+
+    def release(
+        self,
+        reader: StreamReader,
+        writer: StreamWriter,
+        reusable: bool,
+    ) -> None:
+        """
+        Возвращает соединение в пул или закрывает его.
+        """
+        if reusable:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        self.slots.release()
+
+    async def close(self) -> None:
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+
+class AsyncYandexWeatherAPI:
+    """
+    Асинхронный клиент для запросов с пулом соединений для каждого хоста.
+    Таймауты, повторы, дублирование медленных запросов и автоматические
+    выключатели берутся из fetcher (по умолчанию — общего
+    с YandexWeatherAPI), поэтому оба клиента используют одну историю
+    задержек и одно состояние хостов.
+    """
+
+    def __init__(
+        self,
+        connections_per_host: int = DEFAULT_CONNECTIONS_PER_HOST,
+        cache: ResponseCache | None = None,
+        fetcher: ResilientFetcher | None = None,
+    ) -> None:
+        self.connections_per_host = connections_per_host
+        self.cache = cache
+        self.fetcher = fetcher or YandexWeatherAPI.fetcher
+        self.pools: dict[tuple[str, str, int], HostConnectionPool] = {}
+
+    async def __aenter__(self) -> 'AsyncYandexWeatherAPI':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        for pool in self.pools.values():
+            await pool.close()
+        self.pools.clear()
+
+    async def get_forecasting(self, url: str):
+        """
+        :param url: адрес данных прогноза
+        :return: разобранный JSON ответа
+        """
+        try:
+            body = await self.fetch_body(url)
+            with METRICS.span('parse', 'city', url=url):
+                data = loads(body)
+            METRICS.increment('parsed_bytes_total', len(body))
+            return data
+        except Exception as ex:
+            raise YandexWeatherAPI.wrap_error(ex)
+
+    async def get_forecasting_body(self, url: str) -> bytes:
+        """
+        :param url: адрес данных прогноза
+        :return: тело ответа без разбора
+        """
+        try:
+            return await self.fetch_body(url)
+        except Exception as ex:
+            raise YandexWeatherAPI.wrap_error(ex)
+
+    async def fetch_body(self, url: str) -> bytes:
+        """
+        Тело ответа, по возможности из кэша ответов (та же логика,
+        что и в YandexWeatherAPI поверх urlopen).
+        """
+        cache = self.cache
+        entry = cache.lookup(url) if cache else None
+        if cache and entry and cache.is_fresh(entry):
+            body = cache.hit(entry)
+            if body is not None:
+                METRICS.increment(
+                    'fetched_bytes_total',
+                    len(body),
+                    source='cache',
+                )
+                return body
+        if cache:
+            cache.check_online(url)
+
+        validators: dict[str, str] = ResponseCache.validators(entry)
+        status, body, headers = await self.fetcher.fetch_async(
+            url,
+            lambda: self.do_checked_req(url, validators),
+        )
+        if cache and entry and status == HTTPStatus.NOT_MODIFIED:
+            cached_body = cache.revalidate(entry)
+            if cached_body is not None:
+                METRICS.increment(
+                    'fetched_bytes_total',
+                    len(cached_body),
+                    source='revalidated',
+                )
+                return cached_body
+        if status != HTTPStatus.OK:
+            raise FetchError(
+                'Error during execute request. {}: {}'.format(
+                    status.value, status.phrase
+                ),
+                STATUS_HTTP_ERROR,
+            )
+        if cache:
+            cache.store(
+                url,
+                body,
+                etag=headers.get('etag'),
+                last_modified=headers.get('last-modified'),
+            )
+        METRICS.increment('fetched_bytes_total', len(body), source='network')
+        return body
+
+    def get_pool(self, parts: SplitResult) -> HostConnectionPool:
+        use_ssl = parts.scheme == 'https'
+        host = parts.hostname or ''
+        port = parts.port or (443 if use_ssl else 80)
+        key = (parts.scheme, host, port)
+        if key not in self.pools:
+            self.pools[key] = HostConnectionPool(
+                host,
+                port,
+                use_ssl,
+                self.connections_per_host,
+            )
+        return self.pools[key]
+
+    async def do_checked_req(
+        self,
+        url: str,
+        extra_headers: dict[str, str],
+    ) -> tuple[HTTPStatus, bytes, dict[str, str]]:
+        """
+        Одна попытка запроса: ошибочные статусы превращаются
+        в исключения, чтобы допускающие повтор запросы повторялись.
+        """
+        status, body, headers = await self.__do_req(url, extra_headers)
+        if status >= 400:
+            raise FetchError(
+                'Error during execute request. {}: {}'.format(
+                    status.value, status.phrase
+                ),
+                STATUS_HTTP_ERROR,
+                is_retryable_status(status),
+            )
+        return status, body, headers
+
+    async def __do_req(
+        self,
+        url: str,
+        extra_headers: dict[str, str],
+    ) -> tuple[HTTPStatus, bytes, dict[str, str]]:
+        """
+        Базовый метод запроса.
+        Простаивающее соединение из пула сервер мог закрыть, поэтому
+        при ошибке на повторно используемом соединении запрос один раз
+        повторяется на новом.
+        """
+        parts = urlsplit(url)
+        pool = self.get_pool(parts)
+        target = parts.path or '/'
+        if parts.query:
+            target = f'{target}?{parts.query}'
+        request = (
+            f'GET {target} HTTP/1.1\r\n'
+            f'Host: {parts.netloc}\r\n'
+            f'User-Agent: {USER_AGENT}\r\n'
+            'Accept: application/json\r\n'
+            'Accept-Encoding: gzip\r\n'
+            'Connection: keep-alive\r\n'
+            + ''.join(
+                f'{name}: {value}\r\n'
+                for name, value in extra_headers.items()
+            )
+            + '\r\n'
+        ).encode('latin-1')
+
+        while True:
+            reader, writer, reused = await pool.acquire()
+            reusable = False
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, body, headers, reusable = await self.read_response(
+                    reader
+                )
+                return status, body, headers
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+            finally:
+                pool.release(reader, writer, reusable)
+
+    @staticmethod
+    async def read_response(
+        reader: StreamReader,
+    ) -> tuple[HTTPStatus, bytes, dict[str, str], bool]:
+        """
+        Читает строку статуса, заголовки и тело ответа HTTP/1.x.
+        :return: статус, тело, заголовки и признак того, что соединение
+            можно использовать повторно
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        version, status_code, *_ = status_line.decode('latin-1').split(' ', 2)
+
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (
+            version == 'HTTP/1.1'
+            and headers.get('connection', '').lower() != 'close'
+        )
+        status = HTTPStatus(int(status_code))
+        if status < 200 or status in BODILESS_STATUSES:
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = await AsyncYandexWeatherAPI.read_chunked(reader)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        if headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return status, body, headers, keep_alive
+
+    @staticmethod
+    async def read_chunked(reader: StreamReader) -> bytes:
+        chunks: list[bytes] = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
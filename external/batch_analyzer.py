@@ -0,0 +1,177 @@
+from array import array
+from dataclasses import dataclass
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Iterable
+
+import numpy as np
+
+from external.analyzer import (
+    INPUT_CONDITION_PATH, INPUT_DATE_PATH, INPUT_DAY_HOURS_END,
+    INPUT_DAY_HOURS_START, INPUT_DAY_SUITABLE_CONDITIONS,
+    INPUT_FORECAST_PATH, INPUT_HOUR_PATH, INPUT_HOURS_PATH,
+    INPUT_TEMPERATURE_PATH, OUTPUT_DAYS_KEY)
+
+# NOTE: see examples/conditions.txt; code 0 is reserved for unknown values
+CONDITIONS = (
+    'clear',
+    'partly-cloudy',
+    'cloudy',
+    'overcast',
+    'drizzle',
+    'light-rain',
+    'rain',
+    'moderate-rain',
+    'heavy-rain',
+    'continuous-heavy-rain',
+    'showers',
+    'wet-snow',
+    'light-snow',
+    'snow',
+    'snow-showers',
+    'hail',
+    'thunderstorm',
+    'thunderstorm-with-rain',
+    'thunderstorm-with-hail',
+)
+UNKNOWN_CONDITION_CODE = 0
+CONDITION_CODES: dict[str, int] = {
+    condition: code for code, condition in enumerate(CONDITIONS, 1)
+}
+SUITABLE_CONDITION_CODES = np.zeros(len(CONDITIONS) + 1, dtype=bool)
+SUITABLE_CONDITION_CODES[
+    [CONDITION_CODES[condition] for condition in INPUT_DAY_SUITABLE_CONDITIONS]
+] = True
+
+
+@dataclass
+class ForecastBatch:
+    """
+    Hours of all days of all cities packed into contiguous arrays.
+    Days of city i are dates[day_offsets[i]:day_offsets[i + 1]];
+    day_index maps every hour to its position in dates.
+    """
+    cities: list[str]
+    day_offsets: np.ndarray
+    dates: list[str | None]
+    day_index: np.ndarray
+    hours: np.ndarray
+    temperatures: np.ndarray
+    conditions: np.ndarray
+
+
+def pack_forecasts(
+    forecasts: Iterable[tuple[str, dict[str, Any] | None]],
+) -> ForecastBatch:
+    """
+    Packs (city, response data) pairs; cities without data are skipped.
+    """
+    cities: list[str] = []
+    day_offsets = array('q', [0])
+    dates: list[str | None] = []
+    day_index = array('i')
+    hours = array('b')
+    temperatures = array('i')
+    conditions = array('B')
+    get_hour_and_temperature = itemgetter(
+        INPUT_HOUR_PATH,
+        INPUT_TEMPERATURE_PATH,
+    )
+    get_condition_code = CONDITION_CODES.get
+
+    for city, data in forecasts:
+        if not data:
+            continue
+        cities.append(city)
+        for day_data in data[INPUT_FORECAST_PATH]:
+            day_number = len(dates)
+            dates.append(day_data[INPUT_DATE_PATH])
+            hours_data = day_data[INPUT_HOURS_PATH]
+            if not hours_data:
+                continue
+            day_hours, day_temperatures = zip(
+                *map(get_hour_and_temperature, hours_data)
+            )
+            day_index.extend(repeat(day_number, len(hours_data)))
+            hours.extend(map(int, day_hours))
+            temperatures.extend(map(int, day_temperatures))
+            conditions.extend(
+                get_condition_code(
+                    hour_data.get(INPUT_CONDITION_PATH),
+                    UNKNOWN_CONDITION_CODE,
+                )
+                for hour_data in hours_data
+            )
+        day_offsets.append(len(dates))
+
+    return ForecastBatch(
+        cities=cities,
+        day_offsets=np.frombuffer(day_offsets, dtype=np.int64),
+        dates=dates,
+        day_index=np.frombuffer(day_index, dtype=np.int32),
+        hours=np.frombuffer(hours, dtype=np.int8),
+        temperatures=np.frombuffer(temperatures, dtype=np.int32),
+        conditions=np.frombuffer(conditions, dtype=np.uint8),
+    )
+
+
+def analyze_batch(batch: ForecastBatch) -> dict[str, dict[str, Any]]:
+    """
+    Vectorised equivalent of analyze_json for every city in the batch.
+    """
+    days_amount = len(batch.dates)
+    in_window = (batch.hours >= INPUT_DAY_HOURS_START) & (
+        batch.hours <= INPUT_DAY_HOURS_END
+    )
+    window_days = batch.day_index[in_window]
+    hours_count = np.bincount(window_days, minlength=days_amount)
+    temperature_sum = np.bincount(
+        window_days,
+        weights=batch.temperatures[in_window],
+        minlength=days_amount,
+    )
+    is_dry = in_window & SUITABLE_CONDITION_CODES[batch.conditions]
+    dry_hours = np.bincount(batch.day_index[is_dry], minlength=days_amount)
+
+    # NOTE: first occurrences in the reversed array are the last hours
+    window_hours = batch.hours[in_window]
+    days_with_hours, first_positions = np.unique(
+        window_days,
+        return_index=True,
+    )
+    last_positions = len(window_days) - 1 - np.unique(
+        window_days[::-1],
+        return_index=True,
+    )[1]
+    hour_start = np.full(days_amount, -1, dtype=np.int64)
+    hour_end = np.full(days_amount, -1, dtype=np.int64)
+    hour_start[days_with_hours] = window_hours[first_positions]
+    hour_end[days_with_hours] = window_hours[last_positions]
+
+    days_json = [
+        {
+            'date': date,
+            'hours_start': start if count else None,
+            'hours_end': end if count else None,
+            'hours_count': count,
+            'temp_avg': (
+                round(temperature / count, 3)
+                if count and temperature
+                else (0.0 if count else None)
+            ),
+            'relevant_cond_hours': dry,
+        }
+        for date, start, end, count, temperature, dry in zip(
+            batch.dates,
+            hour_start.tolist(),
+            hour_end.tolist(),
+            hours_count.tolist(),
+            temperature_sum.tolist(),
+            dry_hours.tolist(),
+        )
+    ]
+    offsets = batch.day_offsets.tolist()
+    return {
+        city: {OUTPUT_DAYS_KEY: days_json[offsets[i]:offsets[i + 1]]}
+        for i, city in enumerate(batch.cities)
+    }
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+DEFAULT_CACHE_DIR = '.forecast_cache'
+DEFAULT_CACHE_TTL = 30 * 60
+DEFAULT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+INDEX_FILE_NAME = 'index.json'
+BODY_FILE_SUFFIX = '.zlib'
+
+logger = logging.getLogger()
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    url: str
+    stored_at: float
+    size: int
+    raw_size: int
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    evictions: int = 0
+    bytes_saved: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f'hits: {self.hits}, revalidated: {self.revalidated}, '
+            f'misses: {self.misses}, evictions: {self.evictions}, '
+            f'bytes saved: {self.bytes_saved}'
+        )
+
+
+class ResponseCache:
+    """
+    Постоянный кэш тел ответов по URL.
+    Тела хранятся сжатыми (zlib), по файлу на URL; индекс хранит
+    валидаторы (ETag, Last-Modified) и порядок LRU и записывается
+    на диск в save().
+    В автономном режиме отдаются все сохраненные записи независимо
+    от возраста, а клиенты не обращаются к сети (повтор прошлых запусков).
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_size: int = DEFAULT_CACHE_MAX_SIZE,
+        offline: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.total_size = 0
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}{BODY_FILE_SUFFIX}')
+
+    def load_index(self) -> None:
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        try:
+            with open(index_path) as file:
+                records = json.load(file)
+        except (OSError, ValueError):
+            return
+        for record in records:
+            entry = CacheEntry(**record)
+            if os.path.exists(self.body_path(entry.key)):
+                self.entries[entry.key] = entry
+                self.total_size += entry.size
+
+    def save(self) -> None:
+        """
+        Атомарно записывает индекс (в порядке LRU) на диск.
+        """
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        with self.lock:
+            records = [asdict(entry) for entry in self.entries.values()]
+        tmp_path = f'{index_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(records, file)
+        os.replace(tmp_path, index_path)
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        with self.lock:
+            entry = self.entries.get(self.key_for(url))
+            if entry is not None:
+                self.entries.move_to_end(entry.key)
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.offline or time.time() - entry.stored_at < self.ttl
+
+    def check_online(self, url: str) -> None:
+        """
+        Вызывается при промахе кэша перед обращением к сети.
+        """
+        if self.offline:
+            raise Exception(f'No cached response for {url} in offline mode.')
+
+    @staticmethod
+    def validators(entry: CacheEntry | None) -> dict[str, str]:
+        """
+        Заголовки условного запроса.
+        """
+        headers: dict[str, str] = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def read(self, entry: CacheEntry) -> bytes | None:
+        try:
+            with open(self.body_path(entry.key), 'rb') as file:
+                return zlib.decompress(file.read())
+        except (OSError, zlib.error) as ex:
+            logger.warning(f'Broken cache entry for {entry.url}: {ex}')
+            self.discard(entry)
+            return None
+
+    def hit(self, entry: CacheEntry) -> bytes | None:
+        """
+        Тело свежей записи; None, если запись не читается.
+        """
+        body = self.read(entry)
+        if body is not None:
+            with self.lock:
+                self.stats.hits += 1
+                self.stats.bytes_saved += entry.raw_size
+        return body
+
+    def revalidate(self, entry: CacheEntry) -> bytes | None:
+        """
+        Сервер ответил 304 Not Modified: запись снова свежая.
+        """
+        body = self.read(entry)
+        if body is not None:
+            with self.lock:
+                entry.stored_at = time.time()
+                self.stats.revalidated += 1
+                self.stats.bytes_saved += entry.raw_size
+        return body
+
+    def store(
+        self,
+        url: str,
+        body: bytes,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        key = self.key_for(url)
+        compressed = zlib.compress(body)
+        if len(compressed) > self.max_size:
+            return
+        tmp_path = f'{self.body_path(key)}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(compressed)
+        os.replace(tmp_path, self.body_path(key))
+
+        with self.lock:
+            self.stats.misses += 1
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_size -= previous.size
+            self.entries[key] = CacheEntry(
+                key=key,
+                url=url,
+                stored_at=time.time(),
+                size=len(compressed),
+                raw_size=len(body),
+                etag=etag,
+                last_modified=last_modified,
+            )
+            self.total_size += len(compressed)
+            evicted = self.evict()
+        for old_key in evicted:
+            self.remove_body(old_key)
+
+    def evict(self) -> list[str]:
+        """
+        Удаляет давно не использованные записи, пока кэш не уложится
+        в max_size. Вызывается под блокировкой.
+        """
+        evicted: list[str] = []
+        while self.total_size > self.max_size and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.total_size -= entry.size
+            self.stats.evictions += 1
+            evicted.append(entry.key)
+        return evicted
+
+    def discard(self, entry: CacheEntry) -> None:
+        with self.lock:
+            if self.entries.pop(entry.key, None) is not None:
+                self.total_size -= entry.size
+        self.remove_body(entry.key)
+
+    def remove_body(self, key: str) -> None:
+        try:
+            os.remove(self.body_path(key))
+        except FileNotFoundError:
+            pass
@@ -1,7 +1,17 @@
-import json
 import logging
+from email.message import Message
+from functools import partial
 from http import HTTPStatus
-from urllib.request import urlopen
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from external.cache import ResponseCache
+from external.decoding import loads
+from external.metrics import METRICS
+from external.resilience import (
+    STATUS_HTTP_ERROR, FetchError, FetchPolicy, ResilientFetcher, classify,
+    is_retryable_status)
+from external.stream_parser import analyze_stream
 
 ERR_MESSAGE_TEMPLATE = 'Unexpected error: {error}'
 
@@ -13,6 +23,34 @@ class YandexWeatherAPI:
     """
     Base class for requests.
     """
+    cache: ResponseCache | None = None
+    fetcher: ResilientFetcher = ResilientFetcher()
+
+    @staticmethod
+    def set_cache(cache: ResponseCache | None) -> None:
+        """
+        Enables (or disables with None) the on-disk response cache.
+        """
+        YandexWeatherAPI.cache = cache
+
+    @staticmethod
+    def set_fetch_policy(policy: FetchPolicy | None) -> None:
+        """
+        Replaces the timeouts, retry and hedging settings (the default
+        policy with None); latency history and circuit breakers reset.
+        """
+        YandexWeatherAPI.fetcher = ResilientFetcher(policy)
+
+    @staticmethod
+    def wrap_error(error: Exception) -> FetchError:
+        """
+        Client error with the outcome status of the original one.
+        """
+        logger.error(error)
+        return FetchError(
+            ERR_MESSAGE_TEMPLATE.format(error=error),
+            classify(error)[0],
+        )
 
     @staticmethod
     def __do_req(url: str) -> str:
@@ -20,19 +58,133 @@ class YandexWeatherAPI:
         Base request method.
         """
         try:
-            with urlopen(url) as response:
-                resp_body = response.read().decode('utf-8')
-                data = json.loads(resp_body)
-            if response.status != HTTPStatus.OK:
-                raise Exception(
-                    'Error during execute request. {}: {}'.format(
-                        resp_body.status, resp_body.reason
-                    )
-                )
+            body = YandexWeatherAPI.__fetch_body(url)
+            with METRICS.span('parse', 'city', url=url):
+                data = loads(body)
+            METRICS.increment('parsed_bytes_total', len(body))
             return data
         except Exception as ex:
-            logger.error(ex)
-            raise Exception(ERR_MESSAGE_TEMPLATE.format(error=ex))
+            raise YandexWeatherAPI.wrap_error(ex)
+
+    @staticmethod
+    def __fetch_body(url: str) -> bytes:
+        """
+        Raw response body: from the cache while it is fresh, otherwise
+        from the server (with a conditional request if validators are known).
+        """
+        cache = YandexWeatherAPI.cache
+        entry = cache.lookup(url) if cache else None
+        if cache and entry and cache.is_fresh(entry):
+            body = cache.hit(entry)
+            if body is not None:
+                METRICS.increment(
+                    'fetched_bytes_total',
+                    len(body),
+                    source='cache',
+                )
+                return body
+        if cache:
+            cache.check_online(url)
+
+        status, resp_body, headers = YandexWeatherAPI.fetcher.fetch(
+            url,
+            partial(
+                YandexWeatherAPI.__request,
+                url,
+                ResponseCache.validators(entry),
+            ),
+        )
+        if status == HTTPStatus.NOT_MODIFIED:
+            body = cache.revalidate(entry) if cache and entry else None
+            if body is None:
+                raise FetchError(
+                    f'Unexpected {status} response for {url}.',
+                    STATUS_HTTP_ERROR,
+                )
+            METRICS.increment(
+                'fetched_bytes_total',
+                len(body),
+                source='revalidated',
+            )
+            return body
+
+        if cache:
+            cache.store(
+                url,
+                resp_body,
+                etag=headers.get('ETag'),
+                last_modified=headers.get('Last-Modified'),
+            )
+        METRICS.increment(
+            'fetched_bytes_total',
+            len(resp_body),
+            source='network',
+        )
+        return resp_body
+
+    @staticmethod
+    def __request(
+        url: str,
+        headers: dict[str, str],
+        timeout: float,
+    ) -> tuple[int, bytes, Message]:
+        """
+        One request attempt; 304 is returned rather than raised.
+        """
+        request = Request(url, headers=headers)
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                body = response.read()
+                if response.status != HTTPStatus.OK:
+                    raise FetchError(
+                        'Error during execute request. {}: {}'.format(
+                            response.status, response.reason
+                        ),
+                        STATUS_HTTP_ERROR,
+                        is_retryable_status(response.status),
+                    )
+                return response.status, body, response.headers
+        except HTTPError as ex:
+            if ex.code != HTTPStatus.NOT_MODIFIED:
+                raise
+            return ex.code, b'', ex.headers
+
+    @staticmethod
+    def get_forecasting_body(url: str) -> bytes:
+        """
+        :param url: url_to_json_data as str
+        :return: raw response body
+        """
+        try:
+            return YandexWeatherAPI.__fetch_body(url)
+        except Exception as ex:
+            raise YandexWeatherAPI.wrap_error(ex)
+
+    @staticmethod
+    def get_forecasting_analysis(url: str):
+        """
+        Analyses the response while it is being downloaded, without
+        materialising the document (the response cache is not used).
+        A partially consumed response cannot be retried, so only
+        the request timeout of the fetch policy applies.
+        :param url: url_to_json_data as str
+        :return: analyze_json-compatible result
+        """
+        try:
+            with urlopen(
+                url,
+                timeout=YandexWeatherAPI.fetcher.policy.request_timeout,
+            ) as response:
+                if response.status != HTTPStatus.OK:
+                    raise FetchError(
+                        'Error during execute request. {}: {}'.format(
+                            response.status, response.reason
+                        ),
+                        STATUS_HTTP_ERROR,
+                    )
+                return analyze_stream(response)
+        except Exception as ex:
+            raise YandexWeatherAPI.wrap_error(ex)
 
     @staticmethod
     def get_forecasting(url: str):
@@ -0,0 +1,63 @@
+import json
+import os
+from typing import Any, Callable, NamedTuple
+
+JSON_BACKEND_ENV = 'FORECAST_JSON_BACKEND'
+# NOTE: tried in this order, the standard library is always available
+JSON_BACKENDS = ('orjson', 'json')
+
+
+class JsonBackend(NamedTuple):
+    name: str
+    loads: Callable[[bytes | str], Any]
+
+
+def load_backend(name: str) -> JsonBackend:
+    """
+    :raise ImportError: если бэкенд не установлен
+    """
+    if name == 'json':
+        return JsonBackend(name, json.loads)
+    if name == 'orjson':
+        import orjson
+
+        return JsonBackend(name, orjson.loads)
+    raise ValueError(f'Unknown JSON backend: {name}')
+
+
+def select_backend(name: str | None = None) -> JsonBackend:
+    """
+    Бэкенд с указанным именем (или из FORECAST_JSON_BACKEND); без имени —
+    первый установленный бэкенд из JSON_BACKENDS.
+    """
+    name = name or os.environ.get(JSON_BACKEND_ENV)
+    if name:
+        return load_backend(name)
+    for candidate in JSON_BACKENDS:
+        try:
+            return load_backend(candidate)
+        except ImportError:
+            continue
+    raise ImportError('No JSON backend is available.')
+
+
+class JsonDecoder:
+    """
+    Разбор тел ответов выбранным бэкендом; бэкенд выбирается
+    (и импортируется) при первом использовании.
+    """
+    backend: JsonBackend | None = None
+
+    @staticmethod
+    def set_backend(name: str | None) -> JsonBackend:
+        JsonDecoder.backend = select_backend(name)
+        return JsonDecoder.backend
+
+    @staticmethod
+    def loads(data: bytes | str) -> Any:
+        backend = JsonDecoder.backend or JsonDecoder.set_backend(None)
+        return backend.loads(data)
+
+
+def loads(data: bytes | str) -> Any:
+    return JsonDecoder.loads(data)
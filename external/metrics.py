@@ -0,0 +1,332 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+DEFAULT_SAMPLING_INTERVAL = 0.05
+PROMETHEUS_FILE_NAME = 'metrics.prom'
+TRACE_FILE_NAME = 'trace.json'
+METRIC_PREFIX = 'forecast_'
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def make_labels(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in labels
+    ) + '}'
+
+
+def peak_rss() -> tuple[int, int] | None:
+    """
+    Пиковый объем резидентной памяти (в байтах) процесса и его
+    завершившихся дочерних процессов; None без модуля resource (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # NOTE: ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale: int = 1 if sys.platform == 'darwin' else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    )
+
+
+def now_us() -> float:
+    # NOTE: wall clock, so that events of worker processes line up
+    return time.time() * 1_000_000
+
+
+class NullSpan:
+    """
+    Интервал-заглушка, когда сбор метрик выключен.
+    """
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Замер этапа или города; при выходе записывается как событие 'X'
+    трассировки Chrome.
+    """
+    __slots__ = ('metrics', 'name', 'category', 'args', 'started')
+
+    def __init__(
+        self,
+        metrics: 'Metrics',
+        name: str,
+        category: str,
+        args: dict[str, Any],
+    ) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.started = now_us()
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.metrics.add_event({
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': self.started,
+            'dur': now_us() - self.started,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.args,
+        })
+
+
+@dataclass
+class MetricsSnapshot:
+    """
+    Метрики дочернего процесса, объединяемые с метриками родителя.
+    """
+    events: list[dict[str, Any]] = field(default_factory=list)
+    counters: dict[tuple[str, Labels], float] = field(default_factory=dict)
+    gauges: dict[tuple[str, Labels], float] = field(default_factory=dict)
+
+
+class Metrics:
+    """
+    Интервалы этапов и городов, счетчики (байты, ошибки) и периодически
+    снимаемые показатели (длина очереди, занятые потоки). Выгружаются
+    в текстовый файл Prometheus и в JSON трассировки Chrome
+    (chrome://tracing, Perfetto). В выключенном состоянии все методы
+    сразу возвращаются.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.events: list[dict[str, Any]] = []
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.gauges: dict[tuple[str, Labels], float] = {}
+        self.active_gauges: set[tuple[str, Labels]] = set()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def span(
+        self,
+        name: str,
+        category: str = 'stage',
+        **args: Any,
+    ) -> Span | NullSpan:
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def add_event(self, event: dict[str, Any]) -> None:
+        with self.lock:
+            self.events.append(event)
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = (name, make_labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, make_labels(labels))] = value
+
+    @contextmanager
+    def active(self, name: str, **labels: Any) -> Iterator[None]:
+        """
+        Считает одновременно выполняемые блоки (например, занятые потоки
+        пула); значение записывается в sampling().
+        """
+        if not self.enabled:
+            yield
+            return
+        key = (name, make_labels(labels))
+        with self.lock:
+            self.active_gauges.add(key)
+            self.gauges[key] = self.gauges.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.gauges[key] -= 1
+
+    def sample(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Записывает значение показателя в трассировку и обновляет его
+        максимум.
+        """
+        if not self.enabled:
+            return
+        key = (f'{name}_max', make_labels(labels))
+        with self.lock:
+            self.gauges[key] = max(self.gauges.get(key, value), value)
+            self.events.append({
+                'name': name,
+                'ph': 'C',
+                'ts': now_us(),
+                'pid': os.getpid(),
+                'args': {','.join(v for _, v in key[1]) or name: value},
+            })
+
+    @contextmanager
+    def sampling(
+        self,
+        probes: dict[str, Callable[[], float]],
+        interval: float = DEFAULT_SAMPLING_INTERVAL,
+    ) -> Iterator[None]:
+        """
+        Пока выполняется блок, фоновый поток каждые interval секунд
+        записывает значения probes (например, Queue.qsize) и active().
+        """
+        if not self.enabled:
+            yield
+            return
+        stopped = threading.Event()
+        sampler = threading.Thread(
+            target=self.sample_until,
+            args=(probes, interval, stopped),
+            daemon=True,
+        )
+        sampler.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            sampler.join()
+
+    def sample_until(
+        self,
+        probes: dict[str, Callable[[], float]],
+        interval: float,
+        stopped: threading.Event,
+    ) -> None:
+        while True:
+            for name, probe in probes.items():
+                try:
+                    self.sample('queue_depth', probe(), queue=name)
+                except NotImplementedError:
+                    # NOTE: Queue.qsize is not available on macOS
+                    pass
+            with self.lock:
+                active = [
+                    (name, labels, self.gauges[(name, labels)])
+                    for name, labels in self.active_gauges
+                ]
+            for name, labels, value in active:
+                self.sample(name, value, **dict(labels))
+            if stopped.wait(interval):
+                return
+
+    def snapshot(self) -> MetricsSnapshot:
+        with self.lock:
+            return MetricsSnapshot(
+                list(self.events),
+                dict(self.counters),
+                dict(self.gauges),
+            )
+
+    def merge(self, snapshot: MetricsSnapshot) -> None:
+        with self.lock:
+            self.events.extend(snapshot.events)
+            for key, value in snapshot.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(snapshot.gauges)
+
+    def span_totals(self) -> dict[tuple[str, str], tuple[int, float]]:
+        """
+        Число и суммарная длительность (в секундах) интервалов
+        по (категория, имя).
+        """
+        totals: dict[tuple[str, str], tuple[int, float]] = {}
+        with self.lock:
+            spans = [event for event in self.events if event['ph'] == 'X']
+        for event in spans:
+            count, seconds = totals.get((event['cat'], event['name']), (0, 0))
+            totals[(event['cat'], event['name'])] = (
+                count + 1,
+                seconds + event['dur'] / 1_000_000,
+            )
+        return totals
+
+    def to_prometheus(self) -> str:
+        lines: list[str] = [
+            f'# TYPE {METRIC_PREFIX}span_seconds summary',
+        ]
+        for (category, name), (count, seconds) in sorted(
+            self.span_totals().items()
+        ):
+            labels = format_labels(make_labels(
+                {'category': category, 'name': name}
+            ))
+            lines.append(
+                f'{METRIC_PREFIX}span_seconds_sum{labels} {seconds:.6f}'
+            )
+            lines.append(f'{METRIC_PREFIX}span_seconds_count{labels} {count}')
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        for metric_type, values in (('counter', counters), ('gauge', gauges)):
+            declared: set[str] = set()
+            for (name, labels), value in values:
+                metric_name = f'{METRIC_PREFIX}{name}'
+                if metric_name not in declared:
+                    lines.append(f'# TYPE {metric_name} {metric_type}')
+                    declared.add(metric_name)
+                lines.append(f'{metric_name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def to_trace(self) -> dict[str, Any]:
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, directory: str) -> tuple[str, str]:
+        """
+        Записывает metrics.prom и trace.json в directory.
+        :return: пути к обоим файлам
+        """
+        os.makedirs(directory, exist_ok=True)
+        prometheus_path = os.path.join(directory, PROMETHEUS_FILE_NAME)
+        trace_path = os.path.join(directory, TRACE_FILE_NAME)
+        with open(prometheus_path, 'w') as file:
+            file.write(self.to_prometheus())
+        with open(trace_path, 'w') as file:
+            json.dump(self.to_trace(), file)
+        return prometheus_path, trace_path
+
+
+# NOTE: process-wide instance, disabled unless --metrics-dir is given
+METRICS = Metrics()
@@ -0,0 +1,430 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, wait)
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, TypeVar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+
+from external.metrics import METRICS
+
+DEFAULT_REQUEST_TIMEOUT = 10.0
+DEFAULT_FETCH_DEADLINE = 30.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.2
+DEFAULT_MAX_BACKOFF = 2.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+# NOTE: hedging starts once the latency quantile is meaningful
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 1024
+HEDGE_WORKERS = 64
+
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_HTTP_ERROR = 'http_error'
+STATUS_CONNECTION_ERROR = 'connection_error'
+STATUS_CIRCUIT_OPEN = 'circuit_open'
+STATUS_PARSE_ERROR = 'parse_error'
+STATUS_ERROR = 'error'
+
+Result = TypeVar('Result')
+
+logger = logging.getLogger()
+
+
+class FetchError(Exception):
+    """
+    Ошибка загрузки со статусом итога; ResilientFetcher повторяет
+    загрузку при retryable ошибках.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status: str = STATUS_ERROR,
+        retryable: bool = False,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def classify(error: BaseException) -> tuple[str, bool]:
+    """
+    Статус итога по исключению и нужен ли повтор: повторяются
+    таймауты, ошибки соединения и ответы 5xx и 429.
+    """
+    if isinstance(error, FetchError):
+        return error.status, error.retryable
+    if isinstance(error, HTTPError):
+        return STATUS_HTTP_ERROR, is_retryable_status(error.code)
+    if isinstance(error, TimeoutError) or (
+        isinstance(error, URLError) and isinstance(error.reason, TimeoutError)
+    ):
+        return STATUS_TIMEOUT, True
+    # NOTE: EOFError covers asyncio.IncompleteReadError
+    if isinstance(error, (URLError, OSError, EOFError)):
+        return STATUS_CONNECTION_ERROR, True
+    if isinstance(error, ValueError):
+        return STATUS_PARSE_ERROR, False
+    return STATUS_ERROR, False
+
+
+def is_retryable_status(code: int) -> bool:
+    return code >= 500 or code == 429
+
+
+@dataclass
+class FetchPolicy:
+    """
+    Таймауты и настройки повторов, дублирующих запросов и размыкателя.
+    request_timeout ограничивает одну попытку, deadline — всю загрузку
+    одного URL вместе с повторами; hedge_quantile None отключает
+    дублирующие запросы.
+    """
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT
+    deadline: float = DEFAULT_FETCH_DEADLINE
+    retries: int = DEFAULT_RETRIES
+    backoff: float = DEFAULT_BACKOFF
+    max_backoff: float = DEFAULT_MAX_BACKOFF
+    hedge_quantile: float | None = DEFAULT_HEDGE_QUANTILE
+    breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD
+    breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN
+
+    def backoff_delay(self, attempt: int) -> float:
+        # NOTE: "full jitter", spreads the retries of concurrent requests
+        return random.uniform(
+            0,
+            min(self.max_backoff, self.backoff * 2 ** attempt),
+        )
+
+
+class LatencyTracker:
+    """
+    Время последних успешных попыток.
+    """
+
+    def __init__(self, size: int = LATENCY_WINDOW) -> None:
+        self.values: deque[float] = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.values.append(seconds)
+
+    def quantile(self, quantile: float) -> float | None:
+        with self.lock:
+            values: list[float] = sorted(self.values)
+        return quantile_of(values, quantile)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def quantile_of(values: list[float], quantile: float) -> float | None:
+    """
+    Квантиль отсортированных значений (ближайший ранг).
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: прекращает запросы к хосту после threshold ошибок
+    подряд, при которых нужен повтор; через cooldown пропускается один
+    пробный запрос, по его результату цепь замыкается или снова
+    размыкается.
+    """
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures: int = 0
+        self.opened_at: float | None = None
+        self.trial: bool = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.trial = True
+            return True
+
+    def record(self, success: bool) -> None:
+        with self.lock:
+            self.trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+class ResilientFetcher:
+    """
+    Выполняет попытки запроса по FetchPolicy: таймаут попытки, общий
+    срок, повторы со случайной задержкой, дублирующая попытка, если
+    первая медленнее квантиля последних времен ответа, и размыкатель
+    на каждый хост. Потокобезопасен; один экземпляр используют
+    и многопоточный, и асинхронный клиенты.
+    """
+
+    def __init__(self, policy: FetchPolicy | None = None) -> None:
+        self.policy = policy or FetchPolicy()
+        self.latencies = LatencyTracker()
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+        self.executor: ThreadPoolExecutor | None = None
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host: str = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    self.policy.breaker_threshold,
+                    self.policy.breaker_cooldown,
+                )
+            return self.breakers[host]
+
+    def open_circuits(self) -> list[str]:
+        with self.lock:
+            return sorted(
+                host
+                for host, breaker in self.breakers.items()
+                if breaker.is_open
+            )
+
+    def hedge_delay(self, timeout: float) -> float | None:
+        """
+        Через сколько секунд отправляется дублирующая попытка; None,
+        если дублирование отключено, мало замеров или оно бесполезно.
+        """
+        if (
+            self.policy.hedge_quantile is None
+            or len(self.latencies) < HEDGE_MIN_SAMPLES
+        ):
+            return None
+        delay = self.latencies.quantile(self.policy.hedge_quantile)
+        return delay if delay is not None and delay < timeout else None
+
+    def before_attempt(
+        self,
+        url: str,
+        breaker: CircuitBreaker,
+        deadline: float,
+    ) -> float:
+        """
+        :return: таймаут следующей попытки
+        """
+        # NOTE: the deadline goes first, a half-open breaker must not
+        # hand out its trial to an attempt that is never made
+        remaining: float = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FetchError(f'Deadline exceeded for {url}.', STATUS_TIMEOUT)
+        if not breaker.allow():
+            raise FetchError(
+                f'Circuit breaker is open for {urlsplit(url).netloc}.',
+                STATUS_CIRCUIT_OPEN,
+            )
+        return min(self.policy.request_timeout, remaining)
+
+    def after_failure(
+        self,
+        error: Exception,
+        breaker: CircuitBreaker,
+        attempt: int,
+        deadline: float,
+    ) -> float:
+        """
+        Учитывает ошибку и возвращает задержку перед следующей
+        попыткой; если попыток больше нет, ошибка выбрасывается снова.
+        """
+        status, retryable = classify(error)
+        # NOTE: a 404 means the host itself is fine
+        breaker.record(not retryable)
+        if not retryable or attempt >= self.policy.retries:
+            raise error
+        delay: float = self.policy.backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        METRICS.increment('fetch_retries_total', status=status)
+        logger.warning(f'Retrying {status} failure: {error}')
+        return delay
+
+    def fetch(
+        self,
+        url: str,
+        attempt: Callable[[float], Result],
+    ) -> Result:
+        """
+        :param attempt: выполняет один запрос с заданным таймаутом
+        """
+        deadline: float = time.monotonic() + self.policy.deadline
+        breaker: CircuitBreaker = self.breaker(url)
+        number: int = 0
+        while True:
+            timeout: float = self.before_attempt(url, breaker, deadline)
+            try:
+                result: Result = self.hedged(attempt, timeout)
+            except Exception as ex:
+                time.sleep(self.after_failure(ex, breaker, number, deadline))
+                number += 1
+                continue
+            breaker.record(True)
+            return result
+
+    def hedged(
+        self,
+        attempt: Callable[[float], Result],
+        timeout: float,
+    ) -> Result:
+        started: float = time.monotonic()
+        delay: float | None = self.hedge_delay(timeout)
+        if delay is None:
+            result: Result = attempt(timeout)
+            self.latencies.add(time.monotonic() - started)
+            return result
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    HEDGE_WORKERS,
+                    thread_name_prefix='hedge',
+                )
+        futures: set[Future] = {self.executor.submit(attempt, timeout)}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            METRICS.increment('fetch_hedged_total')
+            futures.add(self.executor.submit(attempt, timeout - delay))
+        error: BaseException | None = None
+        while futures:
+            done, futures = wait(
+                futures,
+                timeout=timeout,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                raise FetchError('Request timed out.', STATUS_TIMEOUT, True)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    # NOTE: the slower attempt finishes in the background
+                    self.latencies.add(time.monotonic() - started)
+                    return future.result()
+        raise error
+
+    async def fetch_async(
+        self,
+        url: str,
+        attempt: Callable[[], Awaitable[Result]],
+    ) -> Result:
+        """
+        fetch для корутин; attempt запускает один запрос.
+        """
+        import asyncio
+
+        deadline: float = time.monotonic() + self.policy.deadline
+        breaker: CircuitBreaker = self.breaker(url)
+        number: int = 0
+        while True:
+            timeout: float = self.before_attempt(url, breaker, deadline)
+            try:
+                result: Result = await self.hedged_async(attempt, timeout)
+            except Exception as ex:
+                await asyncio.sleep(
+                    self.after_failure(ex, breaker, number, deadline)
+                )
+                number += 1
+                continue
+            breaker.record(True)
+            return result
+
+    async def hedged_async(
+        self,
+        attempt: Callable[[], Awaitable[Result]],
+        timeout: float,
+    ) -> Result:
+        import asyncio
+
+        started: float = time.monotonic()
+        delay: float | None = self.hedge_delay(timeout)
+        tasks: set[asyncio.Task] = {
+            asyncio.ensure_future(asyncio.wait_for(attempt(), timeout))
+        }
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                METRICS.increment('fetch_hedged_total')
+                tasks.add(
+                    asyncio.ensure_future(
+                        asyncio.wait_for(attempt(), timeout - delay)
+                    )
+                )
+        error: BaseException | None = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        self.latencies.add(time.monotonic() - started)
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise error
+
+
+@dataclass(frozen=True)
+class FetchOutcome:
+    """
+    Итог загрузки одного города.
+    """
+    status: str
+    seconds: float
+    error: str | None = None
+
+
+def summarize_outcomes(outcomes: Iterable[FetchOutcome]) -> str:
+    """
+    Число городов по статусам и квантили времени загрузки; они же
+    публикуются как метрики.
+    """
+    counts: dict[str, int] = {}
+    latencies: list[float] = []
+    for outcome in outcomes:
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+        latencies.append(outcome.seconds)
+    if not latencies:
+        return 'no cities'
+    latencies.sort()
+    p50: float = quantile_of(latencies, 0.5)
+    p99: float = quantile_of(latencies, 0.99)
+    METRICS.set_gauge('fetch_latency_seconds', round(p50, 6), quantile=0.5)
+    METRICS.set_gauge('fetch_latency_seconds', round(p99, 6), quantile=0.99)
+    return '{}; latency p50: {:.3f}s, p99: {:.3f}s'.format(
+        ', '.join(f'{status}: {count}' for status, count in sorted(
+            counts.items()
+        )),
+        p50,
+        p99,
+    )
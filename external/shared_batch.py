@@ -0,0 +1,177 @@
+import sys
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Iterator
+
+import numpy as np
+
+from external.batch_analyzer import ForecastBatch, analyze_batch
+
+# NOTE: every array starts at a multiple of the widest item size
+ARRAY_ALIGNMENT = 8
+
+
+@dataclass(frozen=True)
+class ArrayLayout:
+    field: str
+    dtype: str
+    offset: int
+    length: int
+
+
+@dataclass(frozen=True)
+class SharedBatchSlice:
+    """
+    Picklable descriptor of cities [start, stop) of a SharedForecastBatch.
+    Only the segment name, the array layout and the city names travel
+    between processes; hours stay in the shared memory segment.
+    """
+    segment: str
+    layout: tuple[ArrayLayout, ...]
+    cities: tuple[str, ...]
+    start: int
+    stop: int
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+class SharedForecastBatch:
+    """
+    Packed forecasts (see pack_forecasts) copied into one shared memory
+    segment that worker processes read through analyze_shared_slice.
+    The creating process owns the segment: close() unlinks it, so it
+    should be called (or the object used as a context manager) even if
+    a worker crashed. If the owner itself dies, the multiprocessing
+    resource tracker unlinks the leaked segment.
+    """
+
+    def __init__(self, batch: ForecastBatch) -> None:
+        arrays: dict[str, np.ndarray] = {
+            'day_offsets': batch.day_offsets,
+            'day_index': batch.day_index,
+            'hours': batch.hours,
+            'temperatures': batch.temperatures,
+            'conditions': batch.conditions,
+            'dates': np.array(
+                [date or '' for date in batch.dates],
+                dtype=np.bytes_,
+            ),
+        }
+        layout: list[ArrayLayout] = []
+        size: int = 0
+        for field, values in arrays.items():
+            size = -(-size // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+            layout.append(
+                ArrayLayout(field, values.dtype.str, size, len(values))
+            )
+            size += values.nbytes
+        self.cities: list[str] = batch.cities
+        self.layout: tuple[ArrayLayout, ...] = tuple(layout)
+        # NOTE: zero-sized segments are not allowed
+        self.memory: SharedMemory | None = SharedMemory(
+            create=True,
+            size=max(size, 1),
+        )
+        for array_layout in self.layout:
+            view = self.view(self.memory, array_layout)
+            view[:] = arrays[array_layout.field]
+            del view
+
+    @staticmethod
+    def view(memory: SharedMemory, array_layout: ArrayLayout) -> np.ndarray:
+        return np.frombuffer(
+            memory.buf,
+            dtype=np.dtype(array_layout.dtype),
+            count=array_layout.length,
+            offset=array_layout.offset,
+        )
+
+    def slices(self, batch_size: int) -> Iterator[SharedBatchSlice]:
+        for start in range(0, len(self.cities), batch_size):
+            stop: int = min(start + batch_size, len(self.cities))
+            yield SharedBatchSlice(
+                segment=self.memory.name,
+                layout=self.layout,
+                cities=tuple(self.cities[start:stop]),
+                start=start,
+                stop=stop,
+            )
+
+    def close(self) -> None:
+        if self.memory is None:
+            return
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self) -> 'SharedForecastBatch':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def attach_segment(name: str) -> SharedMemory:
+    """
+    Opens an existing segment without registering it in the resource
+    tracker: otherwise a worker with its own tracker would unlink
+    the segment (or warn about a leak) when it exits.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # NOTE: the equivalent of track=False for older versions
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def analyze_shared_slice(
+    batch_slice: SharedBatchSlice,
+) -> dict[str, dict[str, Any]]:
+    """
+    analyze_batch for the cities of the slice, reading hours directly
+    from the shared memory segment.
+    """
+    memory: SharedMemory = attach_segment(batch_slice.segment)
+    try:
+        return analyze_batch(slice_batch(memory, batch_slice))
+    finally:
+        # NOTE: the views created by slice_batch are released by now,
+        # otherwise close() fails with BufferError
+        memory.close()
+
+
+def slice_batch(
+    memory: SharedMemory,
+    batch_slice: SharedBatchSlice,
+) -> ForecastBatch:
+    views: dict[str, np.ndarray] = {
+        array_layout.field: SharedForecastBatch.view(memory, array_layout)
+        for array_layout in batch_slice.layout
+    }
+    day_offsets: np.ndarray = views['day_offsets'][
+        batch_slice.start:batch_slice.stop + 1
+    ]
+    first_day, last_day = int(day_offsets[0]), int(day_offsets[-1])
+    # NOTE: hours are stored day by day, so day_index is sorted
+    first_hour, last_hour = np.searchsorted(
+        views['day_index'],
+        (first_day, last_day),
+    ).tolist()
+    return ForecastBatch(
+        cities=list(batch_slice.cities),
+        day_offsets=day_offsets - first_day,
+        dates=[
+            date.decode() or None
+            for date in views['dates'][first_day:last_day].tolist()
+        ],
+        day_index=views['day_index'][first_hour:last_hour] - first_day,
+        hours=views['hours'][first_hour:last_hour],
+        temperatures=views['temperatures'][first_hour:last_hour],
+        conditions=views['conditions'][first_hour:last_hour],
+    )
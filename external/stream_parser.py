@@ -0,0 +1,196 @@
+import codecs
+import json
+import re
+from typing import Any, BinaryIO, Iterator
+
+from external.analyzer import (
+    DEFAULT_WINDOW, INPUT_CONDITION_PATH, INPUT_DATE_PATH,
+    INPUT_FORECAST_PATH, INPUT_HOUR_PATH, INPUT_HOURS_PATH,
+    INPUT_TEMPERATURE_PATH, OUTPUT_DAYS_KEY, DayInfo, ForecastHour,
+    WindowAggregate)
+
+DEFAULT_CHUNK_SIZE = 4096
+
+TOKEN_RE = re.compile(
+    r'[ \t\r\n]*(?:'
+    r'(?P<punct>[{}\[\],:])'
+    r'|(?P<string>"(?:[^"\\]|\\.)*")'
+    r'|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+    r'|(?P<literal>true|false|null)'
+    r')'
+)
+WHITESPACE_RE = re.compile(r'[ \t\r\n]*')
+NUMBER_CONTINUATION = '.eE+-0123456789'
+
+# NOTE: nesting depth of the objects we are interested in:
+# {"forecasts": [{"date": ..., "hours": [{"hour": ..., "temp": ...}]}]}
+DAY_DEPTH = 3
+HOUR_DEPTH = 5
+HOUR_FIELDS = (INPUT_HOUR_PATH, INPUT_TEMPERATURE_PATH, INPUT_CONDITION_PATH)
+
+
+def iter_tokens(
+    stream: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[str, str]]:
+    """
+    Splits a JSON byte stream into (kind, raw text) tokens, holding
+    at most one chunk plus one unfinished token in memory.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    eof = False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += decoder.decode(chunk or b'', final=eof)
+        position = 0
+        while True:
+            match = TOKEN_RE.match(buffer, position)
+            if match is None or match.lastgroup is None:
+                break
+            # NOTE: a number or literal at the end of the buffer
+            # may continue in the next chunk
+            if (
+                not eof
+                and match.lastgroup in ('number', 'literal')
+                and (
+                    match.end() == len(buffer)
+                    or buffer[match.end()] in NUMBER_CONTINUATION
+                )
+            ):
+                break
+            position = match.end()
+            yield match.lastgroup, match.group(match.lastgroup)
+        buffer = buffer[position:]
+        if eof and WHITESPACE_RE.fullmatch(buffer) is None:
+            raise ValueError(f'Invalid JSON near: {buffer[:40]!r}')
+
+
+class DayAggregate:
+    """
+    Running DayInfo aggregates for one forecast day, kept by the same
+    WindowAggregate as the non-streamed analysis.
+    """
+    __slots__ = ('date', 'aggregate')
+
+    def __init__(self) -> None:
+        self.date: str | None = None
+        self.aggregate = WindowAggregate(DEFAULT_WINDOW)
+
+    def add_hour(self, hour_data: dict[str, Any]) -> None:
+        hour = ForecastHour.from_json(hour_data)
+        if self.aggregate.window.contains(hour.hour):
+            self.aggregate.add(hour)
+
+    def to_day_info(self) -> DayInfo:
+        day_info = DayInfo(raw_data={})
+        day_info.date = self.date
+        day_info.set_aggregates([self.aggregate])
+        return day_info
+
+
+class ForecastDaysCollector:
+    """
+    Tracks the position in the token stream and collects only
+    forecasts > [day] > date/hours > hour/temp/condition.
+    """
+
+    def __init__(self) -> None:
+        self.containers: list[str] = []
+        self.keys: list[str | None] = []
+        self.expecting_key = False
+        self.day: DayAggregate | None = None
+        self.hour: dict[str, Any] = {}
+
+    def is_forecast_path(self, depth: int) -> bool:
+        """
+        Whether the container at `depth` lies on forecasts > [day] > hours.
+        """
+        if depth < DAY_DEPTH or self.keys[0] != INPUT_FORECAST_PATH:
+            return False
+        return depth < HOUR_DEPTH or self.keys[2] == INPUT_HOURS_PATH
+
+    def open_container(self, bracket: str) -> None:
+        self.containers.append(bracket)
+        self.keys.append(None)
+        self.expecting_key = bracket == '{'
+        depth = len(self.containers)
+        if bracket == '{' and self.is_forecast_path(depth):
+            if depth == DAY_DEPTH:
+                self.day = DayAggregate()
+            elif depth == HOUR_DEPTH:
+                self.hour = {}
+
+    def close_container(self, bracket: str) -> dict[str, Any] | None:
+        """
+        :return: DayInfo.to_json() when a forecast day is closed
+        """
+        depth = len(self.containers)
+        self.containers.pop()
+        self.keys.pop()
+        if bracket != '}' or self.day is None:
+            return None
+        if not self.is_forecast_path(depth):
+            return None
+        if depth == HOUR_DEPTH:
+            self.day.add_hour(self.hour)
+        elif depth == DAY_DEPTH:
+            day_json = self.day.to_day_info().to_json()
+            self.day = None
+            return day_json
+        return None
+
+    def scalar(self, raw: str) -> None:
+        if self.expecting_key:
+            self.keys[-1] = raw[1:-1] if '\\' not in raw else json.loads(raw)
+            self.expecting_key = False
+            return
+        depth = len(self.containers)
+        if self.day is None or not self.is_forecast_path(depth):
+            return
+        if depth == DAY_DEPTH and self.keys[-1] == INPUT_DATE_PATH:
+            self.day.date = json.loads(raw)
+        elif depth == HOUR_DEPTH and self.keys[-1] in HOUR_FIELDS:
+            self.hour[self.keys[-1]] = json.loads(raw)
+
+
+def iter_forecast_days(
+    stream: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yields DayInfo.to_json() for every day in `forecasts` as soon as
+    the day object is closed; all other sections are skipped.
+    """
+    collector = ForecastDaysCollector()
+    for kind, raw in iter_tokens(stream, chunk_size):
+        if kind != 'punct':
+            collector.scalar(raw)
+        elif raw in '{[':
+            collector.open_container(raw)
+        elif raw in '}]':
+            day_json = collector.close_container(raw)
+            if day_json is not None:
+                yield day_json
+        elif raw == ',':
+            collector.expecting_key = collector.containers[-1] == '{'
+
+
+def analyze_stream(
+    stream: BinaryIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, list[Any]]:
+    """
+    Same result as analyze_json(json.load(stream)) without building
+    the whole document in memory; works on files and HTTP responses.
+    """
+    return {OUTPUT_DAYS_KEY: list(iter_forecast_days(stream, chunk_size))}
+
+
+def analyze_file(
+    input_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, list[Any]]:
+    with open(input_path, 'rb') as file:
+        return analyze_stream(file, chunk_size)
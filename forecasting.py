@@ -1,17 +1,49 @@
+import argparse
 import logging
 import os
 import shutil
 import sys
+from functools import partial
+from itertools import islice
 from multiprocessing import Process, Queue, cpu_count
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, Mapping
 
+from calculation_pool import CalculationPool
+from catalogue import CityCatalogue
+from checkpoint import (
+    DEFAULT_CHECKPOINT_DIR, RunCheckpoint, analysis_settings)
+from external.analyzer import AnalysisWindow
+from external.cache import (
+    DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_SIZE, DEFAULT_CACHE_TTL,
+    ResponseCache)
 from external.client import YandexWeatherAPI
+from external.decoding import JSON_BACKEND_ENV, JSON_BACKENDS
+from external.metrics import DEFAULT_SAMPLING_INTERVAL, METRICS, peak_rss
+from external.resilience import (
+    DEFAULT_FETCH_DEADLINE, DEFAULT_HEDGE_QUANTILE, DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_RETRIES, FetchPolicy)
+from history import DEFAULT_HISTORY_PATH, HistoryStore
+from incremental import DEFAULT_INDEX_PATH, AnalysisIndex
+from models import CityAnalysis, export_analyses, load_analyses
+from pipeline import (
+    DEFAULT_PIPELINE_QUEUE_SIZE, DEFAULT_PIPELINE_TOP_K, ForecastPipeline)
+from ranking import (
+    COMPETITION_RANKING, DEFAULT_SCORING, RANKING_METHODS, SCORING_FUNCTIONS)
+from spill import AnalysisSpill, chunk_size_for_budget, megabytes
 from tasks import (
-    DataAggregationTask, DataAnalyzingTask,
-    DataCalculationTask, DataFetchingTask)
+    DEFAULT_FETCH_CONCURRENCY, STOP_SIGNAL, DataAggregationTask,
+    DataAnalyzingTask, DataCalculationTask, DataFetchingTask,
+    iter_calculation_results)
 from utils import (
-    CITIES, ReportExcelTable, create_new_folders,
-    excel_report_table_settings, internet_connection_is_available)
+    CITIES, CITIES_NAMES_TRANSLATION, DEFAULT_PREFLIGHT_TIMEOUT,
+    REPORT_FILE_CLASSES, ConnectivityPreflight, create_new_folders,
+    create_report_files, excel_report_table_settings)
+
+REPORT_BASE_PATH = 'results'
+# NOTE: temporary files of the --subprocess compatibility mode
+SUBPROCESS_INPUT_DIR = 'cities_analyses'
+SUBPROCESS_OUTPUT_DIR = 'analyses_done'
+DEFAULT_REPORT_FORMATS = ('xlsx',)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,82 +51,1103 @@ logging.basicConfig(
 )
 
 
-def forecast_weather():
+def parse_args() -> argparse.Namespace:
     """
-    Анализ погодных условий по городам.
+    Разбор аргументов командной строки.
     """
-    if not internet_connection_is_available():
-        logging.error('Internet connection is unavailable.')
-        sys.exit(1)
-
-    logging.info('Start collecting weather conditions data.')
-    data_fetched_task = DataFetchingTask(
-        cities=CITIES,
-        weather_api=YandexWeatherAPI,
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--subprocess',
+        action='store_true',
+        help=(
+            'run external/analyzer.py in a separate interpreter for every '
+            'city (compatibility mode)'
+        ),
     )
-    fetched_data: tuple[tuple[str, dict[str, Any] | None], ...] = (
-        data_fetched_task.get_weather_data()
+    parser.add_argument(
+        '--async-fetch',
+        action='store_true',
+        help='fetch forecasts with asyncio and pooled keep-alive connections',
     )
-    logging.info(
-        'Weather data collection completed.'
-        f'Number of loaded cities: {len(fetched_data)}.'
+    parser.add_argument(
+        '--concurrency',
+        default=DEFAULT_FETCH_CONCURRENCY,
+        type=int,
+        help='maximum number of simultaneous requests in --async-fetch mode',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='always download forecasts, ignoring the response cache',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        type=str,
+        help='directory of the on-disk response cache',
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        default=DEFAULT_CACHE_TTL,
+        type=float,
+        help='seconds a cached response is used without revalidation',
+    )
+    parser.add_argument(
+        '--cache-max-size',
+        default=DEFAULT_CACHE_MAX_SIZE,
+        type=int,
+        help='maximum size of the response cache in bytes',
+    )
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help=(
+            'replay forecasts from the response cache regardless of their '
+            'age, without connectivity checks or network requests'
+        ),
+    )
+    parser.add_argument(
+        '--preflight-timeout',
+        default=DEFAULT_PREFLIGHT_TIMEOUT,
+        type=float,
+        help='seconds to wait for the forecast hosts connectivity check',
+    )
+    parser.add_argument(
+        '--stream-parse',
+        action='store_true',
+        help=(
+            'analyse responses while downloading them instead of '
+            'loading whole documents'
+        ),
+    )
+    parser.add_argument(
+        '--batch-analysis',
+        action='store_true',
+        help='analyse all cities at once with vectorised NumPy operations',
+    )
+    parser.add_argument(
+        '-w',
+        '--window',
+        action='append',
+        default=[],
+        type=AnalysisWindow.from_spec,
+        help=(
+            'additional analysis window as name:start-end[:cond,cond...], '
+            'computed in the same pass; may be repeated'
+        ),
+    )
+    parser.add_argument(
+        '--rank-window',
+        default=None,
+        type=str,
+        help='name of the analysis window used for rating and report',
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help=(
+            'overlap fetching, calculation and rating through bounded '
+            'queues instead of running them as separate phases'
+        ),
+    )
+    parser.add_argument(
+        '--queue-size',
+        default=DEFAULT_PIPELINE_QUEUE_SIZE,
+        type=int,
+        help='capacity of the bounded queues in --pipeline mode',
+    )
+    parser.add_argument(
+        '--scoring',
+        default=DEFAULT_SCORING,
+        choices=tuple(SCORING_FUNCTIONS),
+        help='city rating coefficient',
+    )
+    parser.add_argument(
+        '--rank-method',
+        default=COMPETITION_RANKING,
+        choices=RANKING_METHODS,
+        help='numbering of places for equal coefficients',
+    )
+    parser.add_argument(
+        '--top-k',
+        default=DEFAULT_PIPELINE_TOP_K,
+        type=int,
+        help='number of leaders reported while --pipeline is running',
+    )
+    parser.add_argument(
+        '--report-format',
+        action='append',
+        choices=tuple(REPORT_FILE_CLASSES),
+        help=(
+            'report output format (results.<format>), may be repeated; '
+            'xlsx by default'
+        ),
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help=(
+            'recompute only cities whose forecast changed since the last '
+            'incremental run, reuse stored results for the rest'
+        ),
+    )
+    parser.add_argument(
+        '--index-path',
+        default=DEFAULT_INDEX_PATH,
+        type=str,
+        help='file of the --incremental analysis index',
+    )
+    parser.add_argument(
+        '--history',
+        action='store_true',
+        help=(
+            'append the per-city, per-day results of the run to the '
+            'history database (see history.py for queries)'
+        ),
+    )
+    parser.add_argument(
+        '--history-path',
+        default=DEFAULT_HISTORY_PATH,
+        type=str,
+        help='SQLite file of --history',
+    )
+    parser.add_argument(
+        '--metrics-dir',
+        default=None,
+        type=str,
+        help=(
+            'collect stage/city timings, queue depths and byte counters and '
+            'write metrics.prom and trace.json to this directory'
+        ),
+    )
+    parser.add_argument(
+        '--metrics-interval',
+        default=DEFAULT_SAMPLING_INTERVAL,
+        type=float,
+        help='seconds between queue depth samples with --metrics-dir',
+    )
+    parser.add_argument(
+        '--export-dir',
+        default=None,
+        type=str,
+        help='also save the analysis of every city to <dir>/<city>.json',
+    )
+    parser.add_argument(
+        '--workers',
+        default=None,
+        type=int,
+        help=(
+            'maximum number of calculation processes (CPU count by '
+            'default); the actual number is chosen from measured costs'
+        ),
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=None,
+        type=int,
+        help='cities per calculation message (chosen automatically)',
     )
+    parser.add_argument(
+        '--shared-memory',
+        action='store_true',
+        help=(
+            'pass packed forecasts to calculation processes through shared '
+            'memory instead of pickling them (without --window)'
+        ),
+    )
+    parser.add_argument(
+        '--request-timeout',
+        default=DEFAULT_REQUEST_TIMEOUT,
+        type=float,
+        help='seconds to wait for a single forecast request',
+    )
+    parser.add_argument(
+        '--fetch-deadline',
+        default=DEFAULT_FETCH_DEADLINE,
+        type=float,
+        help='seconds to fetch one city, retries included',
+    )
+    parser.add_argument(
+        '--retries',
+        default=DEFAULT_RETRIES,
+        type=int,
+        help='retries of timeouts, connection errors and 5xx responses',
+    )
+    parser.add_argument(
+        '--no-hedging',
+        action='store_true',
+        help=(
+            'do not duplicate requests that are slower than the 95th '
+            'percentile of recent responses'
+        ),
+    )
+    parser.add_argument(
+        '--cities-file',
+        default=None,
+        type=str,
+        help=(
+            'city catalogue instead of the built-in cities: CSV with '
+            'a code,url,name header or JSON lines (.jsonl) with these keys'
+        ),
+    )
+    parser.add_argument(
+        '--json-backend',
+        default=None,
+        choices=JSON_BACKENDS,
+        help='JSON decoder of the responses, by default the fastest installed',
+    )
+    parser.add_argument(
+        '--memory-budget',
+        default=None,
+        type=int,
+        metavar='MB',
+        help=(
+            'process cities in chunks within this memory budget, spilling '
+            'analyses to disk and merging them for the report'
+        ),
+    )
+    parser.add_argument(
+        '--spill-dir',
+        default=None,
+        type=str,
+        help='directory for the spilled analyses, the system temp by default',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        action='store_true',
+        help=(
+            'keep fetched forecasts, analyses and rates in crash-safe '
+            'checkpoints until the report is ready'
+        ),
+    )
+    parser.add_argument(
+        '--checkpoint-dir',
+        default=DEFAULT_CHECKPOINT_DIR,
+        type=str,
+        help=(
+            f'checkpoint directory, {DEFAULT_CHECKPOINT_DIR} by default; '
+            'used only with --checkpoint or --resume'
+        ),
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help=(
+            'continue an interrupted --checkpoint run, skipping the cities '
+            'already fetched, analysed and rated'
+        ),
+    )
+    args = parser.parse_args()
+    if args.offline and args.no_cache:
+        parser.error('--offline replays the response cache, drop --no-cache')
+    return args
 
-    create_new_folders(('cities_analyses', 'analyses_done'))
-    logging.info('Temporary directories for data files have been created.')
 
-    logging.info('Start calculating average temperature and precipitation.')
+def collect_calculation_results(
+    output_queue: Queue,
+    processes: list[Process],
+) -> dict[str, CityAnalysis]:
+    """
+    Получает результаты анализа из выходной очереди. Очередь вычитывается
+    до завершения процессов, иначе join может заблокироваться
+    на непереданных данных.
+    """
+    return {
+        analysis.city: analysis
+        for analysis in iter_calculation_results(output_queue, processes)
+    }
+
+
+def check_analysis_windows(
+    windows: list[AnalysisWindow] | None,
+    rank_window: str | None,
+    stream_parse: bool,
+    batch_analysis: bool,
+) -> None:
+    """
+    Проверка настроек окон анализа до начала работы.
+    """
+    if windows and (stream_parse or batch_analysis):
+        raise ValueError(
+            'Additional analysis windows are not supported '
+            'in stream-parse and batch-analysis modes.'
+        )
+    window_names = [window.name for window in windows or []]
+    if len(window_names) != len(set(window_names)):
+        raise ValueError('Analysis window names must be unique.')
+    if rank_window is not None and rank_window not in window_names:
+        raise ValueError(f'Unknown analysis window: {rank_window}.')
+
+
+def calculate_weather_data(
+    fetched_data: tuple[tuple[str, dict[str, Any] | None], ...],
+    use_subprocess: bool = False,
+    batch_analysis: bool = False,
+    windows: list[AnalysisWindow] | None = None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    calculation_pool: CalculationPool | None = None,
+    on_batch: Callable[[list[CityAnalysis]], None] | None = None,
+) -> dict[str, CityAnalysis]:
+    """
+    Вычисление погодных параметров в пуле процессов CalculationPool
+    (или одним векторизованным проходом при batch_analysis).
+    Без calculation_pool создается временный пул; окна анализа
+    переданного пула задаются при его создании.
+    Временные файлы используются только в режиме use_subprocess.
+    on_batch получает результаты каждой пачки пула по мере готовности.
+    """
+    if batch_analysis:
+        from external.batch_analyzer import analyze_batch, pack_forecasts
+
+        return {
+            city_name: CityAnalysis.from_json(city_name, analysis)
+            for city_name, analysis in analyze_batch(
+                pack_forecasts(fetched_data)
+            ).items()
+        }
+    if use_subprocess:
+        return calculate_in_subprocesses(
+            fetched_data,
+            windows,
+            metrics_interval,
+        )
+    if calculation_pool is None:
+        with CalculationPool(
+            windows=windows,
+            metrics_interval=metrics_interval,
+        ) as temporary_pool:
+            return calculate_weather_data(
+                fetched_data,
+                calculation_pool=temporary_pool,
+                on_batch=on_batch,
+            )
+    analyses = calculation_pool.calculate(fetched_data, on_batch)
+    logging.info(f'Calculation workers: {calculation_pool.summary()}.')
+    return analyses
+
+
+def calculate_in_subprocesses(
+    fetched_data: tuple[tuple[str, dict[str, Any] | None], ...],
+    windows: list[AnalysisWindow] | None = None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+) -> dict[str, CityAnalysis]:
+    """
+    Вычисление погодных параметров внешним скриптом external/analyzer.py
+    в процессах DataCalculationTask через временные файлы.
+    """
     input_queue: Queue = Queue()
+    # NOTE: in subprocess mode the output queue only carries metrics
+    output_queue: Queue | None = Queue() if METRICS.enabled else None
     for city in (data for data in fetched_data if data[1]):
         input_queue.put(city)
 
-    completed_data_file_dir: str = os.path.join('analyses_done', '')
+    workers_amount: int = cpu_count()
+    for _ in range(workers_amount):
+        input_queue.put(STOP_SIGNAL)
+    create_new_folders((SUBPROCESS_INPUT_DIR, SUBPROCESS_OUTPUT_DIR))
     processes: list[Process] = [
         DataCalculationTask(
             input_queue,
-            path=completed_data_file_dir
-        ) for _ in range(cpu_count())
+            path=os.path.join(SUBPROCESS_OUTPUT_DIR, ''),
+            output_queue=output_queue,
+            use_subprocess=True,
+            windows=windows,
+            collect_metrics=METRICS.enabled,
+        ) for _ in range(workers_amount)
     ]
-    for process in processes:
-        process.start()
-    for process in processes:
-        process.join()
+    probes = {'calculation_input': input_queue.qsize}
+    if output_queue is not None:
+        probes['calculation_output'] = output_queue.qsize
+    with METRICS.sampling(probes, metrics_interval):
+        for process in processes:
+            process.start()
+        if output_queue is not None:
+            collect_calculation_results(output_queue, processes)
+        for process in processes:
+            process.join()
+    analyses = load_analyses(SUBPROCESS_OUTPUT_DIR)
+    shutil.rmtree(SUBPROCESS_INPUT_DIR)
+    shutil.rmtree(SUBPROCESS_OUTPUT_DIR)
+    return analyses
+
+
+def calculate_incrementally(
+    fetched_bodies: tuple[tuple[str, bytes | None], ...],
+    analysis_index: AnalysisIndex,
+    use_subprocess: bool,
+    batch_analysis: bool,
+    windows: list[AnalysisWindow] | None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    calculation_pool: CalculationPool | None = None,
+) -> dict[str, CityAnalysis]:
+    """
+    Вычисление погодных параметров только для городов, прогноз которых
+    изменился; для остальных используются результаты из индекса.
+    """
+    changed_data, analyses, digests = analysis_index.split(
+        fetched_bodies,
+        windows,
+    )
+    if changed_data:
+        changed_analyses: dict[str, CityAnalysis] = calculate_weather_data(
+            tuple(changed_data),
+            use_subprocess=use_subprocess,
+            batch_analysis=batch_analysis,
+            windows=windows,
+            metrics_interval=metrics_interval,
+            calculation_pool=calculation_pool,
+        )
+        analysis_index.update(changed_analyses, digests)
+        analyses.update(changed_analyses)
+    analysis_index.prune(city for city, _ in fetched_bodies)
+    analysis_index.save()
+    logging.info(f'Incremental run: {analysis_index.stats}.')
+    return analyses
 
+
+def fetch_and_calculate(
+    use_subprocess: bool,
+    async_fetch: bool,
+    fetch_concurrency: int,
+    response_cache: ResponseCache | None,
+    stream_parse: bool,
+    batch_analysis: bool,
+    windows: list[AnalysisWindow] | None,
+    analysis_index: AnalysisIndex | None = None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    calculation_pool: CalculationPool | None = None,
+    cities: Mapping[str, str] = CITIES,
+    checkpoint: RunCheckpoint | None = None,
+) -> dict[str, CityAnalysis]:
+    """
+    Загрузка данных и вычисление погодных параметров отдельными этапами.
+    С analysis_index загружаются тела ответов, а вычисления выполняются
+    только для изменившихся городов. С checkpoint загружаются
+    и анализируются только города, которых нет в контрольных точках,
+    а загруженные данные и результаты анализа добавляются в них.
+    """
+    resumed: dict[str, CityAnalysis] = {}
+    prefetched: list[tuple[str, dict[str, Any]]] = []
+    if checkpoint is not None:
+        resumed, prefetched, cities = checkpoint.split(cities)
+    logging.info('Start collecting weather conditions data.')
+    data_fetched_task = DataFetchingTask(
+        cities=cities,
+        weather_api=YandexWeatherAPI,
+        raw_bodies=analysis_index is not None,
+        checkpoint=None if checkpoint is None else checkpoint.fetched,
+    )
+    if stream_parse:
+        logging.info('Forecasts are analysed while being downloaded.')
+        with METRICS.span('fetching'):
+            analysed_data = data_fetched_task.get_weather_analyses()
+        log_fetch_outcomes(data_fetched_task)
+        logging.info(
+            'Weather data collection and calculations are complete. '
+            f'Number of loaded cities: {len(analysed_data)}.'
+        )
+        return {
+            city_name: CityAnalysis.from_json(city_name, analysis)
+            for city_name, analysis in analysed_data
+            if analysis
+        }
+
+    fetched_data: tuple[tuple[str, dict[str, Any] | None], ...] = (
+        *prefetched,
+        *fetch_weather_data(
+            data_fetched_task,
+            async_fetch,
+            fetch_concurrency,
+            response_cache,
+            metrics_interval,
+        ),
+    )
+
+    logging.info('Start calculating average temperature and precipitation.')
+    with METRICS.span('calculation'):
+        analyses: dict[str, CityAnalysis] = (
+            calculate_incrementally(
+                fetched_data,
+                analysis_index,
+                use_subprocess,
+                batch_analysis,
+                windows,
+                metrics_interval,
+                calculation_pool,
+            )
+            if analysis_index is not None
+            else calculate_weather_data(
+                fetched_data,
+                use_subprocess=use_subprocess,
+                batch_analysis=batch_analysis,
+                windows=windows,
+                metrics_interval=metrics_interval,
+                calculation_pool=calculation_pool,
+                on_batch=(
+                    None if checkpoint is None else checkpoint.save_analyses
+                ),
+            )
+        )
     logging.info(
         'Average temperature and precipitation calculations are complete.'
     )
-    shutil.rmtree('cities_analyses')
+    if checkpoint is not None:
+        checkpoint.save_analyses(analyses.values())
+        analyses.update(resumed)
+    return analyses
+
+
+def fetch_weather_data(
+    data_fetched_task: DataFetchingTask,
+    async_fetch: bool,
+    fetch_concurrency: int,
+    response_cache: ResponseCache | None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+    """
+    Этап загрузки: данные городов data_fetched_task (потоками
+    или в цикле событий asyncio).
+    """
+    with METRICS.span('fetching'), METRICS.sampling({}, metrics_interval):
+        fetched_data: tuple[tuple[str, dict[str, Any] | None], ...] = (
+            data_fetched_task.get_weather_data_async(fetch_concurrency)
+            if async_fetch
+            else data_fetched_task.get_weather_data()
+        )
+    if data_fetched_task.checkpoint is not None:
+        data_fetched_task.checkpoint.flush()
+    loaded_amount: int = sum(bool(data) for _, data in fetched_data)
+    logging.info(
+        'Weather data collection completed. '
+        f'Number of loaded cities: {loaded_amount}, '
+        f'failed: {len(fetched_data) - loaded_amount}.'
+    )
+    log_fetch_outcomes(data_fetched_task)
+    if response_cache is not None:
+        response_cache.save()
+        logging.info(f'Response cache: {response_cache.stats}.')
+    return fetched_data
+
+
+def log_fetch_outcomes(data_fetched_task: DataFetchingTask) -> None:
+    logging.info(f'Fetch outcomes: {data_fetched_task.outcome_summary()}.')
+    open_circuits: list[str] = YandexWeatherAPI.fetcher.open_circuits()
+    if open_circuits:
+        logging.warning(
+            f'Circuit breakers are open for: {", ".join(open_circuits)}.'
+        )
+
+
+def run_pipeline(
+    analyses: dict[str, CityAnalysis],
+    rates: dict[str, tuple[float, float, float]],
+    queue_size: int,
+    response_cache: ResponseCache | None,
+    windows: list[AnalysisWindow] | None,
+    rank_window: str | None,
+    scoring: str,
+    top_k: int,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    cities: Mapping[str, str] = CITIES,
+) -> None:
+    """
+    Потоковое выполнение загрузки, вычислений и расчета рейтинга.
+    """
+    logging.info('Start pipelined collecting, calculation and rating.')
+    pipeline = ForecastPipeline(
+        cities=cities,
+        weather_api=YandexWeatherAPI,
+        analyses=analyses,
+        rates=rates,
+        queue_size=queue_size,
+        windows=windows,
+        rank_window=rank_window,
+        scoring=SCORING_FUNCTIONS[scoring],
+        top_k=top_k,
+        metrics_interval=metrics_interval,
+    )
+    stats = pipeline.run()
+    log_fetch_outcomes(pipeline.fetching_task)
+    if response_cache is not None:
+        response_cache.save()
+        logging.info(f'Response cache: {response_cache.stats}.')
+    logging.info(f'Pipeline completed. {stats}.')
 
+
+def start_preflight(
+    preflight: ConnectivityPreflight | None,
+    response_cache: ResponseCache | None,
+    stream_parse: bool,
+    cities: Mapping[str, str] = CITIES,
+) -> ConnectivityPreflight | None:
+    """
+    Запуск проверки доступности серверов прогнозов (если она еще
+    не запущена). В автономном режиме ответы берутся только из кэша,
+    и проверка не нужна.
+    """
+    if response_cache is None or not response_cache.offline:
+        return preflight or ConnectivityPreflight(cities.values()).start()
+    if stream_parse:
+        raise ValueError(
+            'Stream-parse mode does not use the response cache '
+            'and cannot run offline.'
+        )
+    return None
+
+
+def check_connectivity(preflight: ConnectivityPreflight | None) -> None:
+    """
+    Ожидание результата проверки: работа прекращается, только если
+    недоступны все серверы прогнозов.
+    """
+    if preflight is None:
+        return
+    unreachable: list[str] = preflight.unreachable_hosts()
+    if unreachable and len(unreachable) == len(preflight.hosts):
+        logging.error(
+            f'Forecast hosts are unreachable: {", ".join(unreachable)}.'
+        )
+        sys.exit(1)
+    if unreachable:
+        logging.warning(
+            f'Some forecast hosts are unreachable: {", ".join(unreachable)}.'
+        )
+
+
+def calculate_in_chunks(
+    calculate_chunk: Callable[[Mapping[str, str]], dict[str, CityAnalysis]],
+    cities: Mapping[str, str],
+    chunk_size: int,
+    data_analysing_task: DataAnalyzingTask,
+    spill: AnalysisSpill,
+    city_names: Mapping[str, str],
+    checkpoint: RunCheckpoint | None = None,
+) -> None:
+    """
+    Загрузка, вычисления и расчет рейтинга частями по chunk_size городов:
+    разобранные прогнозы части освобождаются до загрузки следующей,
+    результаты анализа с ключом порядка отчета (коэффициент по убыванию,
+    название) передаются в spill. С checkpoint коэффициенты
+    из контрольной точки не пересчитываются, а новые добавляются в нее
+    после каждой части.
+    """
+    rates: dict[str, tuple[float, float, float]] = (
+        data_analysing_task.output_dict
+    )
+    if checkpoint is not None:
+        rates.update(checkpoint.load_rates(cities))
+    codes: Iterator[str] = iter(cities)
+    while chunk := list(islice(codes, chunk_size)):
+        logging.info(
+            f'Processing a chunk of {len(chunk)} cities, '
+            f'{spill.stats.cities} cities analysed so far.'
+        )
+        analyses: dict[str, CityAnalysis] = calculate_chunk(
+            {city: cities[city] for city in chunk}
+        )
+        with METRICS.span('rating'):
+            for analysis in analyses.values():
+                if analysis.city not in rates:
+                    rates[analysis.city] = data_analysing_task.count_rate(
+                        analysis
+                    )
+                rate = rates[analysis.city]
+                spill.add(
+                    analysis,
+                    (-rate[2], city_names.get(analysis.city, analysis.city)),
+                )
+        if checkpoint is not None:
+            checkpoint.save_rates(rates)
+
+
+def rate_analyses(
+    analyses: dict[str, CityAnalysis],
+    rates: dict[str, tuple[float, float, float]],
+    rank_window: str | None,
+    scoring: str,
+    checkpoint: RunCheckpoint | None = None,
+) -> None:
+    """
+    Расчет коэффициентов городов; с checkpoint коэффициенты
+    из контрольной точки не пересчитываются, а новые добавляются в нее.
+    """
     logging.info('Beginning of data analysis to calculate the rating.')
-    rates: dict[str, tuple[float, float, int]] = {}
+    if checkpoint is not None:
+        rates.update(checkpoint.load_rates(analyses))
     data_analysing_task = DataAnalyzingTask(
-        file_dir=completed_data_file_dir,
+        analyses=[
+            analysis
+            for analysis in analyses.values()
+            if analysis.city not in rates
+        ],
         output_dict=rates,
+        window=rank_window,
+        scoring=SCORING_FUNCTIONS[scoring],
     )
-    data_analysing_task.rate_data()
+    with METRICS.span('rating'):
+        data_analysing_task.rate_data()
+    if checkpoint is not None:
+        checkpoint.save_rates(rates)
     logging.info('Data analysis to calculate the rating has been completed.')
 
-    logging.info('Start generating a report in .xlsx format.')
-    excel_file_path: str = 'results.xlsx'
-    ReportExcelTable(
-        file_path=excel_file_path,
-        settings=excel_report_table_settings,
-        records_amount=len(rates),
-    ).create_and_setup_new_excel_file()
 
+def publish_results(
+    results: Callable[[], Iterable[CityAnalysis]],
+    rates: dict[str, tuple[float, float, float]],
+    report_formats: tuple[str, ...],
+    rank_window: str | None,
+    rank_method: str,
+    city_names: Mapping[str, str],
+    export_dir: str | None = None,
+    history_store: HistoryStore | None = None,
+    report_dates: list[str] | None = None,
+) -> None:
+    """
+    Сохранение результатов в историю и в файлы городов и формирование
+    отчета. results при каждом вызове возвращает результаты анализа;
+    с report_dates они уже идут в порядке отчета и записываются
+    без накопления в памяти.
+    """
+    if history_store is not None:
+        with METRICS.span('history'):
+            run_id: int = history_store.record_run(results())
+        logging.info(f'Results have been added to the history, run {run_id}.')
+    if export_dir is not None:
+        export_analyses(results(), export_dir)
+        logging.info(f'City analyses have been saved to {export_dir}.')
+
+    logging.info(
+        'Start generating a report in {} format.'.format(
+            ', '.join(report_formats)
+        )
+    )
     data_aggregation_task = DataAggregationTask(
-        file_dir=completed_data_file_dir,
+        analyses=results(),
         dict_with_rates=rates,
-        report_path=excel_file_path,
+        report_files=create_report_files(
+            REPORT_BASE_PATH,
+            report_formats,
+            excel_report_table_settings,
+        ),
+        window=rank_window,
+        rank_method=rank_method,
+        city_names=city_names,
+        dates=report_dates,
     )
-    answer: list[str] = data_aggregation_task.aggregate_data()
-    shutil.rmtree('analyses_done')
-    logging.info('Temporary files deleted.')
+    with METRICS.span('report'):
+        answer: list[str] = data_aggregation_task.aggregate_data()
     logging.info(
         'Report generation is complete. '
         f'The most favorable cities to visit: {", ".join(answer)}.'
     )
 
 
+def log_peak_rss() -> None:
+    usage: tuple[int, int] | None = peak_rss()
+    if usage is None:
+        return
+    own, children = usage
+    METRICS.set_gauge('peak_rss_bytes', own, process='main')
+    METRICS.set_gauge('peak_rss_bytes', children, process='children')
+    logging.info(
+        f'Peak RSS: {megabytes(own)}, '
+        f'child processes: {megabytes(children)}.'
+    )
+
+
+def check_run_modes(
+    use_subprocess: bool,
+    async_fetch: bool,
+    stream_parse: bool,
+    batch_analysis: bool,
+    pipelined: bool,
+    analysis_index: AnalysisIndex | None,
+    memory_budget: int | None,
+    checkpoint: RunCheckpoint | None,
+) -> None:
+    """
+    Проверка совместимости режимов выполнения.
+    """
+    if pipelined and (
+        use_subprocess or async_fetch or stream_parse or batch_analysis
+    ):
+        raise ValueError(
+            'Pipelined mode uses threaded fetching and in-process analysis.'
+        )
+    if memory_budget is not None and (
+        pipelined or analysis_index is not None
+    ):
+        raise ValueError(
+            'Memory-budgeted mode is not supported in pipeline and '
+            'incremental modes.'
+        )
+    if checkpoint is not None and (
+        pipelined or stream_parse or analysis_index is not None
+    ):
+        raise ValueError(
+            'Checkpoints are not supported in pipeline, stream-parse and '
+            'incremental modes.'
+        )
+    if analysis_index is not None and (pipelined or stream_parse):
+        raise ValueError(
+            'Incremental mode is not supported in pipeline and '
+            'stream-parse modes.'
+        )
+
+
+def forecast_weather(
+    use_subprocess: bool = False,
+    async_fetch: bool = False,
+    fetch_concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+    response_cache: ResponseCache | None = None,
+    stream_parse: bool = False,
+    batch_analysis: bool = False,
+    windows: list[AnalysisWindow] | None = None,
+    rank_window: str | None = None,
+    pipelined: bool = False,
+    queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+    report_formats: tuple[str, ...] = DEFAULT_REPORT_FORMATS,
+    export_dir: str | None = None,
+    scoring: str = DEFAULT_SCORING,
+    rank_method: str = COMPETITION_RANKING,
+    top_k: int = DEFAULT_PIPELINE_TOP_K,
+    analysis_index: AnalysisIndex | None = None,
+    metrics_dir: str | None = None,
+    metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    calculation_pool: CalculationPool | None = None,
+    preflight: ConnectivityPreflight | None = None,
+    fetch_policy: FetchPolicy | None = None,
+    cities: Mapping[str, str] | None = None,
+    history_store: HistoryStore | None = None,
+    memory_budget: int | None = None,
+    spill_dir: str | None = None,
+    checkpoint: RunCheckpoint | None = None,
+):
+    """
+    Анализ погодных условий по городам.
+    windows — дополнительные окна анализа, rank_window — имя окна,
+    по которому строятся рейтинг и отчет; pipelined — потоковое
+    выполнение этапов через ограниченные очереди; export_dir —
+    директория для сохранения результатов анализа по городам;
+    scoring и rank_method — функция коэффициента и способ нумерации мест,
+    top_k — число лидеров, о которых сообщает потоковый режим;
+    analysis_index — индекс для инкрементального пересчета;
+    metrics_dir — директория для выгрузки метрик (metrics.prom
+    и trace.json), без нее инструментирование выключено;
+    calculation_pool — пул процессов для вычислений, который можно
+    использовать в нескольких запусках; preflight — уже запущенная
+    проверка доступности серверов (по умолчанию запускается здесь,
+    в автономном режиме кэша ответов не выполняется); fetch_policy —
+    таймауты, повторы и дублирование медленных запросов; cities —
+    города (код -> URL), по умолчанию CITIES, для большого числа
+    городов — каталог CityCatalogue; history_store — хранилище, в которое
+    добавляются результаты запуска; memory_budget — бюджет памяти в байтах:
+    города обрабатываются частями, результаты анализа сверх половины
+    бюджета сбрасываются на диск (в spill_dir, по умолчанию во временную
+    директорию), а отчет формируется слиянием этих частей; checkpoint —
+    контрольные точки загрузки, анализа и рейтинга, с которых
+    продолжается прерванный запуск (удаляются после формирования отчета).
+    """
+    cities = CITIES if cities is None else cities
+    preflight = start_preflight(
+        preflight,
+        response_cache,
+        stream_parse,
+        cities,
+    )
+    check_analysis_windows(windows, rank_window, stream_parse, batch_analysis)
+    check_run_modes(
+        use_subprocess,
+        async_fetch,
+        stream_parse,
+        batch_analysis,
+        pipelined,
+        analysis_index,
+        memory_budget,
+        checkpoint,
+    )
+    YandexWeatherAPI.set_cache(response_cache)
+    if fetch_policy is not None:
+        YandexWeatherAPI.set_fetch_policy(fetch_policy)
+    if metrics_dir is not None:
+        METRICS.enable()
+    check_connectivity(preflight)
+    analyses: dict[str, CityAnalysis] = {}
+    rates: dict[str, tuple[float, float, float]] = {}
+
+    if pipelined:
+        run_pipeline(
+            analyses,
+            rates,
+            queue_size,
+            response_cache,
+            windows,
+            rank_window,
+            scoring,
+            top_k,
+            metrics_interval,
+            cities,
+        )
+    elif memory_budget is None:
+        analyses = fetch_and_calculate(
+            use_subprocess,
+            async_fetch,
+            fetch_concurrency,
+            response_cache,
+            stream_parse,
+            batch_analysis,
+            windows,
+            analysis_index,
+            metrics_interval,
+            calculation_pool,
+            cities,
+            checkpoint,
+        )
+        rate_analyses(analyses, rates, rank_window, scoring, checkpoint)
+    city_names: Mapping[str, str] = getattr(
+        cities,
+        'names',
+        CITIES_NAMES_TRANSLATION,
+    )
+    if memory_budget is None:
+        publish_results(
+            analyses.values,
+            rates,
+            report_formats,
+            rank_window,
+            rank_method,
+            city_names,
+            export_dir,
+            history_store,
+        )
+    else:
+        with AnalysisSpill(memory_budget // 2, spill_dir) as spill:
+            calculate_in_chunks(
+                partial(
+                    fetch_and_calculate,
+                    use_subprocess,
+                    async_fetch,
+                    fetch_concurrency,
+                    response_cache,
+                    stream_parse,
+                    batch_analysis,
+                    windows,
+                    None,
+                    metrics_interval,
+                    calculation_pool,
+                    checkpoint=checkpoint,
+                ),
+                cities,
+                chunk_size_for_budget(memory_budget),
+                DataAnalyzingTask(
+                    analyses=(),
+                    output_dict=rates,
+                    window=rank_window,
+                    scoring=SCORING_FUNCTIONS[scoring],
+                ),
+                spill,
+                city_names,
+                checkpoint,
+            )
+            logging.info(f'Memory-budgeted run: {spill.stats}.')
+            publish_results(
+                spill.merged,
+                rates,
+                report_formats,
+                rank_window,
+                rank_method,
+                city_names,
+                export_dir,
+                history_store,
+                report_dates=sorted(spill.dates),
+            )
+    if checkpoint is not None:
+        checkpoint.complete()
+    log_peak_rss()
+    if metrics_dir is not None:
+        prometheus_path, trace_path = METRICS.export(metrics_dir)
+        logging.info(f'Metrics saved to {prometheus_path} and {trace_path}.')
+
+
 if __name__ == '__main__':
-    forecast_weather()
+    args = parse_args()
+    if args.json_backend:
+        # NOTE: through the environment, so that calculation processes
+        # and the analyzer subprocess decode with the same backend
+        os.environ[JSON_BACKEND_ENV] = args.json_backend
+    cities: Mapping[str, str] = (
+        CityCatalogue(args.cities_file) if args.cities_file else CITIES
+    )
+    # NOTE: the check runs while the cache, the index and the pool load
+    preflight = None if args.offline else ConnectivityPreflight(
+        cities.values(),
+        args.preflight_timeout,
+    ).start()
+    calculation_pool = CalculationPool(
+        max_workers=args.workers,
+        batch_size=args.batch_size,
+        windows=args.window,
+        metrics_interval=args.metrics_interval,
+        shared_memory=args.shared_memory,
+    )
+    with calculation_pool:
+        forecast_weather(
+            use_subprocess=args.subprocess,
+            async_fetch=args.async_fetch,
+            fetch_concurrency=args.concurrency,
+            stream_parse=args.stream_parse,
+            batch_analysis=args.batch_analysis,
+            windows=args.window,
+            rank_window=args.rank_window,
+            pipelined=args.pipeline,
+            queue_size=args.queue_size,
+            report_formats=tuple(args.report_format or DEFAULT_REPORT_FORMATS),
+            export_dir=args.export_dir,
+            scoring=args.scoring,
+            rank_method=args.rank_method,
+            top_k=args.top_k,
+            analysis_index=(
+                AnalysisIndex(args.index_path) if args.incremental else None
+            ),
+            metrics_dir=args.metrics_dir,
+            metrics_interval=args.metrics_interval,
+            response_cache=None if args.no_cache else ResponseCache(
+                directory=args.cache_dir,
+                ttl=args.cache_ttl,
+                max_size=args.cache_max_size,
+                offline=args.offline,
+            ),
+            calculation_pool=calculation_pool,
+            preflight=preflight,
+            fetch_policy=FetchPolicy(
+                request_timeout=args.request_timeout,
+                deadline=args.fetch_deadline,
+                retries=args.retries,
+                hedge_quantile=(
+                    None if args.no_hedging else DEFAULT_HEDGE_QUANTILE
+                ),
+            ),
+            cities=cities,
+            history_store=(
+                HistoryStore(args.history_path) if args.history else None
+            ),
+            memory_budget=(
+                args.memory_budget * 1024 * 1024
+                if args.memory_budget
+                else None
+            ),
+            spill_dir=args.spill_dir,
+            checkpoint=(
+                RunCheckpoint(
+                    analysis_settings(
+                        args.window,
+                        args.rank_window,
+                        args.scoring,
+                    ),
+                    args.checkpoint_dir,
+                    resume=args.resume,
+                )
+                if args.checkpoint or args.resume
+                else None
+            ),
+        )
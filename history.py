@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from models import CityAnalysis, DaySeries
+
+DEFAULT_HISTORY_PATH = os.path.join('.history', 'history.sqlite3')
+INSERT_BATCH_SIZE = 1000
+# NOTE: the day itself, not one of the additional analysis windows
+BASE_WINDOW = ''
+DAY_FIELDS = (
+    'hours_start', 'hours_end', 'hours_count', 'temp_avg',
+    'relevant_cond_hours',
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS days (
+    city TEXT NOT NULL,
+    date TEXT NOT NULL,
+    window_name TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    hours_start INTEGER,
+    hours_end INTEGER,
+    hours_count INTEGER NOT NULL,
+    temp_avg REAL,
+    relevant_cond_hours INTEGER NOT NULL,
+    PRIMARY KEY (city, window_name, date, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS days_by_date ON days (date, window_name, city);
+CREATE TABLE IF NOT EXISTS latest_days (
+    city TEXT NOT NULL,
+    date TEXT NOT NULL,
+    window_name TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    hours_start INTEGER,
+    hours_end INTEGER,
+    hours_count INTEGER NOT NULL,
+    temp_avg REAL,
+    relevant_cond_hours INTEGER NOT NULL,
+    PRIMARY KEY (city, window_name, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS latest_days_by_date
+    ON latest_days (date, window_name, city);
+'''
+INSERT_DAY = 'INSERT OR REPLACE INTO {} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+LATEST_DAYS = '''
+SELECT city, date, run_id, hours_start, hours_end, hours_count,
+    temp_avg, relevant_cond_hours
+FROM latest_days
+WHERE window_name = :window AND date BETWEEN :date_from AND :date_to
+    {city_condition}
+'''
+
+
+def latest_days(city: str | None) -> str:
+    return LATEST_DAYS.format(
+        city_condition='' if city is None else 'AND city = :city'
+    )
+
+
+class HistoryStore:
+    """
+    История результатов анализа в SQLite: по строке на город, день
+    (и окно анализа) для каждого запуска, в формате DayInfo.to_json.
+    В latest_days для каждого дня хранится последний прогноз, так что
+    выборки за период и агрегаты читают по строке на день независимо
+    от числа запусков. Обе таблицы индексированы по городу и по дате.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        # NOTE: the service records from its refresh thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'HistoryStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @staticmethod
+    def day_rows(
+        analysis: CityAnalysis,
+        run_id: int,
+    ) -> Iterator[tuple[Any, ...]]:
+        series: dict[str, DaySeries] = {
+            BASE_WINDOW: analysis.days,
+            **(analysis.windows or {}),
+        }
+        for index, date in enumerate(analysis.dates):
+            if date is None:
+                continue
+            for window, days in series.items():
+                day: dict[str, Any] = days.day_json(index)
+                yield (
+                    analysis.city,
+                    date,
+                    window,
+                    run_id,
+                    *(day[field] for field in DAY_FIELDS),
+                )
+
+    def record_run(
+        self,
+        analyses: Iterable[CityAnalysis],
+        recorded_at: str | None = None,
+    ) -> int:
+        """
+        Добавляет результаты запуска одной транзакцией, пачками
+        по INSERT_BATCH_SIZE строк.
+        :return: номер запуска
+        """
+        recorded_at = recorded_at or datetime.now(timezone.utc).isoformat(
+            timespec='seconds'
+        )
+        with self.lock, self.connection:
+            run_id: int = self.connection.execute(
+                'INSERT INTO runs (recorded_at) VALUES (?)',
+                (recorded_at,),
+            ).lastrowid
+            rows: Iterator[tuple[Any, ...]] = (
+                row
+                for analysis in analyses
+                for row in self.day_rows(analysis, run_id)
+            )
+            while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+                for table in ('days', 'latest_days'):
+                    self.connection.executemany(
+                        INSERT_DAY.format(table),
+                        batch,
+                    )
+        return run_id
+
+    def query(self, sql: str, parameters: dict[str, Any]) -> list[dict]:
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.connection.execute(sql, parameters)
+            ]
+
+    def runs(self) -> list[dict[str, Any]]:
+        return self.query('SELECT id, recorded_at FROM runs ORDER BY id', {})
+
+    def city_days(
+        self,
+        city: str | None = None,
+        date_from: str = '',
+        date_to: str = '9999-12-31',
+        window: str = BASE_WINDOW,
+    ) -> list[dict[str, Any]]:
+        """
+        Дни за период [date_from, date_to] (даты ГГГГ-ММ-ДД) по последнему
+        прогнозу на каждую дату; city — один город или все города.
+        """
+        return self.query(
+            latest_days(city) + ' ORDER BY city, date',
+            {
+                'city': city,
+                'date_from': date_from,
+                'date_to': date_to,
+                'window': window,
+            },
+        )
+
+    def city_forecasts(
+        self,
+        city: str,
+        date: str,
+        window: str = BASE_WINDOW,
+    ) -> list[dict[str, Any]]:
+        """
+        Все прогнозы на дату по запускам: как менялся прогноз дня.
+        """
+        return self.query(
+            '''
+            SELECT run_id, recorded_at, hours_start, hours_end, hours_count,
+                temp_avg, relevant_cond_hours
+            FROM days JOIN runs ON runs.id = days.run_id
+            WHERE city = :city AND window_name = :window AND date = :date
+            ORDER BY run_id
+            ''',
+            {'city': city, 'date': date, 'window': window},
+        )
+
+    def aggregate(
+        self,
+        date_from: str = '',
+        date_to: str = '9999-12-31',
+        city: str | None = None,
+        window: str = BASE_WINDOW,
+    ) -> list[dict[str, Any]]:
+        """
+        Средние температура и число часов без осадков, число дней
+        по городам за период (по последнему прогнозу на каждую дату).
+        """
+        return self.query(
+            f'''
+            SELECT city, COUNT(*) AS days,
+                ROUND(AVG(temp_avg), 3) AS temp_avg,
+                ROUND(AVG(relevant_cond_hours), 3) AS relevant_cond_hours,
+                MIN(date) AS date_from, MAX(date) AS date_to
+            FROM ({latest_days(city)})
+            GROUP BY city
+            ORDER BY city
+            ''',
+            {
+                'city': city,
+                'date_from': date_from,
+                'date_to': date_to,
+                'window': window,
+            },
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='queries over the results stored by --history',
+    )
+    parser.add_argument('--path', default=DEFAULT_HISTORY_PATH, type=str)
+    parser.add_argument('--city', default=None, type=str)
+    parser.add_argument('--from', dest='date_from', default='', type=str)
+    parser.add_argument('--to', dest='date_to', default='9999-12-31')
+    parser.add_argument('--window', default=BASE_WINDOW, type=str)
+    parser.add_argument(
+        '--aggregate',
+        action='store_true',
+        help='averages per city instead of days',
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with HistoryStore(args.path) as store:
+        rows = (store.aggregate if args.aggregate else store.city_days)(
+            city=args.city,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            window=args.window,
+        )
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
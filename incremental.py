@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Iterable
+
+from external.analyzer import AnalysisWindow
+from external.decoding import loads
+from models import CityAnalysis
+from tasks import log_failed_cities
+
+DEFAULT_INDEX_PATH = os.path.join('.analysis_index', 'index.json')
+
+
+@dataclass
+class IncrementalStats:
+    """
+    Итоги инкрементального запуска.
+    """
+    recomputed: int = 0
+    reused: int = 0
+
+    def __str__(self) -> str:
+        return f'recomputed: {self.recomputed}, reused: {self.reused}'
+
+
+class AnalysisIndex:
+    """
+    Сохраняемый между запусками индекс: для каждого города — хеш тела
+    ответа (вместе с параметрами анализа) и последний результат анализа.
+    Города с тем же хешем повторно не разбираются и не анализируются.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        """
+        Загружает индекс, если он уже существует.
+        """
+        self.path = path
+        self.entries: dict[str, tuple[str, CityAnalysis]] = {}
+        self.stats = IncrementalStats()
+        if not os.path.exists(path):
+            return
+        with open(path) as file:
+            for city, (digest, analysis) in json.load(file).items():
+                self.entries[city] = (
+                    digest,
+                    CityAnalysis.from_json(city, analysis),
+                )
+
+    @staticmethod
+    def digest(
+        body: bytes,
+        windows: list[AnalysisWindow] | None = None,
+    ) -> str:
+        """
+        Хеш тела ответа; окна анализа входят в хеш, так как от них
+        зависит сохраненный результат.
+        """
+        content_hash = hashlib.sha256()
+        for window in windows or []:
+            content_hash.update(window.to_spec().encode())
+            content_hash.update(b'\n')
+        content_hash.update(body)
+        return content_hash.hexdigest()
+
+    def split(
+        self,
+        fetched_bodies: Iterable[tuple[str, bytes | None]],
+        windows: list[AnalysisWindow] | None = None,
+    ) -> tuple[
+        list[tuple[str, dict]],
+        dict[str, CityAnalysis],
+        dict[str, str],
+    ]:
+        """
+        Делит загруженные города на измененные и неизмененные.
+        :return: разобранные данные измененных городов (для
+            DataCalculationTask), сохраненные результаты неизмененных
+            и хеши измененных (для update)
+        """
+        changed: list[tuple[str, dict]] = []
+        reused: dict[str, CityAnalysis] = {}
+        digests: dict[str, str] = {}
+        malformed: list[str] = []
+        for city, body in fetched_bodies:
+            if body is None:
+                continue
+            digest: str = self.digest(body, windows)
+            entry = self.entries.get(city)
+            if entry is not None and entry[0] == digest:
+                reused[city] = entry[1]
+                continue
+            # NOTE: a malformed body fails only its city, like a failed
+            # fetch; its digest is not stored, so it is parsed again
+            # on the next run
+            try:
+                changed.append((city, loads(body)))
+            except ValueError:
+                malformed.append(city)
+                continue
+            digests[city] = digest
+        log_failed_cities(malformed, stage='fetching')
+        self.stats.recomputed += len(changed)
+        self.stats.reused += len(reused)
+        return changed, reused, digests
+
+    def update(
+        self,
+        analyses: dict[str, CityAnalysis],
+        digests: dict[str, str],
+    ) -> None:
+        """
+        Сохраняет новые результаты анализа измененных городов.
+        """
+        for city, analysis in analyses.items():
+            self.entries[city] = (digests[city], analysis)
+
+    def prune(self, cities: Iterable[str]) -> None:
+        """
+        Удаляет города, которых больше нет в списке.
+        """
+        known = set(cities)
+        for city in [city for city in self.entries if city not in known]:
+            del self.entries[city]
+
+    def save(self) -> None:
+        """
+        Атомарно записывает индекс на диск.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path: str = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(
+                {
+                    city: (digest, analysis.to_json())
+                    for city, (digest, analysis) in self.entries.items()
+                },
+                file,
+            )
+        os.replace(tmp_path, self.path)
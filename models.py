@@ -0,0 +1,188 @@
+import os
+from array import array
+from math import isnan, nan
+from typing import Any, Iterable, Iterator
+
+from external.analyzer import (
+    OUTPUT_DAYS_KEY, OUTPUT_WINDOWS_KEY, dump_data, load_data)
+
+# NOTE: missing values inside the typed arrays
+NO_HOUR = -1
+NO_TEMPERATURE = nan
+
+
+class DaySeries:
+    """
+    Показатели одного окна анализа по дням в типизированных массивах.
+    Отсутствующий час хранится как NO_HOUR, отсутствующая средняя
+    температура — как NO_TEMPERATURE.
+    """
+    __slots__ = (
+        'hours_start', 'hours_end', 'hours_count', 'temperatures',
+        'dry_hours',
+    )
+    TYPECODES = {
+        'hours_start': 'b',
+        'hours_end': 'b',
+        'hours_count': 'H',
+        'temperatures': 'd',
+        'dry_hours': 'H',
+    }
+
+    def __init__(self) -> None:
+        for name in self.__slots__:
+            setattr(self, name, array(DaySeries.TYPECODES[name]))
+
+    def __len__(self) -> int:
+        return len(self.hours_count)
+
+    def __getstate__(self) -> tuple[int, bytes]:
+        # NOTE: one buffer instead of five pickled arrays for the queues
+        return len(self), b''.join(
+            getattr(self, name).tobytes() for name in self.__slots__
+        )
+
+    def __setstate__(self, state: tuple[int, bytes]) -> None:
+        days_amount, buffer = state
+        offset = 0
+        for name in self.__slots__:
+            series = array(DaySeries.TYPECODES[name])
+            size = days_amount * series.itemsize
+            series.frombytes(buffer[offset:offset + size])
+            setattr(self, name, series)
+            offset += size
+
+    def append(self, day: dict[str, Any]) -> None:
+        """
+        Добавляет день в формате DayInfo.to_json().
+        """
+        hour_start = day.get('hours_start')
+        hour_end = day.get('hours_end')
+        temperature = day.get('temp_avg')
+        self.hours_start.append(NO_HOUR if hour_start is None else hour_start)
+        self.hours_end.append(NO_HOUR if hour_end is None else hour_end)
+        self.hours_count.append(day.get('hours_count') or 0)
+        self.temperatures.append(
+            NO_TEMPERATURE if temperature is None else temperature
+        )
+        self.dry_hours.append(day.get('relevant_cond_hours') or 0)
+
+    def temperature(self, index: int) -> float | None:
+        temperature = self.temperatures[index]
+        return None if isnan(temperature) else temperature
+
+    def known_temperatures(self) -> Iterator[float]:
+        return (
+            temperature
+            for temperature in self.temperatures
+            if not isnan(temperature)
+        )
+
+    def day_json(self, index: int) -> dict[str, Any]:
+        """
+        День в формате DayInfo.to_json() (без даты).
+        """
+        hour_start = self.hours_start[index]
+        hour_end = self.hours_end[index]
+        return {
+            'hours_start': None if hour_start == NO_HOUR else hour_start,
+            'hours_end': None if hour_end == NO_HOUR else hour_end,
+            'hours_count': self.hours_count[index],
+            'temp_avg': self.temperature(index),
+            'relevant_cond_hours': self.dry_hours[index],
+        }
+
+
+class CityAnalysis:
+    """
+    Результат анализа прогноза одного города. Создается один раз на этапе
+    вычислений и без повторного разбора передается этапам расчета рейтинга
+    и формирования отчета (в том числе между процессами через очередь).
+    """
+    __slots__ = ('city', 'dates', 'days', 'windows')
+
+    def __init__(
+        self,
+        city: str,
+        dates: tuple[str | None, ...],
+        days: DaySeries,
+        windows: dict[str, DaySeries] | None = None,
+    ) -> None:
+        self.city = city
+        self.dates = dates
+        self.days = days
+        self.windows: dict[str, DaySeries] = windows or {}
+
+    @classmethod
+    def from_json(
+        cls,
+        city: str,
+        analysis: dict[str, Any],
+    ) -> 'CityAnalysis':
+        """
+        Создание из результата analyze_json (или analyze_stream,
+        analyze_batch).
+        """
+        days_data: list[dict[str, Any]] = analysis.get(OUTPUT_DAYS_KEY) or []
+        days = DaySeries()
+        windows: dict[str, DaySeries] = {}
+        for day in days_data:
+            days.append(day)
+            for name, window_day in day.get(OUTPUT_WINDOWS_KEY, {}).items():
+                windows.setdefault(name, DaySeries()).append(window_day)
+        return cls(
+            city,
+            tuple(day.get('date') for day in days_data),
+            days,
+            windows,
+        )
+
+    def series(self, window: str | None = None) -> DaySeries:
+        """
+        Показатели выбранного окна анализа (None — основное окно).
+        """
+        return self.days if window is None else self.windows[window]
+
+    def to_json(self) -> dict[str, Any]:
+        """
+        Обратное преобразование в формат analyze_json.
+        """
+        days_json: list[dict[str, Any]] = []
+        for index, date in enumerate(self.dates):
+            day: dict[str, Any] = {'date': date, **self.days.day_json(index)}
+            if self.windows:
+                day[OUTPUT_WINDOWS_KEY] = {
+                    name: series.day_json(index)
+                    for name, series in self.windows.items()
+                }
+            days_json.append(day)
+        return {OUTPUT_DAYS_KEY: days_json}
+
+
+def export_analyses(
+    analyses: Iterable[CityAnalysis],
+    directory: str,
+) -> None:
+    """
+    Сохраняет результаты анализа в файлы <город>.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for analysis in analyses:
+        dump_data(
+            analysis.to_json(),
+            os.path.join(directory, f'{analysis.city}.json'),
+        )
+
+
+def load_analyses(directory: str) -> dict[str, CityAnalysis]:
+    """
+    Загружает результаты анализа, сохраненные в файлы <город>.json.
+    """
+    analyses: dict[str, CityAnalysis] = {}
+    for file_name in os.listdir(directory):
+        city: str = file_name.removesuffix('.json')
+        analyses[city] = CityAnalysis.from_json(
+            city,
+            load_data(os.path.join(directory, file_name)),
+        )
+    return analyses
@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait)
+from dataclasses import dataclass
+from multiprocessing import Process, Queue, cpu_count
+from typing import Mapping
+
+from external.analyzer import AnalysisWindow
+from external.metrics import DEFAULT_SAMPLING_INTERVAL, METRICS
+from models import CityAnalysis
+from ranking import RankingEngine, ScoringFunction, product_score
+from tasks import (
+    STOP_SIGNAL, DataAnalyzingTask, DataCalculationTask, DataFetchingTask,
+    iter_calculation_results)
+
+DEFAULT_PIPELINE_QUEUE_SIZE = 64
+DEFAULT_PIPELINE_TOP_K = 3
+
+
+@dataclass
+class PipelineStats:
+    """
+    Итоги потокового выполнения.
+    """
+    fetched_amount: int = 0
+    failed_amount: int = 0
+    calculated_amount: int = 0
+    first_result_latency: float | None = None
+    total_latency: float = 0.0
+
+    def __str__(self) -> str:
+        first_result = (
+            f'{self.first_result_latency:.3f}s'
+            if self.first_result_latency is not None
+            else '-'
+        )
+        return (
+            f'fetched: {self.fetched_amount}, '
+            f'failed: {self.failed_amount}, '
+            f'calculated: {self.calculated_amount}, '
+            f'time to first result: {first_result}, '
+            f'total: {self.total_latency:.3f}s'
+        )
+
+
+class ForecastPipeline:
+    """
+    Потоковое выполнение этапов без барьеров между ними: города
+    по мере загрузки попадают в ограниченную очередь процессов
+    DataCalculationTask, а результаты сразу получают рейтинг; о смене
+    лидеров (top_k лучших городов) сообщается до окончания загрузки.
+    Заполненная очередь блокирует предыдущий этап (обратное давление),
+    завершение работы передается сигналом STOP_SIGNAL.
+    """
+
+    def __init__(
+        self,
+        cities: Mapping[str, str],
+        weather_api,
+        analyses: dict[str, CityAnalysis],
+        rates: dict[str, tuple[float, float, float]],
+        workers_amount: int | None = None,
+        queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+        windows: list[AnalysisWindow] | None = None,
+        rank_window: str | None = None,
+        scoring: ScoringFunction = product_score,
+        top_k: int = DEFAULT_PIPELINE_TOP_K,
+        metrics_interval: float = DEFAULT_SAMPLING_INTERVAL,
+    ) -> None:
+        """
+        Инициализация конвейера; analyses заполняется результатами
+        вычислений, rates — так же, как в DataAnalyzingTask.rate_data.
+        """
+        self.fetching_task = DataFetchingTask(cities, weather_api)
+        self.analyses = analyses
+        self.rates = rates
+        self.workers_amount: int = workers_amount or cpu_count()
+        self.queue_size = queue_size
+        self.windows = windows
+        self.analysing_task = DataAnalyzingTask(
+            analyses=(),
+            output_dict=rates,
+            window=rank_window,
+            scoring=scoring,
+        )
+        self.ranking = RankingEngine(top_k=top_k)
+        self.metrics_interval = metrics_interval
+        self.stats = PipelineStats()
+        self.stats_lock = threading.Lock()
+
+    def run(self) -> PipelineStats:
+        """
+        Запускает все этапы и дожидается последнего результата.
+        """
+        started: float = time.perf_counter()
+        input_queue: Queue = Queue(maxsize=self.queue_size)
+        output_queue: Queue = Queue(maxsize=self.queue_size)
+        processes: list[Process] = [
+            DataCalculationTask(
+                input_queue,
+                output_queue=output_queue,
+                windows=self.windows,
+                collect_metrics=METRICS.enabled,
+            ) for _ in range(self.workers_amount)
+        ]
+        for process in processes:
+            process.start()
+        fetcher = threading.Thread(
+            target=self.fetch_cities,
+            args=(input_queue,),
+            daemon=True,
+        )
+        fetcher.start()
+
+        probes = {
+            'pipeline_input': input_queue.qsize,
+            'pipeline_output': output_queue.qsize,
+        }
+        with (
+            METRICS.span('pipeline'),
+            METRICS.sampling(probes, self.metrics_interval),
+        ):
+            try:
+                self.rate_results(output_queue, processes, started)
+            except BaseException:
+                for process in processes:
+                    process.terminate()
+                raise
+            for process in processes:
+                process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError('A calculation process exited abnormally.')
+        fetcher.join()
+        self.stats.total_latency = time.perf_counter() - started
+        return self.stats
+
+    def rate_results(
+        self,
+        output_queue: Queue,
+        processes: list[Process],
+        started: float,
+    ) -> None:
+        """
+        Рассчитывает рейтинг результатов по мере их поступления.
+        """
+        for analysis in iter_calculation_results(output_queue, processes):
+            self.rate_city(analysis)
+            if self.stats.first_result_latency is None:
+                self.stats.first_result_latency = (
+                    time.perf_counter() - started
+                )
+                logging.info(
+                    f'First city rated: {analysis.city} after '
+                    f'{self.stats.first_result_latency:.3f}s.'
+                )
+
+    def fetch_cities(self, input_queue: Queue) -> None:
+        """
+        Загружает города в пуле потоков; каждый поток сам кладет результат
+        в очередь, поэтому медленный город не задерживает остальные.
+        В работе одновременно не больше chunk_size городов: следующий
+        город передается пулу, как только загружен любой из них.
+        """
+        try:
+            with ThreadPoolExecutor() as pool:
+                in_flight: set[Future] = set()
+                for city in self.fetching_task.cities:
+                    if len(in_flight) >= self.fetching_task.chunk_size:
+                        done, in_flight = wait(
+                            in_flight,
+                            return_when=FIRST_COMPLETED,
+                        )
+                        for future in done:
+                            future.result()
+                    in_flight.add(
+                        pool.submit(self.fetch_city, city, input_queue)
+                    )
+                for future in as_completed(in_flight):
+                    future.result()
+        finally:
+            for _ in range(self.workers_amount):
+                input_queue.put(STOP_SIGNAL)
+
+    def fetch_city(self, city: str, input_queue: Queue) -> None:
+        city_name, city_data = (
+            self.fetching_task.get_weather_data_for_one_city(city)
+        )
+        with self.stats_lock:
+            if city_data:
+                self.stats.fetched_amount += 1
+            else:
+                self.stats.failed_amount += 1
+        if city_data:
+            input_queue.put((city_name, city_data))
+
+    def rate_city(self, analysis: CityAnalysis) -> None:
+        """
+        Сохраняет результат для отчета и сразу рассчитывает рейтинг.
+        """
+        self.analyses[analysis.city] = analysis
+        rate = self.analysing_task.count_rate(analysis)
+        self.rates[analysis.city] = rate
+        if self.ranking.add(analysis.city, rate[-1]):
+            logging.info(
+                'Current leaders: {}.'.format(
+                    ', '.join(
+                        f'{city} ({score})'
+                        for city, score in self.ranking.top()
+                    )
+                )
+            )
+        self.stats.calculated_amount += 1
@@ -0,0 +1,150 @@
+import heapq
+import threading
+from functools import total_ordering
+from typing import Callable, Iterable
+
+ScoringFunction = Callable[[float, float], float]
+
+COMPETITION_RANKING = 'competition'
+DENSE_RANKING = 'dense'
+RANKING_METHODS = (COMPETITION_RANKING, DENSE_RANKING)
+
+
+def product_score(avg_temperature: float, avg_dry_hours: float) -> float:
+    """
+    Исходный коэффициент: средняя температура, умноженная на среднее
+    количество часов без осадков.
+    """
+    return round(avg_temperature * avg_dry_hours)
+
+
+def temperature_score(avg_temperature: float, avg_dry_hours: float) -> float:
+    return avg_temperature
+
+
+def dry_hours_score(avg_temperature: float, avg_dry_hours: float) -> float:
+    return avg_dry_hours
+
+
+SCORING_FUNCTIONS: dict[str, ScoringFunction] = {
+    'product': product_score,
+    'temperature': temperature_score,
+    'dry-hours': dry_hours_score,
+}
+DEFAULT_SCORING = 'product'
+
+
+@total_ordering
+class ReversedName:
+    """
+    Название города с обратным порядком сравнения: в куче лучших
+    городов при равном коэффициенте худшим считается город,
+    который в отчете стоит ниже (с большим названием).
+    """
+    __slots__ = ('city',)
+
+    def __init__(self, city: str) -> None:
+        self.city = city
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ReversedName) and self.city == other.city
+
+    def __lt__(self, other: 'ReversedName') -> bool:
+        return self.city > other.city
+
+
+class RankingEngine:
+    """
+    Места городов по коэффициенту (чем больше, тем лучше).
+    Места считаются одной сортировкой: при COMPETITION_RANKING города
+    с равным коэффициентом делят место, а следующее место пропускается
+    (1, 1, 3), при DENSE_RANKING — не пропускается (1, 1, 2).
+    Если задан top_k, по мере добавления поддерживается куча из top_k
+    лучших городов, поэтому лидеров можно узнать до получения всех
+    результатов; при равных коэффициентах в нее попадают те же города,
+    что и в начало полного рейтинга (по названию). Методы можно вызывать
+    из разных потоков.
+    """
+
+    def __init__(
+        self,
+        method: str = COMPETITION_RANKING,
+        top_k: int | None = None,
+    ) -> None:
+        if method not in RANKING_METHODS:
+            raise ValueError(f'Unknown ranking method: {method}.')
+        self.method = method
+        self.top_k = top_k
+        self.scores: dict[str, float] = {}
+        self.best_cities: list[tuple[float, ReversedName]] = []
+        self.lock = threading.Lock()
+
+    def add(self, city: str, score: float) -> bool:
+        """
+        Добавляет коэффициент города.
+        :return: изменился ли список top_k лучших городов
+        """
+        with self.lock:
+            if city in self.scores:
+                raise ValueError(f'City is already ranked: {city}.')
+            self.scores[city] = score
+            if not self.top_k:
+                return False
+            # NOTE: min-heap, the worst of the best cities is on top
+            entry = (score, ReversedName(city))
+            if len(self.best_cities) < self.top_k:
+                heapq.heappush(self.best_cities, entry)
+                return True
+            if entry > self.best_cities[0]:
+                heapq.heapreplace(self.best_cities, entry)
+                return True
+            return False
+
+    def add_many(self, scores: Iterable[tuple[str, float]]) -> None:
+        for city, score in scores:
+            self.add(city, score)
+
+    def top(self) -> list[tuple[str, float]]:
+        """
+        Текущие top_k лучших городов, начиная с лучшего.
+        """
+        with self.lock:
+            return [
+                (name.city, score)
+                for score, name in sorted(self.best_cities, reverse=True)
+            ]
+
+    def ranks(self) -> dict[str, int]:
+        """
+        Места всех добавленных городов.
+        """
+        with self.lock:
+            ordered: list[tuple[str, float]] = sorted(
+                self.scores.items(),
+                key=lambda item: (-item[1], item[0]),
+            )
+        ranks: dict[str, int] = {}
+        rank: int = 0
+        previous_score: float | None = None
+        for position, (city, score) in enumerate(ordered, 1):
+            if score != previous_score:
+                rank = position if self.method == COMPETITION_RANKING else (
+                    rank + 1
+                )
+                previous_score = score
+            ranks[city] = rank
+        return ranks
+
+    def best(self) -> list[str]:
+        """
+        Города с наибольшим коэффициентом (первое место).
+        """
+        with self.lock:
+            if not self.scores:
+                return []
+            best_score: float = max(self.scores.values())
+            return sorted(
+                city
+                for city, score in self.scores.items()
+                if score == best_score
+            )
@@ -0,0 +1,538 @@
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Mapping
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from calculation_pool import CalculationPool
+from catalogue import CityCatalogue, UnknownCityError
+from external.analyzer import AnalysisWindow
+from external.cache import DEFAULT_CACHE_DIR, ResponseCache
+from external.client import YandexWeatherAPI
+from forecasting import (
+    DEFAULT_REPORT_FORMATS, calculate_incrementally, check_analysis_windows)
+from history import DEFAULT_HISTORY_PATH, HistoryStore
+from incremental import DEFAULT_INDEX_PATH, AnalysisIndex, IncrementalStats
+from models import CityAnalysis
+from pipeline import DEFAULT_PIPELINE_TOP_K
+from ranking import (
+    COMPETITION_RANKING, DEFAULT_SCORING, RANKING_METHODS, SCORING_FUNCTIONS)
+from tasks import DataAggregationTask, DataAnalyzingTask, DataFetchingTask
+from utils import (
+    CITIES, CITIES_NAMES_TRANSLATION, REPORT_FILE_CLASSES,
+    create_report_files, excel_report_table_settings)
+
+DEFAULT_REFRESH_INTERVAL = 10 * 60
+DEFAULT_SERVICE_HOST = '127.0.0.1'
+DEFAULT_SERVICE_PORT = 8080
+DEFAULT_REPORTS_DIR = 'service_reports'
+REPORT_CONTENT_TYPES = {
+    'xlsx': (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ),
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+REPORT_PATH_RE = re.compile(r'/report\.(\w+)')
+CITY_PATH_RE = re.compile(r'/cities/([^/]+)')
+
+
+@dataclass(frozen=True)
+class ForecastSnapshot:
+    """
+    Результаты одного цикла обновления. Снимок не изменяется после
+    создания: цикл обновления готовит новый снимок и подменяет ссылку
+    на него, поэтому читатели не блокируют обновление и не видят
+    частично обновленных данных.
+    """
+    cycle: int
+    updated_at: str
+    analyses: dict[str, CityAnalysis]
+    cities: dict[str, dict[str, Any]]
+    ranking: list[dict[str, Any]]
+    best: list[str]
+    reports: dict[str, str]
+
+    @classmethod
+    def create(
+        cls,
+        cycle: int,
+        analyses: dict[str, CityAnalysis],
+        rates: dict[str, tuple[float, float, float]],
+        ranks: dict[str, int],
+        best: list[str],
+        reports: dict[str, str],
+        city_names: Mapping[str, str] = CITIES_NAMES_TRANSLATION,
+    ) -> 'ForecastSnapshot':
+        cities: dict[str, dict[str, Any]] = {
+            city: {
+                'city': city,
+                'name': city_names.get(city, city),
+                'rank': rank,
+                'score': rates[city][2],
+                'avg_temperature': rates[city][0],
+                'avg_dry_hours': rates[city][1],
+            }
+            for city, rank in ranks.items()
+        }
+        return cls(
+            cycle=cycle,
+            updated_at=datetime.now(timezone.utc).isoformat(
+                timespec='seconds'
+            ),
+            analyses=analyses,
+            cities=cities,
+            ranking=sorted(
+                cities.values(),
+                key=lambda city: (city['rank'], city['city']),
+            ),
+            best=best,
+            reports=reports,
+        )
+
+
+class ForecastService:
+    """
+    Сервис, периодически обновляющий прогнозы. Пул потоков загрузки,
+    пул процессов вычислений, кэш ответов и индекс анализа сохраняются
+    между циклами, поэтому каждый цикл заново анализирует только
+    изменившиеся прогнозы. Последние результаты доступны в snapshot.
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_REFRESH_INTERVAL,
+        report_formats: tuple[str, ...] = DEFAULT_REPORT_FORMATS,
+        reports_dir: str = DEFAULT_REPORTS_DIR,
+        scoring: str = DEFAULT_SCORING,
+        rank_method: str = COMPETITION_RANKING,
+        windows: list[AnalysisWindow] | None = None,
+        rank_window: str | None = None,
+        calculation_pool: CalculationPool | None = None,
+        response_cache: ResponseCache | None = None,
+        analysis_index: AnalysisIndex | None = None,
+        fetch_workers: int | None = None,
+        cities: Mapping[str, str] | None = None,
+        history_store: HistoryStore | None = None,
+    ) -> None:
+        """
+        cities — города (код -> URL), по умолчанию CITIES;
+        history_store — хранилище, в которое добавляется каждый цикл.
+        """
+        check_analysis_windows(windows, rank_window, False, False)
+        self.cities: Mapping[str, str] = CITIES if cities is None else cities
+        self.city_names: Mapping[str, str] = getattr(
+            self.cities,
+            'names',
+            CITIES_NAMES_TRANSLATION,
+        )
+        self.interval = interval
+        self.report_formats = report_formats
+        self.reports_dir = reports_dir
+        self.scoring = scoring
+        self.rank_method = rank_method
+        self.windows = windows
+        self.rank_window = rank_window
+        self.calculation_pool: CalculationPool = (
+            calculation_pool or CalculationPool(windows=windows)
+        )
+        self.response_cache = response_cache
+        self.analysis_index: AnalysisIndex = analysis_index or AnalysisIndex()
+        self.history_store = history_store
+        self.fetch_executor = ThreadPoolExecutor(fetch_workers)
+        self.snapshot: ForecastSnapshot | None = None
+        self.last_error: str | None = None
+        self.stop_event = threading.Event()
+        os.makedirs(reports_dir, exist_ok=True)
+        YandexWeatherAPI.set_cache(response_cache)
+
+    def refresh(self) -> ForecastSnapshot | None:
+        """
+        Один цикл: загрузка, вычисления для изменившихся городов,
+        рейтинг и отчеты. Если не загружен ни один город, остается
+        предыдущий снимок.
+        """
+        started: float = time.perf_counter()
+        self.analysis_index.stats = IncrementalStats()
+        fetching_task = DataFetchingTask(
+            cities=self.cities,
+            weather_api=YandexWeatherAPI,
+            raw_bodies=True,
+            executor=self.fetch_executor,
+        )
+        fetched_bodies = fetching_task.get_weather_data()
+        logging.info(f'Fetch outcomes: {fetching_task.outcome_summary()}.')
+        if self.response_cache is not None:
+            self.response_cache.save()
+        if not any(body for _, body in fetched_bodies):
+            logging.warning('No forecasts loaded, keeping previous results.')
+            return self.snapshot
+
+        analyses: dict[str, CityAnalysis] = calculate_incrementally(
+            fetched_bodies,
+            self.analysis_index,
+            use_subprocess=False,
+            batch_analysis=False,
+            windows=self.windows,
+            calculation_pool=self.calculation_pool,
+        )
+        rates: dict[str, tuple[float, float, float]] = {}
+        DataAnalyzingTask(
+            analyses=analyses.values(),
+            output_dict=rates,
+            window=self.rank_window,
+            scoring=SCORING_FUNCTIONS[self.scoring],
+        ).rate_data()
+
+        cycle: int = self.snapshot.cycle + 1 if self.snapshot else 1
+        base_path: str = os.path.join(self.reports_dir, f'results-{cycle}')
+        aggregation_task = DataAggregationTask(
+            analyses=analyses.values(),
+            dict_with_rates=rates,
+            report_files=create_report_files(
+                base_path,
+                self.report_formats,
+                excel_report_table_settings,
+            ),
+            window=self.rank_window,
+            rank_method=self.rank_method,
+            city_names=self.city_names,
+        )
+        best: list[str] = aggregation_task.aggregate_data()
+        if self.history_store is not None:
+            self.history_store.record_run(analyses.values())
+        # NOTE: a plain reference swap, readers keep the snapshot they got
+        self.snapshot = ForecastSnapshot.create(
+            cycle,
+            analyses,
+            rates,
+            aggregation_task.ranks,
+            best,
+            {
+                report_format: f'{base_path}.{report_format}'
+                for report_format in self.report_formats
+            },
+            self.city_names,
+        )
+        self.remove_old_reports(cycle)
+        logging.info(
+            f'Refresh cycle {cycle} completed in '
+            f'{time.perf_counter() - started:.3f}s, '
+            f'cities: {len(analyses)}.'
+        )
+        return self.snapshot
+
+    def remove_old_reports(self, cycle: int) -> None:
+        """
+        Удаляет отчеты старше предыдущего цикла: отчеты предыдущего
+        цикла могут еще скачиваться по полученному ранее снимку.
+        """
+        for file_name in os.listdir(self.reports_dir):
+            match = re.fullmatch(r'results-(\d+)\.\w+', file_name)
+            if match is not None and int(match.group(1)) < cycle - 1:
+                os.remove(os.path.join(self.reports_dir, file_name))
+
+    def run_forever(self) -> None:
+        """
+        Обновление по расписанию до вызова stop(); ошибка цикла
+        не останавливает сервис, последний снимок сохраняется.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as ex:
+                logging.exception('Refresh cycle failed.')
+                self.last_error = str(ex)
+            self.stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def close(self) -> None:
+        self.stop()
+        self.fetch_executor.shutdown()
+        self.calculation_pool.close()
+        if self.history_store is not None:
+            self.history_store.close()
+
+    def city_code(self, city: str) -> str:
+        """
+        Код города по коду или по названию (из каталога или перевода);
+        коды вида CITIES можно указывать в любом регистре.
+        """
+        if city in self.cities:
+            return city
+        if isinstance(self.cities, CityCatalogue):
+            try:
+                return self.cities.get_record_by_name(city).code
+            except UnknownCityError:
+                pass
+        else:
+            for code, name in self.city_names.items():
+                if name == city:
+                    return code
+        if city.upper() in self.cities:
+            return city.upper()
+        return city
+
+    def health(self) -> dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            'cycle': snapshot.cycle if snapshot else 0,
+            'updated_at': snapshot.updated_at if snapshot else None,
+            'cities': len(snapshot.cities) if snapshot else 0,
+            'last_error': self.last_error,
+            'open_circuits': YandexWeatherAPI.fetcher.open_circuits(),
+        }
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API сервиса:
+    GET /health — состояние обновления;
+    GET /top?k=N — первые N городов рейтинга;
+    GET /cities/<город> — место и показатели города по дням;
+    GET /report.<формат> — отчет последнего цикла.
+    """
+    protocol_version = 'HTTP/1.1'
+    service: ForecastService
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            self.send_json(self.service.health())
+            return
+        snapshot = self.service.snapshot
+        if snapshot is None:
+            self.send_json(
+                {'error': 'Forecasts are not loaded yet.'},
+                HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+            return
+        if url.path == '/top':
+            self.send_top(snapshot, parse_qs(url.query))
+            return
+        city_match = CITY_PATH_RE.fullmatch(url.path)
+        if city_match is not None:
+            self.send_city(snapshot, unquote(city_match.group(1)))
+            return
+        report_match = REPORT_PATH_RE.fullmatch(url.path)
+        if report_match is not None:
+            self.send_report(snapshot, report_match.group(1))
+            return
+        self.send_json({'error': 'Not found.'}, HTTPStatus.NOT_FOUND)
+
+    def send_top(
+        self,
+        snapshot: ForecastSnapshot,
+        query: dict[str, list[str]],
+    ) -> None:
+        try:
+            top_k = int(query.get('k', [DEFAULT_PIPELINE_TOP_K])[0])
+        except ValueError:
+            self.send_json(
+                {'error': 'k must be an integer.'},
+                HTTPStatus.BAD_REQUEST,
+            )
+            return
+        self.send_json(
+            {
+                'cycle': snapshot.cycle,
+                'updated_at': snapshot.updated_at,
+                'best': snapshot.best,
+                'cities': snapshot.ranking[:max(top_k, 0)],
+            }
+        )
+
+    def send_city(self, snapshot: ForecastSnapshot, city: str) -> None:
+        city = self.service.city_code(city)
+        analysis = snapshot.analyses.get(city)
+        if analysis is None:
+            self.send_json(
+                {'error': f'Unknown city: {city}.'},
+                HTTPStatus.NOT_FOUND,
+            )
+            return
+        self.send_json(
+            {
+                'cycle': snapshot.cycle,
+                'updated_at': snapshot.updated_at,
+                **snapshot.cities[city],
+                **analysis.to_json(),
+            }
+        )
+
+    def send_report(self, snapshot: ForecastSnapshot, format: str) -> None:
+        path = snapshot.reports.get(format)
+        if path is None:
+            self.send_json(
+                {'error': f'Report format is not generated: {format}.'},
+                HTTPStatus.NOT_FOUND,
+            )
+            return
+        # NOTE: the snapshot may be older than the previous cycle,
+        # its reports are already removed by remove_old_reports
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            self.send_json(
+                {'error': 'The report is outdated, request it again.'},
+                HTTPStatus.GONE,
+            )
+            return
+        with file:
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', REPORT_CONTENT_TYPES[format])
+            self.send_header(
+                'Content-Length',
+                str(os.fstat(file.fileno()).st_size),
+            )
+            self.send_header(
+                'Content-Disposition',
+                f'attachment; filename="results.{format}"',
+            )
+            self.end_headers()
+            shutil.copyfileobj(file, self.wfile)
+
+    def send_json(
+        self,
+        data: dict[str, Any],
+        status: HTTPStatus = HTTPStatus.OK,
+    ) -> None:
+        body: bytes = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(format, *args)
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def start_http_server(
+    service: ForecastService,
+    host: str = DEFAULT_SERVICE_HOST,
+    port: int = DEFAULT_SERVICE_PORT,
+) -> ServiceHTTPServer:
+    """
+    Запускает HTTP API в фоновом потоке.
+    """
+    handler = type(
+        'ForecastServiceRequestHandler',
+        (ServiceRequestHandler,),
+        {'service': service},
+    )
+    server = ServiceHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=DEFAULT_SERVICE_HOST, type=str)
+    parser.add_argument('--port', default=DEFAULT_SERVICE_PORT, type=int)
+    parser.add_argument(
+        '--interval',
+        default=DEFAULT_REFRESH_INTERVAL,
+        type=float,
+        help='seconds between refresh cycles',
+    )
+    parser.add_argument(
+        '--report-format',
+        action='append',
+        choices=tuple(REPORT_FILE_CLASSES),
+        help='report format served at /report.<format>, may be repeated',
+    )
+    parser.add_argument('--reports-dir', default=DEFAULT_REPORTS_DIR)
+    parser.add_argument(
+        '--scoring',
+        default=DEFAULT_SCORING,
+        choices=tuple(SCORING_FUNCTIONS),
+    )
+    parser.add_argument(
+        '--rank-method',
+        default=COMPETITION_RANKING,
+        choices=RANKING_METHODS,
+    )
+    parser.add_argument(
+        '--window',
+        action='append',
+        default=[],
+        type=AnalysisWindow.from_spec,
+    )
+    parser.add_argument('--rank-window', default=None, type=str)
+    parser.add_argument('--workers', default=None, type=int)
+    parser.add_argument('--fetch-workers', default=None, type=int)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, type=str)
+    parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, type=str)
+    parser.add_argument(
+        '--history',
+        action='store_true',
+        help='append the results of every cycle to the history database',
+    )
+    parser.add_argument(
+        '--history-path',
+        default=DEFAULT_HISTORY_PATH,
+        type=str,
+    )
+    parser.add_argument(
+        '--cities-file',
+        default=None,
+        type=str,
+        help='city catalogue (CSV or JSON lines), see forecasting.py',
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    forecast_service = ForecastService(
+        interval=args.interval,
+        report_formats=tuple(args.report_format or DEFAULT_REPORT_FORMATS),
+        reports_dir=args.reports_dir,
+        scoring=args.scoring,
+        rank_method=args.rank_method,
+        windows=args.window,
+        rank_window=args.rank_window,
+        calculation_pool=CalculationPool(
+            max_workers=args.workers,
+            windows=args.window,
+        ),
+        response_cache=(
+            None if args.no_cache else ResponseCache(directory=args.cache_dir)
+        ),
+        analysis_index=AnalysisIndex(args.index_path),
+        fetch_workers=args.fetch_workers,
+        cities=CityCatalogue(args.cities_file) if args.cities_file else None,
+        history_store=(
+            HistoryStore(args.history_path) if args.history else None
+        ),
+    )
+    http_server = start_http_server(forecast_service, args.host, args.port)
+    logging.info(f'Serving forecasts at http://{args.host}:{args.port}.')
+    signal.signal(signal.SIGTERM, lambda *_: forecast_service.stop())
+    try:
+        forecast_service.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.shutdown()
+        forecast_service.close()
@@ -0,0 +1,152 @@
+import heapq
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Any, Iterator
+
+from models import CityAnalysis, DaySeries
+
+# NOTE: a decoded forecast of one city, see benchmarks/decoding_benchmark
+FORECAST_SIZE_ESTIMATE = 128 * 1024
+# NOTE: the objects of one CityAnalysis apart from its arrays and dates
+ANALYSIS_OVERHEAD = 512
+SPILL_FILE_TEMPLATE = 'run-{:05}.pickle'
+
+SpillKey = tuple[Any, ...]
+
+
+def megabytes(size: int) -> str:
+    return f'{size / 1024 / 1024:.1f} MiB'
+
+
+def chunk_size_for_budget(memory_budget: int) -> int:
+    """
+    Число городов, разобранные прогнозы которых занимают не больше
+    половины бюджета памяти (вторая половина — результаты анализа).
+    """
+    return max(1, memory_budget // 2 // FORECAST_SIZE_ESTIMATE)
+
+
+def analysis_size(analysis: CityAnalysis) -> int:
+    """
+    Оценка памяти, которую занимает результат анализа города.
+    """
+    series: tuple[DaySeries, ...] = (
+        analysis.days,
+        *analysis.windows.values(),
+    )
+    return (
+        ANALYSIS_OVERHEAD
+        + sys.getsizeof(analysis.dates)
+        + sum(sys.getsizeof(date) for date in analysis.dates)
+        + sum(
+            sys.getsizeof(getattr(days, name))
+            for days in series
+            for name in DaySeries.__slots__
+        )
+    )
+
+
+@dataclass
+class SpillStats:
+    cities: int = 0
+    spilled_cities: int = 0
+    runs: int = 0
+    spilled_bytes: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f'cities: {self.cities}, spilled: {self.spilled_cities} '
+            f'in {self.runs} runs ({megabytes(self.spilled_bytes)})'
+        )
+
+
+class AnalysisSpill:
+    """
+    Результаты анализа городов в порядке отчета при ограниченной памяти.
+    Результаты накапливаются в памяти; когда их оценочный размер
+    превышает budget, они сортируются по ключу (место в рейтинге
+    и название города) и сбрасываются на диск отдельным файлом — серией
+    записей pickle (массивы DaySeries сохраняются одним буфером).
+    merged() сливает серии с оставшимися в памяти результатами,
+    читая из каждого файла по одной записи.
+    Файлы удаляются при закрытии.
+    """
+
+    def __init__(self, budget: int, directory: str | None = None) -> None:
+        self.budget = budget
+        self.directory: str = tempfile.mkdtemp(
+            prefix='forecast-spill-',
+            dir=directory,
+        )
+        self.buffer: list[tuple[SpillKey, CityAnalysis]] = []
+        self.buffer_size: int = 0
+        self.runs: list[str] = []
+        self.dates: set[str] = set()
+        self.stats = SpillStats()
+
+    def __enter__(self) -> 'AnalysisSpill':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add(self, analysis: CityAnalysis, key: SpillKey) -> None:
+        """
+        Добавляет результат анализа города; key — ключ сортировки.
+        """
+        self.buffer.append((key, analysis))
+        self.buffer_size += analysis_size(analysis)
+        self.dates.update(date for date in analysis.dates if date)
+        self.stats.cities += 1
+        if self.buffer_size > self.budget:
+            self.spill()
+
+    def spill(self) -> None:
+        """
+        Сбрасывает накопленные результаты на диск одной серией.
+        """
+        if not self.buffer:
+            return
+        self.buffer.sort(key=itemgetter(0))
+        path: str = os.path.join(
+            self.directory,
+            SPILL_FILE_TEMPLATE.format(len(self.runs)),
+        )
+        with open(path, 'wb') as file:
+            for record in self.buffer:
+                pickle.dump(record, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        self.stats.runs += 1
+        self.stats.spilled_cities += len(self.buffer)
+        self.stats.spilled_bytes += os.path.getsize(path)
+        self.buffer = []
+        self.buffer_size = 0
+
+    @staticmethod
+    def read_run(path: str) -> Iterator[tuple[SpillKey, CityAnalysis]]:
+        with open(path, 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    return
+
+    def merged(self) -> Iterator[CityAnalysis]:
+        """
+        Все результаты в порядке ключей; можно вызывать несколько раз.
+        """
+        self.buffer.sort(key=itemgetter(0))
+        for _, analysis in heapq.merge(
+            *(self.read_run(path) for path in self.runs),
+            self.buffer,
+            key=itemgetter(0),
+        ):
+            yield analysis
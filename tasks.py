@@ -1,16 +1,71 @@
 import json
+import logging
 import os
 import subprocess
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from concurrent.futures._base import Future
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
 from multiprocessing import Process, Queue
 from queue import Empty
 from statistics import mean
-from typing import Any
+from typing import (
+    TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping)
 
-import openpyxl
+from checkpoint import CheckpointLog
+from external.analyzer import AnalysisWindow, Forecast, analyze_json
+from external.metrics import METRICS, Metrics, MetricsSnapshot
+from external.resilience import (
+    STATUS_OK, FetchOutcome, classify, summarize_outcomes)
+from models import CityAnalysis, DaySeries
+from ranking import (
+    COMPETITION_RANKING, RankingEngine, ScoringFunction, product_score)
+from utils import CITIES_NAMES_TRANSLATION, ReportFile, ReportRecord
 
-from utils import CITIES_NAMES_TRANSLATION, get_url_by_city_name
+if TYPE_CHECKING:
+    # NOTE: imported where used: asyncio is only needed by the async
+    # fetching and numpy only by shared memory batches
+    from external.async_client import AsyncYandexWeatherAPI
+    from external.shared_batch import SharedBatchSlice
+
+DEFAULT_FETCH_CONCURRENCY = 100
+DEFAULT_FETCH_CHUNK_SIZE = 1000
+STOP_SIGNAL = None
+
+
+def calculate_city(
+    city_name: str,
+    city_data: dict[str, Any] | Forecast,
+    windows: list[AnalysisWindow] | None = None,
+) -> CityAnalysis:
+    """
+    Анализ ответа API одного города (разобранного JSON или Forecast).
+    """
+    return CityAnalysis.from_json(city_name, analyze_json(city_data, windows))
+
+
+def log_failed_cities(cities: list[str], stage: str = 'calculation') -> None:
+    """
+    Сообщает о городах, загрузка или анализ которых завершились ошибкой.
+    """
+    if not cities:
+        return
+    logging.warning(
+        f'{stage.capitalize()} failed for: {", ".join(cities)}.'
+    )
+    METRICS.increment('failed_cities_total', len(cities), stage=stage)
+
+
+@dataclass
+class CalculationBatchResult:
+    """
+    Результат обработки пачки городов процессом DataCalculationTask.
+    """
+    worker: str
+    analyses: list[CityAnalysis]
+    failed: list[str]
+    seconds: float
+    metrics: MetricsSnapshot | None = None
 
 
 class DataFetchingTask:
@@ -18,12 +73,88 @@ class DataFetchingTask:
     Получение информации о погодных условиях для указанного списка городов.
     """
 
-    def __init__(self, cities: dict[str, str], weather_api) -> None:
+    def __init__(
+        self,
+        cities: Mapping[str, str],
+        weather_api,
+        raw_bodies: bool = False,
+        executor: ThreadPoolExecutor | None = None,
+        chunk_size: int = DEFAULT_FETCH_CHUNK_SIZE,
+        checkpoint: CheckpointLog | None = None,
+    ) -> None:
         """
         Инициализация объекта задачи для сбора информации о погодных условиях.
+        cities — словарь или каталог (CityCatalogue) код -> URL;
+        при raw_bodies вместо разобранного JSON возвращаются тела ответов;
+        executor — уже запущенный пул потоков (иначе он создается
+        на время загрузки); города передаются пулу частями по chunk_size.
+        Итог загрузки каждого города сохраняется в outcomes, данные
+        загруженных городов — в журнал checkpoint.
         """
         self.cities = cities
         self.weather_api = weather_api
+        self.raw_bodies = raw_bodies
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.outcomes: dict[str, FetchOutcome] = {}
+
+    def record_outcome(
+        self,
+        city: str,
+        started: float,
+        error: Exception | None = None,
+        data: Any = None,
+    ) -> None:
+        """
+        Сохраняет статус и время загрузки города (и данные в журнал).
+        """
+        status: str = STATUS_OK if error is None else classify(error)[0]
+        self.outcomes[city] = FetchOutcome(
+            status,
+            time.perf_counter() - started,
+            None if error is None else str(error),
+        )
+        METRICS.increment('fetch_outcomes_total', status=status)
+        if error is not None:
+            METRICS.increment('failed_cities_total', stage='fetching')
+        elif self.checkpoint is not None and data is not None:
+            self.checkpoint.append(city, data)
+
+    def outcome_summary(self) -> str:
+        """
+        Число городов по статусам и квантили времени загрузки.
+        """
+        return summarize_outcomes(self.outcomes.values())
+
+    def iter_city_chunks(self) -> Iterator[list[str]]:
+        cities: Iterator[str] = iter(self.cities)
+        while chunk := list(islice(cities, self.chunk_size)):
+            yield chunk
+
+    def map_cities(
+        self,
+        function: Callable[[str], tuple[str, dict[str, Any] | None]],
+    ) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+        """
+        Выполняет function для всех городов в пуле потоков; задачи
+        создаются по частям, а не сразу для всего каталога.
+        """
+        if self.executor is not None:
+            return self.map_chunks(self.executor, function)
+        with ThreadPoolExecutor() as pool:
+            return self.map_chunks(pool, function)
+
+    def map_chunks(
+        self,
+        pool: ThreadPoolExecutor,
+        function: Callable[[str], tuple[str, dict[str, Any] | None]],
+    ) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+        return tuple(
+            result
+            for chunk in self.iter_city_chunks()
+            for result in pool.map(function, chunk)
+        )
 
     def get_weather_data(
         self,
@@ -31,14 +162,7 @@ class DataFetchingTask:
         """
         Получение данных.
         """
-        with ThreadPoolExecutor() as pool:
-            all_weather_data = tuple(
-                pool.map(
-                    self.get_weather_data_for_one_city,
-                    self.cities,
-                )
-            )
-            return all_weather_data
+        return self.map_cities(self.get_weather_data_for_one_city)
 
     def get_weather_data_for_one_city(
         self,
@@ -47,12 +171,142 @@ class DataFetchingTask:
         """
         Получение информации о погодных условиях для одного города.
         """
-        try:
-            weather_data: dict[str, Any] = self.weather_api.get_forecasting(
-                url=get_url_by_city_name(city)
+        get_forecasting = (
+            self.weather_api.get_forecasting_body
+            if self.raw_bodies
+            else self.weather_api.get_forecasting
+        )
+        started: float = time.perf_counter()
+        with (
+            METRICS.span('fetch', 'city', city=city),
+            METRICS.active('fetch_in_flight'),
+        ):
+            try:
+                weather_data: dict[str, Any] = get_forecasting(
+                    url=self.cities[city]
+                )
+            except Exception as ex:
+                self.record_outcome(city, started, ex)
+                return city, None
+        self.record_outcome(city, started, data=weather_data)
+        return city, weather_data
+
+    def get_weather_analyses(
+        self,
+    ) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+        """
+        Получение уже проанализированных данных: ответ разбирается
+        потоково во время загрузки, документ целиком не хранится.
+        """
+        return self.map_cities(self.get_weather_analysis_for_one_city)
+
+    def get_weather_analysis_for_one_city(
+        self,
+        city: str
+    ) -> tuple[str, dict[str, Any] | None]:
+        """
+        Получение результата анализа погодных условий для одного города.
+        """
+        started: float = time.perf_counter()
+        with (
+            METRICS.span('fetch', 'city', city=city),
+            METRICS.active('fetch_in_flight'),
+        ):
+            try:
+                analysis: dict[str, Any] = (
+                    self.weather_api.get_forecasting_analysis(
+                        url=self.cities[city]
+                    )
+                )
+            except Exception as ex:
+                self.record_outcome(city, started, ex)
+                return city, None
+        self.record_outcome(city, started)
+        return city, analysis
+
+    def get_weather_data_async(
+        self,
+        concurrency: int = DEFAULT_FETCH_CONCURRENCY,
+    ) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+        """
+        Получение данных в цикле событий asyncio: не более concurrency
+        одновременных запросов, соединения с каждым хостом переиспользуются.
+        """
+        import asyncio
+
+        return asyncio.run(self.fetch_weather_data(concurrency))
+
+    async def fetch_weather_data(
+        self,
+        concurrency: int,
+    ) -> tuple[tuple[str, dict[str, Any] | None], ...]:
+        """
+        Запускает ограниченное число сопрограмм, которые по очереди забирают
+        города из общего итератора (без отдельной задачи на каждый город).
+        """
+        import asyncio
+
+        from external.async_client import AsyncYandexWeatherAPI
+
+        cities: list[str] = list(self.cities)
+        results: list[tuple[str, dict[str, Any] | None]] = [
+            (city, None) for city in cities
+        ]
+        indexes: Iterator[int] = iter(range(len(cities)))
+        async with AsyncYandexWeatherAPI(
+            connections_per_host=concurrency,
+            cache=getattr(self.weather_api, 'cache', None),
+        ) as weather_api:
+            await asyncio.gather(
+                *(
+                    self.fetch_worker(weather_api, cities, indexes, results)
+                    for _ in range(min(concurrency, len(cities)))
+                )
             )
-        except Exception:
-            return city, None
+        return tuple(results)
+
+    async def fetch_worker(
+        self,
+        weather_api: 'AsyncYandexWeatherAPI',
+        cities: list[str],
+        indexes: Iterator[int],
+        results: list[tuple[str, dict[str, Any] | None]],
+    ) -> None:
+        """
+        Получает данные для городов, пока не закончится общий итератор.
+        """
+        for index in indexes:
+            results[index] = await self.get_weather_data_for_one_city_async(
+                weather_api,
+                cities[index],
+            )
+
+    async def get_weather_data_for_one_city_async(
+        self,
+        weather_api: 'AsyncYandexWeatherAPI',
+        city: str,
+    ) -> tuple[str, dict[str, Any] | None]:
+        """
+        Асинхронное получение информации о погодных условиях для одного города.
+        """
+        get_forecasting = (
+            weather_api.get_forecasting_body
+            if self.raw_bodies
+            else weather_api.get_forecasting
+        )
+        started: float = time.perf_counter()
+        with (
+            METRICS.span('fetch', 'city', city=city),
+            METRICS.active('fetch_in_flight'),
+        ):
+            try:
+                weather_data: dict[str, Any] = await get_forecasting(
+                    url=self.cities[city]
+                )
+            except Exception as ex:
+                self.record_outcome(city, started, ex)
+                return city, None
+        self.record_outcome(city, started, data=weather_data)
         return city, weather_data
 
 
@@ -61,39 +315,232 @@ class DataCalculationTask(Process):
     Вычисление средней температуры и анализ информации о осадках за указанный
     период для всех городов.
     """
-    def __init__(self, input_queue: Queue, path: str) -> None:
+    def __init__(
+        self,
+        input_queue: Queue,
+        path: str = os.path.join('analyses_done', ''),
+        output_queue: 'Queue | None' = None,
+        use_subprocess: bool = False,
+        windows: list[AnalysisWindow] | None = None,
+        collect_metrics: bool = False,
+    ) -> None:
         """
         Инициализация объекта.
         Для работы с передаваемыми данными используется полученная очередь.
+        По умолчанию анализ выполняется внутри процесса, а результаты
+        (CityAnalysis) передаются через выходную очередь; режим совместимости
+        (use_subprocess) запускает external/analyzer.py для каждого города.
+        windows — дополнительные окна анализа, считаются за тот же проход.
+        При collect_metrics время анализа каждого города и загрузка
+        процесса передаются в выходную очередь перед STOP_SIGNAL.
         """
         super().__init__()
+        if not use_subprocess and output_queue is None:
+            raise ValueError(
+                'An output queue is required for in-process analysis.'
+            )
         self.input_queue = input_queue
+        self.output_queue = output_queue
         self.path = path
+        self.use_subprocess = use_subprocess
+        self.windows = windows or []
+        self.collect_metrics = collect_metrics
 
     def run(self):
         """
-        Получает данные из очереди, с помощью вызова внешнего скрипта
-        external/analyzer.py получает данные о погодных условиях и осадках.
+        Получает данные из очереди и вычисляет погодные параметры
+        для каждого города. Сообщение со списком городов (или описание
+        пачки в общей памяти SharedBatchSlice) обрабатывается как пачка
+        (CalculationBatchResult). Работа завершается по сигналу
+        STOP_SIGNAL, который затем передается в выходную очередь.
         """
+        metrics = Metrics(enabled=self.collect_metrics)
+        started: float = time.perf_counter()
         while True:
-            try:
-                new_city = self.input_queue.get(timeout=1)
-            except Empty:
+            new_city = self.input_queue.get()
+            if new_city is STOP_SIGNAL:
                 break
 
+            if not isinstance(new_city, tuple):
+                with metrics.span(
+                    'analyze_batch',
+                    'batch',
+                    cities=len(new_city),
+                ):
+                    self.output_queue.put(self.calculate_batch(new_city))
+                continue
+
             city_name, city_data = new_city
-            file_path = f'cities_analyses/{city_name}.json'
-            with open(file_path, 'w') as file:
-                json.dump(city_data, file)
+            with metrics.span('analyze', 'city', city=city_name):
+                if self.use_subprocess:
+                    self.analyze_in_subprocess(city_name, city_data)
+                else:
+                    self.output_queue.put(
+                        self.calculate_one(city_name, city_data)
+                    )
+        if self.output_queue is not None:
+            if metrics.enabled:
+                self.output_queue.put(self.worker_metrics(metrics, started))
+            self.output_queue.put(STOP_SIGNAL)
+
+    def calculate_one(
+        self,
+        city_name: str,
+        city_data: dict[str, Any],
+    ) -> CityAnalysis | CalculationBatchResult:
+        """
+        Анализ одного города; при ошибке в данных возвращается
+        результат пачки с городом в failed, процесс продолжает работу.
+        """
+        started: float = time.perf_counter()
+        try:
+            return calculate_city(city_name, city_data, self.windows)
+        except Exception:
+            return CalculationBatchResult(
+                worker=self.name,
+                analyses=[],
+                failed=[city_name],
+                seconds=time.perf_counter() - started,
+            )
 
-            subprocess.run([
-                'python',
-                './external/analyzer.py',
-                '-i',
-                file_path,
-                '-o',
-                f'{self.path}{os.path.basename(file_path)}'
-            ])
+    def calculate_batch(
+        self,
+        cities: 'list[tuple[str, dict[str, Any]]] | SharedBatchSlice',
+    ) -> CalculationBatchResult:
+        """
+        Анализирует пачку городов (одно сообщение очереди вместо
+        сообщения на каждый город); ошибка в данных одного города
+        не прерывает обработку остальных.
+        """
+        if not isinstance(cities, list):
+            return self.calculate_shared_batch(cities)
+        metrics = Metrics(enabled=self.collect_metrics)
+        analyses: list[CityAnalysis] = []
+        failed: list[str] = []
+        started: float = time.perf_counter()
+        for city_name, city_data in cities:
+            with metrics.span('analyze', 'city', city=city_name):
+                try:
+                    analyses.append(
+                        calculate_city(city_name, city_data, self.windows)
+                    )
+                except Exception:
+                    failed.append(city_name)
+        return CalculationBatchResult(
+            worker=self.name,
+            analyses=analyses,
+            failed=failed,
+            seconds=time.perf_counter() - started,
+            metrics=metrics.snapshot() if metrics.enabled else None,
+        )
+
+    def calculate_shared_batch(
+        self,
+        batch_slice: 'SharedBatchSlice',
+    ) -> CalculationBatchResult:
+        """
+        Анализирует города из общей памяти без копирования данных
+        в процесс; города анализируются вместе, поэтому ошибка отмечает
+        всю пачку как необработанную.
+        """
+        from external.shared_batch import analyze_shared_slice
+
+        analyses: list[CityAnalysis] = []
+        failed: list[str] = []
+        started: float = time.perf_counter()
+        try:
+            analyses = [
+                CityAnalysis.from_json(city_name, analysis)
+                for city_name, analysis in analyze_shared_slice(
+                    batch_slice
+                ).items()
+            ]
+        except Exception:
+            failed = list(batch_slice.cities)
+        return CalculationBatchResult(
+            worker=self.name,
+            analyses=analyses,
+            failed=failed,
+            seconds=time.perf_counter() - started,
+        )
+
+    def worker_metrics(
+        self,
+        metrics: Metrics,
+        started: float,
+    ) -> MetricsSnapshot:
+        """
+        Метрики процесса с долей времени, занятой анализом.
+        """
+        elapsed: float = time.perf_counter() - started
+        busy: float = sum(
+            seconds for _, seconds in metrics.span_totals().values()
+        )
+        metrics.set_gauge(
+            'worker_utilisation',
+            round(busy / elapsed, 4) if elapsed else 0.0,
+            worker=self.name,
+        )
+        return metrics.snapshot()
+
+    def analyze_in_subprocess(
+        self,
+        city_name: str,
+        city_data: dict[str, Any],
+    ) -> None:
+        """
+        С помощью вызова внешнего скрипта external/analyzer.py получает
+        данные о погодных условиях и осадках (через временные файлы).
+        """
+        file_path = f'cities_analyses/{city_name}.json'
+        with open(file_path, 'w') as file:
+            json.dump(city_data, file)
+
+        subprocess.run([
+            'python',
+            './external/analyzer.py',
+            '-i',
+            file_path,
+            '-o',
+            f'{self.path}{os.path.basename(file_path)}',
+            *(
+                argument
+                for window in self.windows
+                for argument in ('-w', window.to_spec())
+            ),
+        ])
+
+
+def iter_calculation_results(
+    output_queue: Queue,
+    processes: list[Process],
+) -> Iterator[CityAnalysis]:
+    """
+    Результаты DataCalculationTask по мере готовности. Чтение завершается,
+    когда каждый процесс прислал STOP_SIGNAL; если процесс аварийно
+    завершился без сигнала, ожидание прекращается после остановки всех
+    процессов. Метрики процессов объединяются с METRICS, города
+    с ошибкой анализа (failed результата пачки) записываются в лог.
+    """
+    stopped: int = 0
+    while stopped < len(processes):
+        try:
+            result = output_queue.get(timeout=1)
+        except Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        if result is STOP_SIGNAL:
+            stopped += 1
+            continue
+        if isinstance(result, MetricsSnapshot):
+            METRICS.merge(result)
+            continue
+        if isinstance(result, CalculationBatchResult):
+            log_failed_cities(result.failed)
+            yield from result.analyses
+            continue
+        yield result
 
 
 class DataAnalyzingTask:
@@ -102,64 +549,64 @@ class DataAnalyzingTask:
     без осадков за полный период.
     """
 
-    def __init__(self, file_dir, output_dict):
+    def __init__(
+        self,
+        analyses: Iterable[CityAnalysis],
+        output_dict: dict[str, tuple[float, float, float]],
+        window: str | None = None,
+        scoring: ScoringFunction = product_score,
+    ):
         """
         Инициализация задачи для расчета рейтинга города.
+        window — имя окна анализа, по которому строится рейтинг
+        (по умолчанию основное окно 9-19), scoring — функция коэффициента
+        от средней температуры и среднего количества часов без осадков.
+        Без analyses задача только рассчитывает рейтинг переданных
+        данных (count_rate).
         """
+        self.analyses = analyses
         self.output_dict = output_dict
-        self.file_paths = [
-            os.path.join(file_dir, file) for file in os.listdir(file_dir)
-        ]
+        self.window = window
+        self.scoring = scoring
 
     def rate_data(self):
         """
-        В словарь добавляется запись с коэффициентом для города.
+        В словарь добавляется запись с коэффициентом для каждого города.
         """
-        with ThreadPoolExecutor() as pool:
-            results = [
-                pool.submit(self.count_rate_for_city, file_path)
-                for file_path
-                in self.file_paths
-            ]
-            for future in as_completed(results):
-                file_path, avg_temp, avg_cond_hours, rating = future.result()
-                self.output_dict[file_path] = (
-                    avg_temp,
-                    avg_cond_hours,
-                    rating,
-                )
+        for analysis in self.analyses:
+            self.output_dict[analysis.city] = self.count_rate(analysis)
 
-    def count_rate_for_city(
+    def count_rate(
         self,
-        file_path: str,
-    ) -> tuple[str, float, float, int]:
-        """
-        Добавление записи в словарь для расчета рейтинга.
-        """
-        with open(file_path, 'r') as file:
-            days_data: list[dict[str, Any]] = json.load(file).get('days')
-            common_temp_avg: float = round(
-                mean(
-                    day.get('temp_avg')
-                    for day in days_data
-                    if day.get('temp_avg')
-                ),
-                ndigits=1,
-            )
-            common_relevant_cond_hours: float = round(
-                mean(
-                    day.get('relevant_cond_hours')
-                    for day in days_data
-                    if day.get('relevant_cond_hours')
-                ),
-                ndigits=1,
-            )
-            return (
-                file_path,
-                common_temp_avg,
-                common_relevant_cond_hours,
-                round(common_temp_avg * common_relevant_cond_hours),
-            )
+        analysis: CityAnalysis,
+    ) -> tuple[float, float, float]:
+        """
+        Расчет средних значений и коэффициента для результата анализа
+        одного города.
+        """
+        days: DaySeries = analysis.series(self.window)
+        common_temp_avg: float = self.nonzero_mean(
+            days.known_temperatures()
+        )
+        common_relevant_cond_hours: float = self.nonzero_mean(
+            days.dry_hours
+        )
+        return (
+            common_temp_avg,
+            common_relevant_cond_hours,
+            self.scoring(common_temp_avg, common_relevant_cond_hours),
+        )
+
+    @staticmethod
+    def nonzero_mean(values: Iterable[float]) -> float:
+        """
+        Среднее ненулевых значений, округленное до десятых
+        (0.0, если таких значений нет, например, все дни с осадками).
+        """
+        nonzero_values: list[float] = [value for value in values if value]
+        if not nonzero_values:
+            return 0.0
+        return round(mean(nonzero_values), ndigits=1)
 
 
 class DataAggregationTask:
@@ -168,113 +615,100 @@ class DataAggregationTask:
     """
     def __init__(
         self,
-        file_dir: str,
-        dict_with_rates: dict[str, tuple[float, float, int]],
-        report_path: str,
+        analyses: Iterable[CityAnalysis],
+        dict_with_rates: dict[str, tuple[float, float, float]],
+        report_files: list[ReportFile],
+        window: str | None = None,
+        rank_method: str = COMPETITION_RANKING,
+        city_names: Mapping[str, str] = CITIES_NAMES_TRANSLATION,
+        dates: list[str] | None = None,
     ) -> None:
         """
         Инициализация задачи для формирования отчета.
+        Одни и те же записи городов передаются во все отчеты report_files;
+        rank_method — способ нумерации мест при равных коэффициентах;
+        city_names — названия городов для отчета по кодам.
+        С dates (столбцы дат отчета) analyses уже упорядочены по месту
+        и названию города, и записи пишутся по мере получения, без
+        накопления в results_for_report.
         """
-        self.excel_file_path: str = report_path
-        self.file_paths: list[str] = [
-            os.path.join(file_dir, file) for file in os.listdir(file_dir)
-        ]
-        self.dict_with_rates: dict[str, tuple[float, float, int]] = (
+        self.analyses = analyses
+        self.city_names = city_names
+        self.dates = dates
+        self.report_files: list[ReportFile] = report_files
+        self.window: str | None = window
+        self.dict_with_rates: dict[str, tuple[float, float, float]] = (
             dict_with_rates
         )
-        self.rating_indexes: list[int] = sorted(
-            [
-                rating
-                for _, (_, _, rating)
-                in self.dict_with_rates.items()
-            ],
-            reverse=True,
+        self.ranking = RankingEngine(rank_method)
+        self.ranking.add_many(
+            (city, rating)
+            for city, (_, _, rating) in self.dict_with_rates.items()
         )
-        self.results_for_report: \
-            list[tuple[tuple[float | str | Any | None, ...], ...]] = []
-        self.answer: list[str] = []
+        self.ranks: dict[str, int] = {}
+        self.results_for_report: list[ReportRecord] = []
 
     def aggregate_data(self) -> list[str]:
         """
-        Агрегация и запись полученных данных в файл отчета.
+        Агрегация и запись полученных данных в файлы отчета.
+        :return: названия городов, наиболее благоприятных для посещения
         """
-        with ThreadPoolExecutor() as pool:
-            results: list[Future] = [
-                pool.submit(self.get_data_tuple_for_city, file_path)
-                for file_path
-                in self.file_paths
-            ]
-            for future in as_completed(results):
-                self.results_for_report.append(future.result())
-        self.write_report(self.excel_file_path, self.results_for_report)
-        return self.answer
-
-    def get_data_tuple_for_city(
-        self,
-        file_path: str
-    ) -> tuple[tuple[float | str | Any | None, ...], ...]:
-        """
-        Получение данных о погодных условиях для одного города.
-        """
-        with open(file_path, 'r') as file:
-            file_data: list[dict[str, Any]] = json.load(file).get('days')
-            avg_temp, avg_days, rating_coeff = self.dict_with_rates[
-                file_path
-            ]
-            translated_name: str = CITIES_NAMES_TRANSLATION.get(
-                city_name := file.name.removeprefix(
-                    os.path.join('analyses_done', '')
-                ).removesuffix('.json'),
-                city_name,
-            )
-            rating_value: int = self.rating_indexes.index(rating_coeff)
-            self.check_city_best_for_travel(rating_coeff, translated_name)
-            return (
-                (
-                    translated_name,
-                    'Температура, среднее',
-                    *(day.get('temp_avg') for day in file_data),
-                    avg_temp,
-                    rating_value + 1,
-                ),
-                (
-                    '',
-                    'Без осадков, часов',
-                    *(
-                        day.get('relevant_cond_hours')
-                        for day
-                        in file_data
-                    ),
-                    avg_days,
-                    '',
-                ),
+        self.ranks = self.ranking.ranks()
+        records: Iterator[ReportRecord] = (
+            self.get_data_tuple_for_city(analysis)
+            for analysis in self.analyses
+        )
+        if self.dates is None:
+            self.results_for_report = sorted(
+                records,
+                key=lambda record: (record.rating, record.city),
             )
+            records = iter(self.results_for_report)
+        with METRICS.span('report_write'):
+            self.write_report(self.report_files, records, self.dates)
+        return [
+            self.city_names.get(city, city)
+            for city in self.ranking.best()
+        ]
 
-    def check_city_best_for_travel(
-        self,
-        rating_coeff: int,
-        translated_name: str,
-    ) -> None:
+    def get_data_tuple_for_city(self, analysis: CityAnalysis) -> ReportRecord:
         """
-        Проверяет, является ли город благоприятным для посещения.
+        Получение данных о погодных условиях для одного города.
         """
-        if rating_coeff == max(self.rating_indexes):
-            self.answer.append(translated_name)
+        days: DaySeries = analysis.series(self.window)
+        avg_temp, avg_days, _ = self.dict_with_rates[analysis.city]
+        return ReportRecord(
+            city=self.city_names.get(analysis.city, analysis.city),
+            days={
+                date: (days.temperature(index), days.dry_hours[index])
+                for index, date in enumerate(analysis.dates)
+            },
+            avg_temperature=avg_temp,
+            avg_dry_hours=avg_days,
+            rating=self.ranks[analysis.city],
+        )
 
     @staticmethod
-    def write_report(excel_file_path: str, results: list[Any]) -> None:
+    def write_report(
+        report_files: list[ReportFile],
+        results: Iterable[ReportRecord],
+        dates: list[str] | None = None,
+    ) -> None:
         """
-        Записывает построчно данные в отчет excel.
+        Записывает данные во все отчеты за один проход; без dates
+        столбцы дат формируются из самих данных (списка results).
         """
-        workbook = openpyxl.load_workbook(excel_file_path)
-        sheet = workbook.active
-
-        final_results = (
-            result for data_result in results for result in data_result
-        )
-        for row_num, data_tuple in enumerate(final_results, 2):
-            for col_num, value in enumerate(data_tuple, 1):
-                sheet.cell(row=row_num, column=col_num).value = value
-
-        workbook.save(excel_file_path)
-        workbook.close()
+        if dates is None:
+            results = list(results)
+            dates = sorted(
+                {date for record in results for date in record.days if date}
+            )
+        for report_file in report_files:
+            report_file.open(dates)
+        try:
+            for record in results:
+                for report_file in report_files:
+                    report_file.write_record(record)
+        finally:
+            for report_file in report_files:
+                report_file.close()
@@ -0,0 +1,79 @@
+"""
+Анализ ответа API (external/analyzer.py) на examples/response.json.
+"""
+import io
+import json
+
+import pytest
+
+from external.analyzer import (
+    AnalysisWindow, DayInfo, Forecast, ForecastDay, analyze_json, load_data)
+from external.stream_parser import analyze_file, analyze_stream
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+WINDOWS = [
+    AnalysisWindow.from_spec('morning:6-11'),
+    AnalysisWindow.from_spec('evening:18-23:clear'),
+]
+
+
+@pytest.fixture(scope='module')
+def response():
+    return load_data(EXAMPLE_RESPONSE_PATH)
+
+
+def test_dict_and_typed_forecast_give_same_result(response):
+    assert analyze_json(response, WINDOWS) == analyze_json(
+        Forecast.from_json(response),
+        WINDOWS,
+    )
+
+
+def test_day_info_parse_matches_typed_day(response):
+    for day_data in response['forecasts']:
+        parsed = DayInfo(raw_data=day_data, windows=WINDOWS)
+        typed = DayInfo.from_forecast_day(
+            ForecastDay.from_json(day_data),
+            WINDOWS,
+        )
+        assert parsed.to_json() == typed.to_json()
+
+
+def test_stream_parser_matches_analyzer(response):
+    assert analyze_file(EXAMPLE_RESPONSE_PATH) == analyze_json(response)
+
+
+def test_stream_parser_matches_analyzer_from_midnight():
+    hours = [
+        {'hour': str(hour), 'temp': hour - 5, 'condition': 'clear'}
+        for hour in range(24)
+    ]
+    data = {
+        'forecasts': [
+            {'date': '2022-05-26', 'hours': hours},
+            {'date': '2022-05-27', 'hours': hours[:9]},
+            {'date': '2022-05-28', 'hours': hours[:1]},
+        ],
+    }
+    body = json.dumps(data).encode()
+
+    result = analyze_stream(io.BytesIO(body), chunk_size=7)
+
+    assert result == analyze_json(data)
+    assert result['days'][0]['hours_start'] == 9
+
+
+def test_default_window_as_extra_window(response):
+    result = analyze_json(response, [AnalysisWindow.from_spec('copy:9-19')])
+
+    for day in result['days']:
+        window = day.pop('windows')['copy']
+        assert window == {
+            key: value for key, value in day.items() if key != 'date'
+        }
+
+
+def test_compact_forecast_keeps_analysis(response):
+    compact = Forecast.from_json(response).to_json()
+
+    assert analyze_json(compact, WINDOWS) == analyze_json(response, WINDOWS)
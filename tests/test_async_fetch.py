@@ -0,0 +1,69 @@
+"""
+Асинхронная загрузка (DataFetchingTask.get_weather_data_async) через
+локальный сервер синтетических городов benchmarks/forecast_server.py.
+"""
+import pytest
+
+from benchmarks.forecast_server import start_synthetic_server
+from benchmarks.synthetic import city_name
+from external.client import YandexWeatherAPI
+from external.resilience import STATUS_OK, FetchPolicy
+from tasks import DataFetchingTask
+
+CITIES_AMOUNT = 40
+CONCURRENCY = 8
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server, url = start_synthetic_server(CITIES_AMOUNT, latency=0.01)
+    YandexWeatherAPI.set_cache(None)
+    YandexWeatherAPI.set_fetch_policy(FetchPolicy(retries=0))
+    yield url
+    server.shutdown()
+    YandexWeatherAPI.set_fetch_policy(None)
+
+
+@pytest.fixture
+def cities(base_url):
+    return {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(CITIES_AMOUNT)
+    }
+
+
+def test_async_fetch_matches_threaded_fetch(cities):
+    async_task = DataFetchingTask(cities, YandexWeatherAPI)
+    threaded_task = DataFetchingTask(cities, YandexWeatherAPI)
+
+    async_data = async_task.get_weather_data_async(CONCURRENCY)
+
+    assert [city for city, _ in async_data] == list(cities)
+    assert async_data == threaded_task.get_weather_data()
+    assert all(data for _, data in async_data)
+    assert {
+        outcome.status for outcome in async_task.outcomes.values()
+    } == {STATUS_OK}
+
+
+def test_async_fetch_raw_bodies(cities):
+    task = DataFetchingTask(cities, YandexWeatherAPI, raw_bodies=True)
+
+    bodies = task.get_weather_data_async(CONCURRENCY)
+
+    assert all(isinstance(body, bytes) and body for _, body in bodies)
+
+
+def test_async_fetch_failure_is_isolated(base_url, cities):
+    missing = f'{base_url}/city_{CITIES_AMOUNT}.json'
+    task = DataFetchingTask(
+        {**cities, 'MISSING': missing},
+        YandexWeatherAPI,
+    )
+
+    results = dict(task.get_weather_data_async(CONCURRENCY))
+
+    assert results.pop('MISSING') is None
+    assert all(results.values())
+    assert task.outcomes['MISSING'].status != STATUS_OK
+    assert len(results) == CITIES_AMOUNT
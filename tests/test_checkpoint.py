@@ -0,0 +1,95 @@
+"""
+Контрольные точки запуска (checkpoint.py).
+"""
+import pytest
+
+from checkpoint import CheckpointLog, RunCheckpoint, compact_forecast
+from external.analyzer import analyze_json, load_data
+from tasks import DataFetchingTask
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+SETTINGS = {'windows': [], 'rank_window': None, 'scoring': 'product'}
+
+
+@pytest.fixture(scope='module')
+def response():
+    return load_data(EXAMPLE_RESPONSE_PATH)
+
+
+class LocalForecastAPI:
+    """
+    Ответы без сети: пример ответа API и ответ без раздела прогнозов
+    для города MALFORMED.
+    """
+    response = None
+
+    @classmethod
+    def get_forecasting(cls, url: str):
+        return {'fact': {}} if url == 'MALFORMED' else cls.response
+
+
+def test_log_survives_reopen_and_torn_tail(tmp_path, response):
+    path = str(tmp_path / 'fetched.log')
+    log = CheckpointLog(path, compact=compact_forecast)
+    log.append('MOSCOW', response)
+    log.append('PARIS', response)
+    log.flush()
+    log.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x05\x00torn')
+
+    log = CheckpointLog(path, compact=compact_forecast)
+
+    assert len(log) == 2
+    assert analyze_json(log.get('PARIS')) == analyze_json(response)
+    log.append('LONDON', response)
+    log.flush()
+    assert set(dict(log.items(['LONDON', 'MOSCOW', 'ROME']))) == {
+        'LONDON',
+        'MOSCOW',
+    }
+    log.close()
+
+
+def test_malformed_response_does_not_stop_fetching(tmp_path, response):
+    LocalForecastAPI.response = response
+    log = CheckpointLog(str(tmp_path / 'fetched.log'), compact_forecast)
+    task = DataFetchingTask(
+        {'MOSCOW': 'MOSCOW', 'MALFORMED': 'MALFORMED'},
+        LocalForecastAPI,
+        checkpoint=log,
+    )
+
+    fetched = dict(task.get_weather_data())
+    log.flush()
+
+    assert fetched == {'MOSCOW': response, 'MALFORMED': {'fact': {}}}
+    assert 'MOSCOW' in log
+    assert 'MALFORMED' not in log
+    log.close()
+
+
+def test_resume_splits_done_and_remaining_cities(tmp_path, response):
+    directory = str(tmp_path / 'checkpoint')
+    cities = {'MOSCOW': 'url-1', 'PARIS': 'url-2', 'ROME': 'url-3'}
+    checkpoint = RunCheckpoint(SETTINGS, directory)
+    checkpoint.fetched.append('PARIS', response)
+    checkpoint.save_rates({'MOSCOW': (1.0, 2.0, 2.0)})
+    checkpoint.close()
+
+    resumed = RunCheckpoint(SETTINGS, directory, resume=True)
+    analyses, prefetched, remaining = resumed.split(cities)
+
+    assert analyses == {}
+    assert [city for city, _ in prefetched] == ['PARIS']
+    assert remaining == {'MOSCOW': 'url-1', 'ROME': 'url-3'}
+    assert resumed.load_rates(cities) == {'MOSCOW': (1.0, 2.0, 2.0)}
+    resumed.close()
+
+    restarted = RunCheckpoint(
+        {**SETTINGS, 'scoring': 'temperature'},
+        directory,
+        resume=True,
+    )
+    assert len(restarted.fetched) == len(restarted.rating) == 0
+    restarted.complete()
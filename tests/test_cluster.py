@@ -0,0 +1,151 @@
+"""
+Распределенный запуск (cluster.py): координатор и несколько
+исполнителей на одной машине, города отдает локальный сервер
+синтетических городов.
+"""
+import os
+import socket
+import time
+from multiprocessing import Process
+
+import pytest
+
+from benchmarks.forecast_server import start_synthetic_server
+from benchmarks.synthetic import city_name, load_template
+from cluster import (
+    AUTHKEY_ENV, ShardCoordinator, ShardManager, cluster_authkey, coordinate,
+    generate_authkey)
+from external.client import YandexWeatherAPI
+from forecasting import REPORT_BASE_PATH, forecast_weather
+
+CITIES_AMOUNT = 30
+SHARD_SIZE = 3
+LEASE_TIMEOUT = 1.0
+AUTHKEY = b'test-cluster-authkey'
+CONNECT_TIMEOUT = 10.0
+# NOTE: exit codes of crash_after_lease
+CRASHED_WITH_SHARD = 1
+NO_SHARD_LEFT = 3
+
+
+@pytest.fixture(scope='module')
+def cities():
+    # NOTE: the template is read relative to the repository root,
+    # the runs below change the working directory
+    load_template()
+    server, base_url = start_synthetic_server(CITIES_AMOUNT, latency=0.05)
+    YandexWeatherAPI.set_cache(None)
+    YandexWeatherAPI.set_fetch_policy(None)
+    yield {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(CITIES_AMOUNT)
+    }
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def single_host_report(cities, tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('single-host')
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        forecast_weather(cities=cities, report_formats=('csv',))
+    finally:
+        os.chdir(current_dir)
+    return (work_dir / f'{REPORT_BASE_PATH}.csv').read_text()
+
+
+def free_address() -> tuple[str, int]:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()
+
+
+def crash_after_lease(address: tuple[str, int]) -> None:
+    """
+    Исполнитель, который получает шард и аварийно завершается,
+    не вернув результат.
+    """
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    manager = ShardManager(address=address, authkey=AUTHKEY)
+    while True:
+        try:
+            manager.connect()
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                os._exit(2)
+            time.sleep(0.01)
+    task = manager.coordinator().get_shard('crashed-worker')
+    os._exit(NO_SHARD_LEFT if task is None else CRASHED_WITH_SHARD)
+
+
+def run_cluster(cities, work_dir, address, **options):
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        return coordinate(
+            cities,
+            address,
+            AUTHKEY,
+            shard_size=SHARD_SIZE,
+            lease_timeout=LEASE_TIMEOUT,
+            local_workers=2,
+            report_formats=('csv',),
+            **options,
+        )
+    finally:
+        os.chdir(current_dir)
+
+
+def test_local_workers_match_single_host(cities, single_host_report, tmp_path):
+    stats = run_cluster(cities, tmp_path, free_address())
+
+    assert stats.shards == CITIES_AMOUNT // SHARD_SIZE
+    assert stats.failed_cities == 0
+    assert (
+        tmp_path / f'{REPORT_BASE_PATH}.csv'
+    ).read_text() == single_host_report
+
+
+def test_shard_of_killed_worker_is_reassigned(
+    cities,
+    single_host_report,
+    tmp_path,
+):
+    address = free_address()
+    crashing_worker = Process(target=crash_after_lease, args=(address,))
+    crashing_worker.start()
+
+    stats = run_cluster(cities, tmp_path, address)
+    crashing_worker.join()
+
+    assert crashing_worker.exitcode == CRASHED_WITH_SHARD
+    assert stats.reassigned >= 1
+    assert (
+        tmp_path / f'{REPORT_BASE_PATH}.csv'
+    ).read_text() == single_host_report
+
+
+def test_coordinator_gives_up_without_live_workers():
+    coordinator = ShardCoordinator(
+        {city_name(number): '' for number in range(4)},
+        {},
+        shard_size=2,
+        lease_timeout=0.05,
+        idle_timeout=0.2,
+    )
+    coordinator.lease('lost-worker', coordinator.pending.popleft())
+
+    with pytest.raises(TimeoutError, match='unfinished shards: 0, 1'):
+        coordinator.wait()
+    assert coordinator.stats.reassigned == 1
+
+
+def test_no_public_default_authkey(monkeypatch):
+    monkeypatch.delenv(AUTHKEY_ENV, raising=False)
+    assert cluster_authkey() is None
+    assert generate_authkey() != generate_authkey()
+
+    monkeypatch.setenv(AUTHKEY_ENV, 'secret')
+    assert cluster_authkey() == b'secret'
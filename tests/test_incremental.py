@@ -0,0 +1,23 @@
+"""
+Индекс инкрементального анализа (incremental.py).
+"""
+import json
+
+from external.analyzer import load_data
+from incremental import AnalysisIndex
+
+EXAMPLE_RESPONSE_PATH = 'examples/response.json'
+
+
+def test_malformed_body_fails_only_its_city(tmp_path, caplog):
+    body = json.dumps(load_data(EXAMPLE_RESPONSE_PATH)).encode()
+    index = AnalysisIndex(str(tmp_path / 'index.json'))
+
+    changed, reused, digests = index.split(
+        [('MOSCOW', body), ('MALFORMED', b'<html>'), ('FAILED', None)],
+    )
+
+    assert [city for city, _ in changed] == ['MOSCOW']
+    assert reused == {}
+    assert set(digests) == {'MOSCOW'}
+    assert 'Fetching failed for: MALFORMED.' in caplog.text
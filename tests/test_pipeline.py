@@ -0,0 +1,88 @@
+"""
+Потоковое выполнение этапов (ForecastPipeline) на локальном сервере
+синтетических городов.
+"""
+import pytest
+
+from benchmarks.forecast_server import start_synthetic_server
+from benchmarks.synthetic import city_name
+from external.client import YandexWeatherAPI
+from pipeline import ForecastPipeline
+from tasks import DataAnalyzingTask, DataFetchingTask, calculate_city
+
+CITIES_AMOUNT = 30
+MALFORMED_CITY = 'MALFORMED'
+
+
+class MalformedCityAPI(YandexWeatherAPI):
+    """
+    Ответ без раздела прогнозов для MALFORMED_CITY.
+    """
+
+    @staticmethod
+    def get_forecasting(url: str):
+        if url.endswith(MALFORMED_CITY):
+            return {'fact': {}}
+        return YandexWeatherAPI.get_forecasting(url)
+
+
+@pytest.fixture(scope='module')
+def cities():
+    server, base_url = start_synthetic_server(CITIES_AMOUNT, jitter=0.02)
+    YandexWeatherAPI.set_cache(None)
+    yield {
+        city_name(number): f'{base_url}/city_{number}.json'
+        for number in range(CITIES_AMOUNT)
+    }
+    server.shutdown()
+
+
+def phased_rates(cities):
+    rates = {}
+    DataAnalyzingTask(
+        analyses=[
+            calculate_city(city, data)
+            for city, data in DataFetchingTask(
+                cities,
+                YandexWeatherAPI,
+            ).get_weather_data()
+        ],
+        output_dict=rates,
+    ).rate_data()
+    return rates
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 1000])
+def test_pipeline_matches_phased_run(cities, chunk_size):
+    analyses, rates = {}, {}
+    pipeline = ForecastPipeline(
+        cities,
+        YandexWeatherAPI,
+        analyses,
+        rates,
+        workers_amount=2,
+        queue_size=4,
+    )
+    pipeline.fetching_task.chunk_size = chunk_size
+
+    stats = pipeline.run()
+
+    assert stats.calculated_amount == CITIES_AMOUNT
+    assert rates == phased_rates(cities)
+
+
+def test_malformed_city_does_not_stop_pipeline(cities, caplog):
+    analyses, rates = {}, {}
+    pipeline = ForecastPipeline(
+        {**cities, MALFORMED_CITY: f'http://127.0.0.1:1/{MALFORMED_CITY}'},
+        MalformedCityAPI,
+        analyses,
+        rates,
+        workers_amount=2,
+    )
+
+    stats = pipeline.run()
+
+    assert stats.calculated_amount == CITIES_AMOUNT
+    assert set(analyses) == set(cities)
+    assert f'Calculation failed for: {MALFORMED_CITY}.' in caplog.text
@@ -0,0 +1,61 @@
+"""
+Места и потоковый top-k RankingEngine.
+"""
+import random
+
+import pytest
+
+from ranking import COMPETITION_RANKING, DENSE_RANKING, RankingEngine
+
+
+def full_ranking_top(scores, top_k):
+    return sorted(scores, key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+def test_tie_at_top_k_boundary_keeps_first_city_by_name():
+    engine = RankingEngine(top_k=1)
+    engine.add('A', 5)
+    engine.add('B', 5)
+
+    assert engine.top() == [('A', 5)]
+
+
+def test_tie_at_top_k_boundary_replaces_larger_name():
+    engine = RankingEngine(top_k=2)
+    engine.add_many([('C', 7), ('D', 5), ('B', 5)])
+
+    assert engine.top() == [('C', 7), ('B', 5)]
+
+
+@pytest.mark.parametrize('top_k', [1, 2, 3, 5, 10])
+def test_streaming_top_matches_full_ranking(top_k):
+    generator = random.Random(top_k)
+    scores = [
+        (f'CITY_{number:02}', generator.choice([1, 2, 3, 4]))
+        for number in range(40)
+    ]
+    generator.shuffle(scores)
+    engine = RankingEngine(top_k=top_k)
+    engine.add_many(scores)
+
+    assert engine.top() == full_ranking_top(scores, top_k)
+    ranks = engine.ranks()
+    assert [city for city, _ in engine.top()] == sorted(
+        ranks,
+        key=lambda city: (ranks[city], city),
+    )[:top_k]
+
+
+@pytest.mark.parametrize(
+    'method, expected',
+    [
+        (COMPETITION_RANKING, {'A': 1, 'B': 1, 'C': 3, 'D': 4}),
+        (DENSE_RANKING, {'A': 1, 'B': 1, 'C': 2, 'D': 3}),
+    ],
+)
+def test_ranks_share_places_on_ties(method, expected):
+    engine = RankingEngine(method)
+    engine.add_many([('C', 3), ('A', 5), ('D', 1), ('B', 5)])
+
+    assert engine.ranks() == expected
+    assert engine.best() == ['A', 'B']
@@ -0,0 +1,51 @@
+"""
+Автоматический выключатель и проверки перед попыткой запроса
+в ResilientFetcher.
+"""
+import time
+
+import pytest
+
+from external.resilience import (
+    STATUS_CIRCUIT_OPEN, STATUS_TIMEOUT, CircuitBreaker, FetchError,
+    FetchPolicy, ResilientFetcher)
+
+URL = 'http://127.0.0.1:1/city.json'
+
+
+def open_breaker(fetcher: ResilientFetcher) -> CircuitBreaker:
+    breaker = fetcher.breaker(URL)
+    breaker.record(False)
+    assert breaker.is_open
+    return breaker
+
+
+@pytest.fixture
+def fetcher():
+    return ResilientFetcher(
+        FetchPolicy(breaker_threshold=1, breaker_cooldown=0.0)
+    )
+
+
+def test_expired_deadline_keeps_half_open_trial(fetcher):
+    breaker = open_breaker(fetcher)
+
+    with pytest.raises(FetchError) as error:
+        fetcher.before_attempt(URL, breaker, time.monotonic() - 1)
+
+    assert error.value.status == STATUS_TIMEOUT
+    assert breaker.allow()
+
+
+def test_half_open_breaker_lets_one_trial_through(fetcher):
+    breaker = open_breaker(fetcher)
+    deadline = time.monotonic() + 10
+
+    fetcher.before_attempt(URL, breaker, deadline)
+    with pytest.raises(FetchError) as error:
+        fetcher.before_attempt(URL, breaker, deadline)
+
+    assert error.value.status == STATUS_CIRCUIT_OPEN
+    breaker.record(True)
+    assert not breaker.is_open
+    assert breaker.allow()
@@ -0,0 +1,127 @@
+"""
+Сервис обновления прогнозов (service.py) на локальном сервере
+синтетических городов.
+"""
+import json
+import os
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+import pytest
+
+from benchmarks.forecast_server import (
+    ForecastRequestHandler, serve, start_synthetic_server)
+from benchmarks.synthetic import city_name
+from calculation_pool import CalculationPool
+from catalogue import CityCatalogue
+from external.client import YandexWeatherAPI
+from incremental import AnalysisIndex
+from service import ForecastService, start_http_server
+
+CITIES_AMOUNT = 5
+MALFORMED_CITY = 'MALFORMED'
+
+
+class MalformedForecastRequestHandler(ForecastRequestHandler):
+    """
+    Ответ 200 с телом, которое не является JSON.
+    """
+    payload = b'<html>Service is temporarily unavailable</html>'
+    etag = '"malformed"'
+
+
+@pytest.fixture(scope='module')
+def cities():
+    server, base_url = start_synthetic_server(CITIES_AMOUNT)
+    malformed_server, malformed_url = serve(
+        MalformedForecastRequestHandler,
+        '127.0.0.1',
+        0,
+    )
+    YandexWeatherAPI.set_cache(None)
+    YandexWeatherAPI.set_fetch_policy(None)
+    yield {
+        **{
+            city_name(number): f'{base_url}/city_{number}.json'
+            for number in range(CITIES_AMOUNT)
+        },
+        MALFORMED_CITY: f'{malformed_url}/{MALFORMED_CITY}.json',
+    }
+    server.shutdown()
+    malformed_server.shutdown()
+
+
+def create_service(tmp_path, cities):
+    return ForecastService(
+        report_formats=('csv',),
+        reports_dir=str(tmp_path / 'reports'),
+        calculation_pool=CalculationPool(max_workers=1),
+        analysis_index=AnalysisIndex(str(tmp_path / 'index.json')),
+        cities=cities,
+    )
+
+
+def get_json(url):
+    try:
+        with urlopen(url) as response:
+            return response.status, json.load(response)
+    except HTTPError as error:
+        return error.code, json.load(error)
+
+
+def test_malformed_city_does_not_stop_refresh(tmp_path, cities, caplog):
+    service = create_service(tmp_path, cities)
+    try:
+        first = service.refresh()
+        second = service.refresh()
+    finally:
+        service.close()
+
+    assert (first.cycle, second.cycle) == (1, 2)
+    assert set(second.analyses) == set(cities) - {MALFORMED_CITY}
+    assert f'Fetching failed for: {MALFORMED_CITY}.' in caplog.text
+
+
+def test_city_by_code_and_name(tmp_path, cities):
+    catalogue_path = tmp_path / 'cities.csv'
+    catalogue_path.write_text(
+        'code,url,name\n'
+        f'spb,{cities[city_name(0)]},Санкт-Петербург\n'
+        f'CITY_1,{cities[city_name(1)]},\n',
+        encoding='utf-8',
+    )
+    service = create_service(tmp_path, CityCatalogue(str(catalogue_path)))
+    server = start_http_server(service, port=0)
+    base_url = 'http://{}:{}'.format(*server.server_address[:2])
+    try:
+        service.refresh()
+        responses = {
+            path: get_json(f'{base_url}/cities/{path}')
+            for path in ('spb', quote('Санкт-Петербург'), 'city_1', 'msk')
+        }
+    finally:
+        server.shutdown()
+        service.close()
+
+    assert responses['spb'][0] == 200
+    assert responses['spb'][1]['city'] == 'spb'
+    assert responses[quote('Санкт-Петербург')][1]['city'] == 'spb'
+    assert responses['city_1'][1]['city'] == 'CITY_1'
+    assert responses['msk'][0] == 404
+
+
+def test_removed_report_is_gone(tmp_path, cities):
+    service = create_service(tmp_path, cities)
+    server = start_http_server(service, port=0)
+    base_url = 'http://{}:{}'.format(*server.server_address[:2])
+    try:
+        snapshot = service.refresh()
+        os.remove(snapshot.reports['csv'])
+        status, body = get_json(f'{base_url}/report.csv')
+    finally:
+        server.shutdown()
+        service.close()
+
+    assert status == 410
+    assert 'error' in body
@@ -1,21 +1,86 @@
+import abc
+import csv
+import json
 import os
 import shutil
-from typing import Any
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Any, Iterable, Mapping, NamedTuple, TextIO
+from urllib.parse import urlsplit
 
-import openpyxl
-import requests
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from catalogue import CityCatalogue, UnknownCityError
 
+DEFAULT_PREFLIGHT_TIMEOUT = 2.0
+DEFAULT_PORTS = {'http': 80, 'https': 443}
 
-def internet_connection_is_available() -> bool:
+
+def forecast_hosts(urls: Iterable[str]) -> list[tuple[str, int]]:
     """
-    Проверка подключения к интернету.
+    Адреса (хост, порт) серверов, с которых загружаются прогнозы.
     """
-    try:
-        requests.get('https://google.com')
-        return True
-    except Exception:
-        return False
+    hosts: dict[tuple[str, int], None] = {}
+    for url in urls:
+        parts = urlsplit(url)
+        hosts[
+            (
+                parts.hostname or '',
+                parts.port or DEFAULT_PORTS.get(parts.scheme, 80),
+            )
+        ] = None
+    return list(hosts)
+
+
+class ConnectivityPreflight:
+    """
+    Проверка доступности серверов прогнозов: одно TCP-подключение
+    к каждому хосту в фоновом потоке. Проверка запускается в начале
+    работы и выполняется одновременно с подготовкой; ожидание результата
+    (unreachable_hosts) занимает не больше timeout секунд с момента
+    запуска, даже если разрешение имени зависло.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        timeout: float = DEFAULT_PREFLIGHT_TIMEOUT,
+    ) -> None:
+        self.hosts: list[tuple[str, int]] = forecast_hosts(urls)
+        self.timeout = timeout
+        self.reachable: dict[tuple[str, int], bool] = {}
+        self.deadline: float | None = None
+        self.threads: list[threading.Thread] = [
+            threading.Thread(target=self.check, args=(host,), daemon=True)
+            for host in self.hosts
+        ]
+
+    def start(self) -> 'ConnectivityPreflight':
+        self.deadline = time.monotonic() + self.timeout
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def check(self, host: tuple[str, int]) -> None:
+        try:
+            with socket.create_connection(host, timeout=self.timeout):
+                self.reachable[host] = True
+        except OSError:
+            self.reachable[host] = False
+
+    def unreachable_hosts(self) -> list[str]:
+        """
+        Хосты, подключиться к которым не удалось (или не успели).
+        """
+        if self.deadline is None:
+            self.start()
+        for thread in self.threads:
+            thread.join(max(0.0, self.deadline - time.monotonic()))
+        return [
+            f'{host}:{port}'
+            for host, port in self.hosts
+            if not self.reachable.get((host, port))
+        ]
 
 
 CITIES = {
@@ -95,31 +160,21 @@ CITIES_NAMES_TRANSLATION: dict[str, str] = {
 
 
 excel_report_table_settings: dict[str, Any] = {
-    'bold_font': Font(bold=True),
-    'thin_border': Border(
-        left=Side(style='thin', color='325180'),
-        right=Side(style='thin', color='325180'),
-        top=Side(style='thin', color='325180'),
-        bottom=Side(style='thin', color='325180'),
-    ),
-    'center_alignment': Alignment(horizontal='center'),
-    'color_fill': PatternFill(
-        start_color='C7E4E2',
-        end_color='C1E4E7',
-        fill_type='solid',
-    ),
-    'sheet_title': 'Анализ погоды',
-    'sheet_names': {
-        'A1': 'Город/день',
-        'B1': '',
-        'C1': '26-05',
-        'D1': '27-05',
-        'E1': '28-05',
-        'F1': '29-05',
-        'G1': '30-05',
-        'H1': 'Среднее',
-        'I1': 'Рейтинг',
+    # NOTE: keyword arguments of openpyxl.styles classes
+    'header_font': {'bold': True},
+    'border_side': {'style': 'thin', 'color': '325180'},
+    'header_alignment': {'horizontal': 'center'},
+    'row_fill': {
+        'start_color': 'C7E4E2',
+        'end_color': 'C1E4E7',
+        'fill_type': 'solid',
     },
+    'sheet_title': 'Анализ погоды',
+    'leading_columns': ('Город/день', ''),
+    'trailing_columns': ('Среднее', 'Рейтинг'),
+    'temperature_row_title': 'Температура, среднее',
+    'dry_hours_row_title': 'Без осадков, часов',
+    'date_format': '%d-%m',
     'first_column_width': 20,
     'second_column_width': 25,
 }
@@ -128,60 +183,267 @@ MIN_MAJOR_PYTHON_VER = 3
 MIN_MINOR_PYTHON_VER = 9
 
 
-class ReportExcelTable:
+class ReportRecord(NamedTuple):
     """
-    Класс отчета о погодных условиях в формате Excel (.xlsx).
+    Данные одного города для отчета: значения по датам
+    (средняя температура, часы без осадков), средние и место в рейтинге.
     """
+    city: str
+    days: dict[str, tuple[float | None, int | None]]
+    avg_temperature: float
+    avg_dry_hours: float
+    rating: int
 
-    def __init__(
+    def to_rows(
         self,
-        file_path: str,
+        dates: list[str],
         settings: dict[str, Any],
-        records_amount: int,
-    ) -> None:
+    ) -> tuple[tuple[Any, ...], tuple[Any, ...]]:
         """
-        Получение настроек для отчета в формате Excel.
+        Две строки таблицы отчета; значения выравниваются по датам.
         """
-        self.records_amount: int = records_amount
+        return (
+            (
+                self.city,
+                settings.get('temperature_row_title'),
+                *(self.days.get(date, (None, None))[0] for date in dates),
+                self.avg_temperature,
+                self.rating,
+            ),
+            (
+                '',
+                settings.get('dry_hours_row_title'),
+                *(self.days.get(date, (None, None))[1] for date in dates),
+                self.avg_dry_hours,
+                '',
+            ),
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            'city': self.city,
+            'days': [
+                {
+                    'date': date,
+                    'temp_avg': temperature,
+                    'relevant_cond_hours': dry_hours,
+                }
+                for date, (temperature, dry_hours) in self.days.items()
+            ],
+            'temp_avg': self.avg_temperature,
+            'relevant_cond_hours': self.avg_dry_hours,
+            'rating': self.rating,
+        }
+
+
+class ReportFile(abc.ABC):
+    """
+    Базовый класс отчета: заголовок по датам из данных, затем записи
+    городов по одной, без хранения всего отчета в памяти.
+    """
+
+    def __init__(self, file_path: str, settings: dict[str, Any]) -> None:
         self.file_path: str = file_path
-        self.thin_border: Border | None = settings.get('thin_border')
-        self.bold_font: Font | None = settings.get('bold_font')
-        self.center_alignment: Alignment | None = settings.get(
-            'center_alignment'
+        self.settings: dict[str, Any] = settings
+        self.dates: list[str] = []
+
+    def __enter__(self) -> 'ReportFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def header(self) -> tuple[str, ...]:
+        date_format: str = self.settings.get('date_format', '%d-%m')
+        return (
+            *self.settings.get('leading_columns', ()),
+            *(
+                datetime.strptime(date, '%Y-%m-%d').strftime(date_format)
+                for date in self.dates
+            ),
+            *self.settings.get('trailing_columns', ()),
         )
-        self.title: Any = settings.get('sheet_title')
-        self.sheet_names: dict[str, Any] | Any = settings.get('sheet_names')
-        self.color_fill: PatternFill | None = settings.get('color_fill')
-        self.first_column_width: int | None = settings.get(
-            'first_column_width'
+
+    def open(self, dates: list[str]) -> None:
+        self.dates = dates
+
+    @abc.abstractmethod
+    def write_record(self, record: ReportRecord) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ReportExcelTable(ReportFile):
+    """
+    Класс отчета о погодных условиях в формате Excel (.xlsx).
+    Книга создается в режиме write-only: строки записываются и
+    оформляются общими именованными стилями за один проход.
+    openpyxl импортируется при открытии отчета, поэтому запуски
+    без отчета xlsx не тратят время на его загрузку.
+    """
+
+    HEADER_STYLE = 'report_header'
+    ROW_STYLE = 'report_row'
+    FILLED_ROW_STYLE = 'report_row_filled'
+
+    def __init__(self, file_path: str, settings: dict[str, Any]) -> None:
+        """
+        Получение настроек для отчета в формате Excel.
+        """
+        super().__init__(file_path, settings)
+        self.workbook: Any = None
+        self.sheet: Any = None
+        self.cell_class: Any = None
+
+    def create_named_styles(self) -> None:
+        from openpyxl.styles import (
+            Alignment, Border, Font, NamedStyle, PatternFill, Side)
+
+        side = Side(**self.settings.get('border_side', {}))
+        border = Border(left=side, right=side, top=side, bottom=side)
+        self.workbook.add_named_style(
+            NamedStyle(
+                name=self.HEADER_STYLE,
+                font=Font(**self.settings.get('header_font', {})),
+                alignment=Alignment(
+                    **self.settings.get('header_alignment', {})
+                ),
+                border=border,
+            )
         )
-        self.second_column_width: int | None = settings.get(
-            'second_column_width'
+        self.workbook.add_named_style(
+            NamedStyle(name=self.ROW_STYLE, border=border)
+        )
+        self.workbook.add_named_style(
+            NamedStyle(
+                name=self.FILLED_ROW_STYLE,
+                border=border,
+                fill=PatternFill(**self.settings.get('row_fill', {})),
+            )
         )
 
-    def create_and_setup_new_excel_file(self) -> None:
+    def open(self, dates: list[str]) -> None:
         """
-        Создает новый файл и делает базовую настройку.
+        Создает книгу, стили и строку заголовка.
         """
-        wb: openpyxl.Workbook = openpyxl.Workbook()
-        wb.active.title = self.title
-        sheet = wb[self.title]
-        for key, value in self.sheet_names.items():
-            sheet[key] = value
-            sheet[key].font = self.bold_font
-            sheet[key].alignment = self.center_alignment
-        sheet.column_dimensions['A'].width = self.first_column_width
-        sheet.column_dimensions['B'].width = self.second_column_width
-
-        for i in range(3, (self.records_amount + 1) * 2, 2):
-            for cell in (key[0] for key in self.sheet_names.keys()):
-                sheet[f'{cell}{i}'].fill = self.color_fill
-        for k in range(1, (self.records_amount + 1) * 2):
-            for cell in (key[0] for key in self.sheet_names.keys()):
-                sheet[f'{cell}{k}'].border = self.thin_border
-
-        wb.save(self.file_path)
-        wb.close()
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+
+        super().open(dates)
+        self.cell_class = WriteOnlyCell
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.create_named_styles()
+        self.sheet = self.workbook.create_sheet(
+            self.settings.get('sheet_title')
+        )
+        self.sheet.column_dimensions['A'].width = self.settings.get(
+            'first_column_width'
+        )
+        self.sheet.column_dimensions['B'].width = self.settings.get(
+            'second_column_width'
+        )
+        self.append_row(self.header(), self.HEADER_STYLE)
+
+    def append_row(self, values: tuple[Any, ...], style: str) -> None:
+        cells = []
+        for value in values:
+            cell = self.cell_class(self.sheet, value=value)
+            cell.style = style
+            cells.append(cell)
+        self.sheet.append(cells)
+
+    def write_record(self, record: ReportRecord) -> None:
+        temperature_row, dry_hours_row = record.to_rows(
+            self.dates,
+            self.settings,
+        )
+        self.append_row(temperature_row, self.ROW_STYLE)
+        self.append_row(dry_hours_row, self.FILLED_ROW_STYLE)
+
+    def close(self) -> None:
+        if self.workbook is not None:
+            self.workbook.save(self.file_path)
+            self.workbook.close()
+            self.workbook = None
+
+
+class ReportCsvFile(ReportFile):
+    """
+    Отчет в формате CSV с теми же строками, что и таблица Excel.
+    """
+
+    def __init__(self, file_path: str, settings: dict[str, Any]) -> None:
+        super().__init__(file_path, settings)
+        self.file: TextIO | None = None
+        self.writer: Any = None
+
+    def open(self, dates: list[str]) -> None:
+        super().open(dates)
+        self.file = open(self.file_path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header())
+
+    def write_record(self, record: ReportRecord) -> None:
+        self.writer.writerows(record.to_rows(self.dates, self.settings))
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ReportJsonLinesFile(ReportFile):
+    """
+    Отчет в формате JSON Lines: одна запись на город.
+    """
+
+    def __init__(self, file_path: str, settings: dict[str, Any]) -> None:
+        super().__init__(file_path, settings)
+        self.file: TextIO | None = None
+
+    def open(self, dates: list[str]) -> None:
+        super().open(dates)
+        self.file = open(self.file_path, 'w', encoding='utf-8')
+
+    def write_record(self, record: ReportRecord) -> None:
+        self.file.write(json.dumps(record.to_json(), ensure_ascii=False))
+        self.file.write('\n')
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+REPORT_FILE_CLASSES: dict[str, type[ReportFile]] = {
+    'xlsx': ReportExcelTable,
+    'csv': ReportCsvFile,
+    'jsonl': ReportJsonLinesFile,
+}
+
+
+def create_report_files(
+    base_path: str,
+    formats: tuple[str, ...],
+    settings: dict[str, Any],
+) -> list[ReportFile]:
+    """
+    Создает отчеты указанных форматов: base_path + '.' + формат.
+    """
+    unknown_formats = set(formats) - REPORT_FILE_CLASSES.keys()
+    if unknown_formats:
+        raise ValueError(
+            'Unknown report formats: {}'.format(', '.join(unknown_formats))
+        )
+    return [
+        REPORT_FILE_CLASSES[report_format](
+            f'{base_path}.{report_format}',
+            settings,
+        )
+        for report_format in formats
+    ]
 
 
 def check_python_version():
@@ -198,11 +460,21 @@ def check_python_version():
         )
 
 
-def get_url_by_city_name(city_name):
+def get_url_by_city_name(
+    city_name: str,
+    cities: Mapping[str, str] | None = None,
+) -> str:
+    """
+    URL прогноза по коду города (по умолчанию из CITIES);
+    в каталоге CityCatalogue город можно найти и по названию.
+    """
+    cities = CITIES if cities is None else cities
     try:
-        return CITIES[city_name]
+        return cities[city_name]
     except KeyError:
-        raise Exception('Please check that city {} exists'.format(city_name))
+        if isinstance(cities, CityCatalogue):
+            return cities.get_record_by_name(city_name).url
+        raise UnknownCityError(city_name) from None
 
 
 def create_new_folders(folder_names: tuple[str, ...]) -> None: